@@ -1,8 +1,40 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, has_request_context, g
+from datetime import datetime, timezone
 import requests 
 import xmltodict
+from xml.parsers.expat import ExpatError
 import logging 
+import logging.handlers
+import queue
+import random
+import bisect
+import atexit
 import socket
+import numpy as np
+from array import array
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import itertools
+import uuid
+import glob
+import multiprocessing
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import NamedTuple
+import gzip
+import fcntl
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 
 ############################################################################################################################
@@ -10,8 +42,40 @@ import socket
 EPOCH_URL = 'https://nasa-public-data.s3.amazonaws.com/iss-coords/2022-02-13/ISS_OEM/ISS.OEM_J2K_EPH.xml'  
 SIGHTING_URL = 'https://nasa-public-data.s3.amazonaws.com/iss-coords/2022-02-13/ISS_sightings/XMLsightingData_citiesUSA10.xml' 
 #SIGHTING_URL = 'https://nasa-public-data.s3.amazonaws.com/iss-coords/2022-02-13/ISS_sightings/XMLsightingData_citiesINT01.xml'
+#SIGHTING_URL = [SIGHTING_URL, 'https://nasa-public-data.s3.amazonaws.com/iss-coords/2022-02-13/ISS_sightings/XMLsightingData_citiesINT01.xml']
 EPOCH_FILE = 'ISS.OEM_J2K_EPH.xml'
 SIGHTING_FILE = 'XMLsightingData_citiesUSA10.xml'
+#SIGHTING_FILE = 'XMLsightingData_cities*.xml'   # sighting sources may be a single source, a list or a glob of shards
+EPOCH_FORMAT = '%Y-%jT%H:%M:%S.%fZ'
+SIGHTING_TIME_FORMAT = '%b %d, %Y %H:%M'
+STATE_VECTOR_KEYS = ['X', 'Y', 'Z', 'X_DOT', 'Y_DOT', 'Z_DOT']
+OEM_ITEM_DEPTH = 6          # ndm/oem/body/segment/data/stateVector
+SIGHTING_ITEM_DEPTH = 2     # visible_passes/visible_pass
+SNAPSHOT_DIR = '.snapshots'  # set to None to disable on-disk snapshots of parsed data
+HTTP_TIMEOUT = (10, 60)     # (connect, read) seconds for every request to the data sources
+REFRESH_INTERVAL = None     # seconds between background refreshes from the url sources, None disables the refresher
+MAX_LOAD_JOBS = 100         # number of asynchronous load jobs kept for polling
+RESPONSE_CACHE_SIZE = 256   # number of parameterized list responses kept per dataset generation
+NDJSON_CHUNK_SIZE = 256     # records serialized per chunk of a streamed ndjson response
+GZIP_LEVEL = 6              # gzip level of compressed cached responses
+BROTLI_QUALITY = 5          # brotli quality of compressed cached responses (11, the library default, is far slower)
+MAX_BATCH_SIZE = 10000      # keys accepted by one batch lookup request
+EPOCH_CACHE_ROUTES = ('epochs', 'ground_track', 'over_region')  # cached routes built from the positioning data set
+WGS84_A = 6378.137          # km, WGS-84 semi-major axis
+WGS84_F = 1/298.257223563   # WGS-84 flattening
+REGION_SAMPLE_STEP = 10.0   # seconds between interpolated ground track samples of /over_region
+PASS_SAMPLE_STEP = 30.0     # seconds between interpolated look angle samples of pass prediction
+PASS_MIN_ELEVATION = 10.0   # degrees above the horizon at which a predicted pass rises and sets
+PASS_LOCATION_DECIMALS = 2  # observer latitude/longitude rounding (about 1 km) shared by cached pass predictions
+PASS_CACHE_SIZE = 10000     # observer locations with cached pass predictions per dataset generation
+PASS_CHUNK_ELEMENTS = 1<<22 # samples x observers evaluated at once by a batch pass prediction
+SIGHTING_PARSE_PROCESSES = None  # worker processes parsing sighting shards, None uses the cpu count
+SIGHTING_FETCH_THREADS = 8  # sighting shards downloaded and parsed at once
+SHARED_DATASET_DIR = None   # directory the workers of a pre-fork server share generations through, None disables
+SHARED_POLL_INTERVAL = 1.0  # seconds between checks for a newly shared generation by each worker's watcher thread
+LOG_LEVEL = logging.DEBUG
+REQUEST_LOG_SAMPLE_RATE = 1.0   # fraction of requests whose DEBUG/INFO lines are logged, warnings and errors always are
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]  # seconds
 
 ############################################################################################################################
 ### FLASK
@@ -21,42 +85,2997 @@ app.config['JSON_SORT_KEYS'] = False
 ############################################################################################################################
 ### Logging & Socketing
 format_str=f'[%(asctime)s {socket.gethostname()}] %(filename)s:%(funcName)s:%(lineno)s - %(levelname)s: %(message)s'
-logging.basicConfig(level=logging.DEBUG, format=format_str)
+
+class RequestLogSampler(logging.Filter):
+    """
+    Drops the DEBUG/INFO records of requests that were not sampled (see REQUEST_LOG_SAMPLE_RATE)
+    """
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not has_request_context():
+            return True
+        return g.get('log_sampled', True)
+
+
+def apply_log_level():
+    """
+    Applies LOG_LEVEL to the root logger if it was changed, so the level can be set at runtime like the other knobs
+    """
+    global applied_log_level
+    if LOG_LEVEL != applied_log_level:
+        logging.getLogger().setLevel(LOG_LEVEL)
+        applied_log_level = LOG_LEVEL
+
+
+def start_log_listener():
+    """
+    Starts the thread that writes queued log records to stderr, so routes only pay for putting a record on a queue.
+    Also runs in forked children, which do not inherit the thread
+    """
+    global log_listener
+    apply_log_level()
+    log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
+    log_listener.start()
+
+
+applied_log_level = None
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter(format_str))
+log_queue_handler = logging.handlers.QueueHandler(log_queue)
+log_queue_handler.addFilter(RequestLogSampler())
+logging.getLogger().addHandler(log_queue_handler)
+start_log_listener()
+atexit.register(lambda: log_listener.stop())
+os.register_at_fork(after_in_child=start_log_listener)
+
+############################################################################################################################
+### DATASET
+class Dataset(NamedTuple):
+    """
+    One immutable generation of the loaded positioning and sighting data sets. A new generation is built completely
+    before being published with a single reference swap, so a route that reads iss_dataset once always sees positioning
+    and sighting data that were loaded together
+    """
+    generation: int
+    epoch_store: dict
+    sighting_data: list
+    sighting_index: dict
+    sighting_store: dict
+    loaded_at: str
+    sources: dict
+    epoch_delta: dict = None
+
+
+class EpochList(Sequence):
+    """
+    Read-only window [base, base+count) of the append-only epoch string list of an epoch store buffer, which successive
+    generations of an incrementally reloaded store share (see extend_epoch_store())
+    """
+    def __init__(self, epochs:list, base:int, count:int):
+        self.epochs = epochs
+        self.base = base
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(self.count)
+            if step > 0:
+                return self.epochs[self.base + start:self.base + max(start, stop):step]
+            return [self.epochs[self.base + i] for i in range(start, stop, step)]
+        if idx < 0:
+            idx += self.count
+        if not 0 <= idx < self.count:
+            raise IndexError(idx)
+        return self.epochs[self.base + idx]
+
+    def __iter__(self):
+        if not isinstance(self.epochs, list):
+            return iter(self[:])
+        return itertools.islice(self.epochs, self.base, self.base + self.count)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, EpochList)):
+            return NotImplemented
+        return len(other) == self.count and all(a == b for a, b in zip(self, other))
+
+
+class EpochIndex(Mapping):
+    """
+    Exact epoch string to row number lookup of an epoch store, over the dictionary of absolute row numbers of its
+    buffer. Epochs outside the window of the store (expired, or appended for a later generation) are not found
+    """
+    def __init__(self, rows:dict, epochs:EpochList):
+        self.rows = rows
+        self.epochs = epochs
+
+    def __getitem__(self, epoch_str):
+        row = self.rows[epoch_str] - self.epochs.base
+        if not 0 <= row < self.epochs.count:
+            raise KeyError(epoch_str)
+        return row
+
+    def __iter__(self):
+        return iter(dict.fromkeys(self.epochs))
+
+    def __len__(self):
+        return len(dict.fromkeys(self.epochs))
+
+############################################################################################################################
+### VARIABLES DECLARED FOR GLOBAL SCOPE
+iss_dataset = None
+generation_counter = itertools.count(1)
+publish_lock = threading.Lock()
+epoch_extend_lock = threading.Lock()
+load_jobs = OrderedDict()
+load_jobs_lock = threading.Lock()
+load_job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='isspsdt-load')
+response_cache = {'generation': None, 'pinned': {}, 'lru': OrderedDict()}
+response_cache_lock = threading.Lock()
+response_cache_stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0}
+ground_track_cache = {'generation': None, 'track': None}
+ground_track_lock = threading.Lock()
+pass_cache = {'generation': None, 'samples': None, 'lru': OrderedDict()}
+pass_cache_lock = threading.Lock()
+http_session = requests.Session()
+http_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+http_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+fetch_stats = {}
+fetch_stats_lock = threading.Lock()
+refresh_shards = {}
+sighting_process_pool = None
+sighting_pool_lock = threading.Lock()
+refresh_lock = threading.Lock()
+refresher_stop = None
+shared_pointer_stat = None
+shared_attach_lock = threading.Lock()
+shared_watcher_stop = None
+shared_watcher_lock = threading.Lock()
+started_at = time.time()
+metrics_lock = threading.Lock()
+route_metrics = {}
+load_metrics = {}
+
+############################################################################################################################
+### MISCELLANEOUS FUNCTIONS
+def get_xml_data_url(url_str:str)->dict:
+    """                                                                                                                                                                                              
+    Uses input url string to web accessible xml contnet and outputs dictionary filed from parsed xml data                       
+    args:
+        url_str (str): String of url to xml of ISS positioning data                                                                                                                                  
+    returns:                                                                                                                                                                                         
+        data_dict (dict): Dictionary containing ISS positioning data                                                                                                                            
+    """
+    data_resp = http_session.get(url=url_str, timeout=HTTP_TIMEOUT)
+    data_dict = xmltodict.parse(data_resp.content)
+    logging.info("DATA PARSED SUCCESSFULLY FROM URL")
+    return data_dict
+
+
+def get_xml_data_file(file_str:str)->dict:
+    """                                                                                                                                                                                              
+    Uses input url string to local xml content file and outputs dictionary filed from parsed xml data                       
+    args:
+        file_str (str): String of url to xml of ISS positioning data                                                                                                                                  
+    returns:                                                                                                                                                                                         
+        data_dict (dict): Dictionary containing ISS positioning data                                                                                                                            
+    """
+    with open(file_str, 'r') as f:
+        data_dict = xmltodict.parse( f.read() )
+    logging.info("DATA PARSED SUCCESSFULLY FROM FILE")
+    return data_dict
+
+
+def stream_xml_data_url(url_str:str, item_depth:int, item_callback):
+    """
+    Streams web accessible xml content through the parser in chunks, handing each element at item_depth to item_callback
+    instead of building the whole document in memory
+    args:
+        url_str (str): String of url to xml of ISS data
+        item_depth (int): Depth of the repeated elements in the xml document
+        item_callback (callable): Called as item_callback(path, item) for each element, returns True to continue
+    returns:
+        (none)
+    """
+    with http_session.get(url=url_str, stream=True, timeout=HTTP_TIMEOUT) as data_resp:
+        data_resp.raw.decode_content = True
+        xmltodict.parse(data_resp.raw, item_depth=item_depth, item_callback=item_callback)
+    logging.info("DATA STREAMED SUCCESSFULLY FROM URL")
+
+
+def stream_xml_data_file(file_str:str, item_depth:int, item_callback):
+    """
+    Streams local xml content through the parser in chunks, handing each element at item_depth to item_callback
+    instead of building the whole document in memory
+    args:
+        file_str (str): String of path to xml of ISS data
+        item_depth (int): Depth of the repeated elements in the xml document
+        item_callback (callable): Called as item_callback(path, item) for each element, returns True to continue
+    returns:
+        (none)
+    """
+    with open(file_str, 'rb') as f:
+        xmltodict.parse(f, item_depth=item_depth, item_callback=item_callback)
+    logging.info("DATA STREAMED SUCCESSFULLY FROM FILE")
+
+
+def stream_epoch_store(stream_func, source_str:str)->dict:
+    """
+    Streams the stateVector elements of a positioning xml straight into the columnar epoch store
+    args:
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        source_str (str): String of url or path to positioning xml
+    returns:
+        epoch_store (dict): Columnar epoch store (see pack_epoch_store())
+    """
+    return pack_epoch_store(stream_epoch_columns(stream_func, source_str))
+
+
+def stream_epoch_columns(stream_func, source_str:str, epoch_store:dict=None)->dict:
+    """
+    Streams the stateVector elements of a positioning xml into growable epoch columns in document order
+    args:
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        source_str (str): String of url or path to positioning xml
+        epoch_store (dict): (optional) Epoch store currently served, whose epochs are matched rather than parsed again
+    returns:
+        epoch_columns (dict): Columns filled by append_state_vector()
+    """
+    epoch_columns = new_epoch_columns()
+    def add_state_vector(path, item):
+        if path[-1][0] == 'stateVector':
+            append_state_vector(epoch_columns, item, epoch_store)
+        return True
+    stream_func(source_str, OEM_ITEM_DEPTH, add_state_vector)
+    return epoch_columns
+
+
+def stream_sighting_data(stream_func, source_str:str)->list:
+    """
+    Streams the visible_pass elements of a sighting xml into a list
+    args:
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        source_str (str): String of url or path to sighting xml
+    returns:
+        sighting_data (list): List of visible pass dictionaries
+    """
+    sighting_data = []
+    def add_visible_pass(path, item):
+        if path[-1][0] == 'visible_pass':
+            sighting_data.append(item)
+        return True
+    stream_func(source_str, SIGHTING_ITEM_DEPTH, add_visible_pass)
+    return sighting_data
+
+
+def expand_sources(sources)->list:
+    """
+    Expands a sighting source setting into its list of shards
+    args:
+        sources (str or list): String of url or path to sighting xml, or a list of them, where paths may be globs
+    returns:
+        source_list (list): Urls and paths of every shard in order, without duplicates
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    source_list = []
+    for source_str in sources:
+        if source_str.startswith(('http://', 'https://')) or not any(c in source_str for c in '*?['):
+            source_list.append(source_str)
+            continue
+        matches = sorted(glob.glob(source_str))
+        if not matches:
+            raise FileNotFoundError(f'No sighting files match {source_str}')
+        source_list.extend(matches)
+    return list(dict.fromkeys(source_list))
+
+
+def merge_sighting_shards(shards:list)->list:
+    """
+    Merges the sighting data of several shards, dropping passes that appear in more than one shard
+    args:
+        shards (list): List of sighting data lists, one per shard
+    returns:
+        sighting_data (list): List of unique visible pass dictionaries in shard order
+    """
+    if len(shards) == 1:
+        return shards[0]
+    sighting_data = []
+    seen = set()
+    for shard in shards:
+        for visible_pass in shard:
+            key = tuple(sorted(visible_pass.items()))
+            if key not in seen:
+                seen.add(key)
+                sighting_data.append(visible_pass)
+    logging.info("SIGHTING SHARDS MERGED SUCCESSFULLY")
+    return sighting_data
+
+
+def build_sighting_index(sighting_data:list)->dict:
+    """
+    Builds nested country -> region -> city index of the sighting data set so routes resolve with dictionary lookups
+    args:
+        sighting_data (list): List of visible pass dictionaries parsed from sighting xml
+    returns:
+        sighting_index (dict): Dictionary keyed by country (in order of first appearance) whose nodes hold the
+                               country's sightings and a 'regions' dictionary, with region nodes holding the
+                               region's sightings and a 'cities' dictionary of city sighting lists
+    """
+    sighting_index = {}
+    for x in sighting_data:
+        country_node = sighting_index.setdefault(x['country'], {'sightings': [], 'regions': {}})
+        region_node = country_node['regions'].setdefault(x['region'], {'sightings': [], 'cities': {}})
+        country_node['sightings'].append(x)
+        region_node['sightings'].append(x)
+        region_node['cities'].setdefault(x['city'], []).append(x)
+    logging.info("SIGHTING INDEX BUILT SUCCESSFULLY")
+    return sighting_index
+
+
+def parse_epoch(epoch_str:str)->float:
+    """
+    Converts an OEM day-of-year epoch string (e.g. 2022-042T12:00:00.000Z) or an ISO 8601 UTC string into POSIX seconds
+    args:
+        epoch_str (str): String of epoch to convert
+    returns:
+        (float): Seconds since 1970-01-01T00:00:00Z
+    raises:
+        ValueError: If the string matches neither format
+    """
+    try:
+        epoch_dt = datetime.strptime(epoch_str, EPOCH_FORMAT)
+    except ValueError:
+        epoch_dt = datetime.fromisoformat(epoch_str.replace('Z', '+00:00'))
+    if epoch_dt.tzinfo is None:
+        epoch_dt = epoch_dt.replace(tzinfo=timezone.utc)
+    return epoch_dt.timestamp()
+
+
+def new_epoch_columns()->dict:
+    """
+    Creates empty growable columns that state vectors are appended to while the positioning data set is read
+    args:
+        (none)
+    returns:
+        epoch_columns (dict): Dictionary of 'epochs' (list), 'times' (array), 'values' (array, six per state vector)
+                              and 'rows' (array, row matched in the served epoch store or -1) columns plus the
+                              'units' (dict) taken from the first state vector
+    """
+    return {'epochs': [], 'times': array('d'), 'values': array('d'), 'rows': array('q'), 'units': {}}
+
+
+def append_state_vector(epoch_columns:dict, state_vector:dict, epoch_store:dict=None):
+    """
+    Appends one state vector dictionary parsed from positioning xml to growable epoch columns
+    args:
+        epoch_columns (dict): Columns created by new_epoch_columns()
+        state_vector (dict): State vector dictionary with EPOCH string and {'@units','#text'} entries
+        epoch_store (dict): (optional) Epoch store currently served, whose time of a matching epoch is reused
+    returns:
+        (none)
+    """
+    epoch_str = state_vector['EPOCH']
+    row = -1 if epoch_store is None else epoch_store['index'].get(epoch_str, -1)
+    epoch_columns['epochs'].append(epoch_str)
+    epoch_columns['times'].append(parse_epoch(epoch_str) if row < 0 else epoch_store['times'][row])
+    epoch_columns['rows'].append(row)
+    epoch_columns['values'].extend(float(state_vector[key]['#text']) for key in STATE_VECTOR_KEYS)
+    if not epoch_columns['units']:
+        epoch_columns['units'] = {key: state_vector[key]['@units'] for key in STATE_VECTOR_KEYS}
+
+
+def pack_epoch_store(epoch_columns:dict)->dict:
+    """
+    Packs growable epoch columns into time sorted columnar arrays (see make_epoch_store())
+    args:
+        epoch_columns (dict): Columns filled by append_state_vector()
+    returns:
+        epoch_store (dict): Columnar epoch store
+    """
+    epoch_times = np.frombuffer(epoch_columns['times'], dtype=np.float64)
+    state_vectors = np.frombuffer(epoch_columns['values'], dtype=np.float64).reshape(-1, len(STATE_VECTOR_KEYS))
+    order = np.argsort(epoch_times, kind='stable')
+    epoch_list = [epoch_columns['epochs'][i] for i in order]
+    return make_epoch_store(epoch_list, epoch_times[order], np.ascontiguousarray(state_vectors[order, :3]),
+                            np.ascontiguousarray(state_vectors[order, 3:]), epoch_columns['units'])
+
+
+def make_epoch_store(epoch_list:list, epoch_times:np.ndarray, position:np.ndarray, velocity:np.ndarray, units:dict)->dict:
+    """
+    Bundles time sorted epoch columns into the columnar epoch store and builds the lookup structures used by the epoch routes
+    args:
+        epoch_list (list): Epoch strings sorted by time
+        epoch_times (np.ndarray): float64 epoch times in POSIX seconds
+        position (np.ndarray): float64 (n,3) X/Y/Z
+        velocity (np.ndarray): float64 (n,3) X_DOT/Y_DOT/Z_DOT
+        units (dict): Units of each state vector key
+    returns:
+        epoch_store (dict): Columnar epoch store (see epoch_store_view()) over a new buffer holding the columns
+    """
+    epoch_buffer = {
+        'epochs': epoch_list,
+        'times': epoch_times,
+        'position': position,
+        'velocity': velocity,
+        'rows': {epoch: i for i, epoch in enumerate(epoch_list)},
+        'stop': len(epoch_list),
+    }
+    logging.info("EPOCH STORE BUILT SUCCESSFULLY")
+    return epoch_store_view(epoch_buffer, 0, len(epoch_list), units)
+
+
+def epoch_store_view(epoch_buffer:dict, base:int, count:int, units:dict)->dict:
+    """
+    Columnar epoch store over rows [base, base+count) of an epoch buffer. Generations of an incrementally reloaded
+    store share one buffer, each holding views of its own window (see extend_epoch_store())
+    args:
+        epoch_buffer (dict): Append-only 'epochs' list, 'times'/'position'/'velocity' arrays (possibly with room to
+                             grow), 'rows' dictionary of epoch string to absolute row and 'stop' row written up to
+        base (int): First row of the store
+        count (int): Number of rows of the store
+        units (dict): Units of each state vector key
+    returns:
+        epoch_store (dict): Dictionary holding
+                            'epochs' (EpochList) epoch strings,
+                            'times' (np.ndarray) float64 epoch times in POSIX seconds,
+                            'position' (np.ndarray) float64 (n,3) X/Y/Z,
+                            'velocity' (np.ndarray) float64 (n,3) X_DOT/Y_DOT/Z_DOT,
+                            'units' (dict) units of each state vector key, stored once,
+                            'index' (EpochIndex) exact epoch string to row number,
+                            'buffer' (dict) the epoch buffer and 'base' (int) the first row of the store in it
+    """
+    epoch_list = EpochList(epoch_buffer['epochs'], base, count)
+    return {
+        'epochs': epoch_list,
+        'times': epoch_buffer['times'][base:base + count],
+        'position': epoch_buffer['position'][base:base + count],
+        'velocity': epoch_buffer['velocity'][base:base + count],
+        'units': units,
+        'index': EpochIndex(epoch_buffer['rows'], epoch_list),
+        'buffer': epoch_buffer,
+        'base': base,
+    }
+
+
+def build_epoch_store(epoch_data:list)->dict:
+    """
+    Packs an already parsed positioning data set into the columnar epoch store (see pack_epoch_store())
+    args:
+        epoch_data (list): List of state vector dictionaries parsed from positioning xml
+    returns:
+        epoch_store (dict): Columnar epoch store
+    """
+    epoch_columns = new_epoch_columns()
+    for x in epoch_data:
+        append_state_vector(epoch_columns, x)
+    return pack_epoch_store(epoch_columns)
+
+
+def epoch_state_vector(epoch_store:dict, idx:int)->dict:
+    """
+    Serializes one row of the columnar epoch store back into the dictionary shape of the positioning xml
+    args:
+        epoch_store (dict): Columnar epoch store built by build_epoch_store()
+        idx (int): Row number of the state vector
+    returns:
+        state_vector (dict): Dictionary with EPOCH string and {'@units','#text'} entries for each state vector key
+    """
+    values = epoch_store['position'][idx].tolist() + epoch_store['velocity'][idx].tolist()
+    return state_vector_dict(epoch_store['epochs'][idx], values, epoch_store['units'])
+
+
+def state_vector_dict(epoch_str:str, values:list, units:dict)->dict:
+    """
+    Builds a state vector dictionary in the shape of the positioning xml
+    args:
+        epoch_str (str): String of epoch of the state vector
+        values (list): Floats for each of the STATE_VECTOR_KEYS in order
+        units (dict): Units of each state vector key
+    returns:
+        state_vector (dict): Dictionary with EPOCH string and {'@units','#text'} entries for each state vector key
+    """
+    state_vector = {'EPOCH': epoch_str}
+    for key, value in zip(STATE_VECTOR_KEYS, values):
+        state_vector[key] = {'@units': units[key], '#text': repr(value)}
+    return state_vector
+
+
+def format_epoch(epoch_time:float)->str:
+    """
+    Converts POSIX seconds into an OEM day-of-year epoch string (e.g. 2022-042T12:00:00.000Z)
+    args:
+        epoch_time (float): Seconds since 1970-01-01T00:00:00Z
+    returns:
+        (str): OEM day-of-year epoch string with millisecond precision
+    """
+    epoch_dt = datetime.fromtimestamp(round(epoch_time, 3), tz=timezone.utc)
+    return epoch_dt.strftime(EPOCH_FORMAT)[:-4] + 'Z'
+
+
+def format_epochs(epoch_times:np.ndarray)->list:
+    """
+    Vectorized format_epoch() for many times at once
+    args:
+        epoch_times (np.ndarray): Seconds since 1970-01-01T00:00:00Z
+    returns:
+        (list): OEM day-of-year epoch strings with millisecond precision
+    """
+    ms = np.round(np.asarray(epoch_times, dtype=float)*1000).astype(np.int64)
+    days, ms_of_day = np.divmod(ms, 86400000)
+    years = days.astype('datetime64[D]').astype('datetime64[Y]')
+    day_of_year = days - years.astype('datetime64[D]').astype(np.int64) + 1
+    return [f'{y:04d}-{d:03d}T{t//3600000:02d}:{t//60000%60:02d}:{t//1000%60:02d}.{t%1000:03d}Z'
+            for y, d, t in zip((years.astype(np.int64) + 1970).tolist(), day_of_year.tolist(), ms_of_day.tolist())]
+
+
+def distinct_epoch_rows(epoch_times:np.ndarray)->np.ndarray:
+    """
+    Rows of the last state vector of each distinct epoch time (the rows the epoch index resolves to when a publication
+    repeats an epoch, e.g. at a segment boundary)
+    args:
+        epoch_times (np.ndarray): Sorted epoch times in POSIX seconds
+    returns:
+        (np.ndarray): Row numbers
+    """
+    if len(epoch_times) == 0:
+        return np.arange(0)
+    return np.flatnonzero(np.append(np.diff(epoch_times) != 0, True))
+
+
+def diff_epoch_stores(old_store:dict, new_store:dict)->tuple:
+    """
+    Compares two epoch stores by epoch time in one vectorized pass. The new store is taken as the authority for the
+    span it covers, so old state vectors it no longer holds (e.g. expired ones before its first epoch) are removed.
+    Repeated epochs are matched by their last state vector
+    args:
+        old_store (dict): Columnar epoch store currently served
+        new_store (dict): Columnar epoch store of the latest publication
+    returns:
+        delta (dict): Counts of 'added', 'removed', 'replaced' and 'unchanged' epochs, with the first and last epoch of
+                      each store and whether the store was updated 'in_place' (see extend_epoch_store())
+        reuse_old (np.ndarray): Rows of the old store that are unchanged in the new one
+        reuse_new (np.ndarray): Matching rows of the new store
+    """
+    old_distinct = distinct_epoch_rows(old_store['times'])
+    new_distinct = distinct_epoch_rows(new_store['times'])
+    common, old_rows, new_rows = np.intersect1d(old_store['times'][old_distinct], new_store['times'][new_distinct],
+                                                assume_unique=True, return_indices=True)
+    old_rows, new_rows = old_distinct[old_rows], new_distinct[new_rows]
+    same = (np.all(old_store['position'][old_rows] == new_store['position'][new_rows], axis=1)
+            & np.all(old_store['velocity'][old_rows] == new_store['velocity'][new_rows], axis=1))
+    delta = epoch_delta(old_store, new_store, len(new_distinct) - len(common), len(old_distinct) - len(common),
+                        int(np.count_nonzero(~same)), int(np.count_nonzero(same)), False)
+    return delta, old_rows[same], new_rows[same]
+
+
+def epoch_delta(old_store:dict, new_store:dict, added:int, removed:int, replaced:int, unchanged:int, in_place:bool)->dict:
+    """
+    Describes the change from one epoch store to the next
+    args:
+        old_store (dict): Columnar epoch store currently served
+        new_store (dict): Columnar epoch store of the latest publication
+        added, removed, replaced, unchanged (int): Number of epochs of each kind
+        in_place (bool): The new store shares the buffer of the old one (see extend_epoch_store())
+    returns:
+        delta (dict): Json serializable change counts and spans
+    """
+    return {
+        'added': added, 'removed': removed, 'replaced': replaced, 'unchanged': unchanged, 'in_place': in_place,
+        'old_span': [old_store['epochs'][0], old_store['epochs'][-1]] if len(old_store['epochs']) else None,
+        'new_span': [new_store['epochs'][0], new_store['epochs'][-1]] if len(new_store['epochs']) else None,
+    }
+
+
+def extend_epoch_store(epoch_store:dict, epoch_columns:dict)->tuple:
+    """
+    Applies a newly streamed publication to an epoch store in place when it only drops state vectors from the start
+    and appends new ones after the end, the shape of a regular OEM update. The new store shares the buffer of the
+    current one: unchanged rows, their epoch strings and index entries are reused as they are, only the appended rows
+    are written past the end of the current store, and expired rows just fall out of the new store's window. The
+    buffer is copied (without the expired rows, and with as much room again to grow) only when it is full, read-only
+    or mostly expired, so the cost of an update follows the size of the change
+    args:
+        epoch_store (dict): Columnar epoch store currently served
+        epoch_columns (dict): Columns of the latest publication, streamed against epoch_store (see stream_epoch_columns())
+    returns:
+        epoch_store (dict): Columnar epoch store of the latest publication, the given one if nothing changed
+        delta (dict): Changes to the epoch store (see epoch_delta())
+        reuse_old (np.ndarray): Rows of the old store that are unchanged in the new one
+        reuse_new (np.ndarray): Matching rows of the new store
+        (None): If the publication replaces, inserts or reorders state vectors, or repeats a matched epoch
+    """
+    rows = np.frombuffer(epoch_columns['rows'], dtype=np.int64)
+    count = len(epoch_store['times'])
+    kept = int(np.count_nonzero(rows >= 0))
+    if kept == 0 or rows[0] < 0 or epoch_columns['units'] != epoch_store['units']:
+        return None
+    first = int(rows[0])
+    if not np.array_equal(rows[:kept], np.arange(first, first + kept)):
+        return None
+    values = np.frombuffer(epoch_columns['values'], dtype=np.float64).reshape(-1, len(STATE_VECTOR_KEYS))
+    if not (np.array_equal(values[:kept, :3], epoch_store['position'][first:first + kept])
+            and np.array_equal(values[:kept, 3:], epoch_store['velocity'][first:first + kept])):
+        return None
+    added = len(rows) - kept
+    new_times = np.frombuffer(epoch_columns['times'], dtype=np.float64)[kept:]
+    if added and (first + kept != count or new_times[0] <= epoch_store['times'][-1] or np.any(np.diff(new_times) < 0)):
+        return None
+    reuse_old, reuse_new = np.arange(first, first + kept), np.arange(kept)
+    if first == 0 and kept == count and not added:
+        return epoch_store, epoch_delta(epoch_store, epoch_store, 0, 0, 0, kept, True), reuse_old, reuse_new
+    new_epochs = epoch_columns['epochs'][kept:]
+    epoch_buffer = epoch_store['buffer']
+    base = epoch_store['base'] + first
+    total = kept + added
+    with epoch_extend_lock:
+        if added and epoch_buffer['stop'] != epoch_store['base'] + count:
+            # the buffer was already extended past this store for another generation
+            return None
+        full = epoch_buffer['stop'] + added > len(epoch_buffer['times']) or not epoch_buffer['times'].flags.writeable
+        if (added and full) or base > total:
+            capacity = 2*total
+            moved = {
+                'epochs': epoch_buffer['epochs'][base:base + kept] + new_epochs,
+                'times': np.empty(capacity),
+                'position': np.empty((capacity, 3)),
+                'velocity': np.empty((capacity, 3)),
+                'stop': total,
+            }
+            for key, new_values in (('times', new_times), ('position', values[kept:, :3]), ('velocity', values[kept:, 3:])):
+                moved[key][:kept] = epoch_buffer[key][base:base + kept]
+                moved[key][kept:total] = new_values
+            moved['rows'] = {epoch: i for i, epoch in enumerate(moved['epochs'])}
+            epoch_buffer, base = moved, 0
+            logging.info("EPOCH BUFFER MOVED")
+        elif added:
+            stop = epoch_buffer['stop']
+            epoch_buffer['times'][stop:stop + added] = new_times
+            epoch_buffer['position'][stop:stop + added] = values[kept:, :3]
+            epoch_buffer['velocity'][stop:stop + added] = values[kept:, 3:]
+            epoch_buffer['epochs'].extend(new_epochs)
+            epoch_buffer['rows'].update(zip(new_epochs, range(stop, stop + added)))
+            epoch_buffer['stop'] = stop + added
+    new_store = epoch_store_view(epoch_buffer, base, total, epoch_store['units'])
+    return new_store, epoch_delta(epoch_store, new_store, added, count - kept, 0, kept, True), reuse_old, reuse_new
+
+
+def update_epoch_store(epoch_store:dict, epoch_columns:dict)->tuple:
+    """
+    Applies a newly streamed publication to the epoch store currently served, in place when it can be (see
+    extend_epoch_store()), otherwise by packing a new store and matching it against the current one
+    args:
+        epoch_store (dict): Columnar epoch store currently served
+        epoch_columns (dict): Columns of the latest publication, streamed against epoch_store (see stream_epoch_columns())
+    returns:
+        epoch_store (dict): Columnar epoch store of the latest publication
+        delta (dict): Changes to the epoch store (see epoch_delta())
+        reuse_old (np.ndarray): Rows of the old store that are unchanged in the new one
+        reuse_new (np.ndarray): Matching rows of the new store
+    """
+    extended = extend_epoch_store(epoch_store, epoch_columns)
+    if extended is not None:
+        return extended
+    new_store = pack_epoch_store(epoch_columns)
+    return (new_store,) + diff_epoch_stores(epoch_store, new_store)
+
+
+def interpolate_state_vectors(epoch_store:dict, query_times:np.ndarray)->tuple:
+    """
+    Cubic Hermite interpolation of position and velocity between neighbouring state vectors, evaluated for all query
+    times in one vectorized pass (positions are matched in value and slope, using the velocities as slopes)
+    args:
+        epoch_store (dict): Columnar epoch store built by build_epoch_store(), with at least two state vectors
+        query_times (np.ndarray): POSIX seconds inside the span of the epoch store
+    returns:
+        position (np.ndarray): (n,3) interpolated X/Y/Z
+        velocity (np.ndarray): (n,3) interpolated X_DOT/Y_DOT/Z_DOT
+    """
+    epoch_times = epoch_store['times']
+    idx = np.clip(np.searchsorted(epoch_times, query_times, side='right') - 1, 0, len(epoch_times) - 2)
+    t0 = epoch_times[idx]
+    h = (epoch_times[idx + 1] - t0)[:, None]
+    s = ((query_times - t0)[:, None]) / h
+    p0 = epoch_store['position'][idx]
+    p1 = epoch_store['position'][idx + 1]
+    m0 = epoch_store['velocity'][idx] * h
+    m1 = epoch_store['velocity'][idx + 1] * h
+    s2 = s * s
+    s3 = s2 * s
+    position = (2*s3 - 3*s2 + 1)*p0 + (s3 - 2*s2 + s)*m0 + (-2*s3 + 3*s2)*p1 + (s3 - s2)*m1
+    velocity = ((6*s2 - 6*s)*p0 + (3*s2 - 4*s + 1)*m0 + (-6*s2 + 6*s)*p1 + (3*s2 - 2*s)*m1) / h
+    return position, velocity
+
+
+def interpolate_epochs(epoch_store:dict, time_strs:list)->list:
+    """
+    Interpolates state vectors at each input time, reporting times that cannot be parsed or are outside the ephemeris
+    args:
+        epoch_store (dict): Columnar epoch store built by build_epoch_store()
+        time_strs (list): OEM day-of-year or ISO 8601 UTC time strings
+    returns:
+        state_vectors (list): State vector dictionary (or {'EPOCH','error'} dictionary) for each input time
+    """
+    epoch_times = epoch_store['times']
+    query_times = np.full(len(time_strs), np.nan)
+    for i, time_str in enumerate(time_strs):
+        try:
+            query_times[i] = parse_epoch(time_str)
+        except (ValueError, TypeError, AttributeError):
+            pass
+    parsed = ~np.isnan(query_times)
+    in_span = parsed.copy()
+    if len(epoch_times) < 2:
+        in_span[:] = False
+    else:
+        in_span[parsed] = (query_times[parsed] >= epoch_times[0]) & (query_times[parsed] <= epoch_times[-1])
+    values_iter = iter([])
+    if in_span.any():
+        position, velocity = interpolate_state_vectors(epoch_store, query_times[in_span])
+        values_iter = iter(np.hstack([position, velocity]).tolist())
+    state_vectors = []
+    for i, time_str in enumerate(time_strs):
+        if in_span[i]:
+            state_vectors.append(state_vector_dict(format_epoch(query_times[i]), next(values_iter), epoch_store['units']))
+        elif parsed[i]:
+            state_vectors.append({'EPOCH': time_str, 'error': 'TIME OUTSIDE OF EPHEMERIS SPAN'})
+        else:
+            state_vectors.append({'EPOCH': time_str, 'error': 'UNABLE TO PARSE TIME'})
+    return state_vectors
+
+
+def publish_dataset(epoch_store:dict, sighting_data:list, sources:dict, generation:int=None, loaded_at:str=None,
+                    epoch_delta:dict=None, sighting_index:dict=None, sighting_store:dict=None)->Dataset:
+    """
+    Builds the next dataset generation from freshly loaded data sets and publishes it with a single reference swap.
+    The sighting index and store of the current generation are reused when its sighting data set is passed back in.
+    With SHARED_DATASET_DIR set, the data sets are first written to the shared directory as the next generation of
+    every worker process (see share_dataset())
+    args:
+        epoch_store (dict): Columnar epoch store of the positioning data set
+        sighting_data (list): List of visible pass dictionaries parsed from sighting xml
+        sources (dict): Strings of the 'epoch' and 'sighting' sources the data sets were loaded from
+        generation (int): Generation number of a shared generation being attached
+        loaded_at (str): Load time of a shared generation being attached
+        epoch_delta (dict): Changes to the epoch store of an incremental reload (see diff_epoch_stores())
+        sighting_index (dict): Sighting index of a shared generation being attached
+        sighting_store (dict): Sighting store of a shared generation being attached
+    returns:
+        dataset (Dataset): The published generation
+    """
+    global iss_dataset
+    if generation is None and SHARED_DATASET_DIR is not None:
+        return share_dataset(epoch_store, sighting_data, sources, epoch_delta)
+    current = iss_dataset
+    if sighting_index is None or sighting_store is None:
+        if current is not None and sighting_data is current.sighting_data:
+            sighting_index, sighting_store = current.sighting_index, current.sighting_store
+        else:
+            sighting_index = build_sighting_index(sighting_data)
+            sighting_store = build_sighting_store(sighting_data)
+    with publish_lock:
+        if generation is not None and iss_dataset is not None and iss_dataset.generation >= generation:
+            return iss_dataset
+        dataset = Dataset(next(generation_counter) if generation is None else generation, epoch_store, sighting_data,
+                          sighting_index, sighting_store, loaded_at or datetime.now(timezone.utc).isoformat(), sources,
+                          epoch_delta)
+        if iss_dataset is None:
+            logging.info("DATA LOADED ONCE BY USER")
+        iss_dataset = dataset
+    logging.info(f"DATASET GENERATION {dataset.generation} PUBLISHED")
+    return dataset
+
+
+def publish_epoch_delta(dataset:Dataset, epoch_columns:dict, sighting_data:list, sources:dict)->tuple:
+    """
+    Publishes a newly streamed positioning data set as an incremental update of a generation (see
+    update_epoch_store()). Nothing is published when neither data set changed, so the current generation and
+    everything cached for it stay in place. Otherwise the ground track is carried over rather than recomputed, the
+    cached responses of the sighting routes are kept when the sighting data set is unchanged, and the pass prediction
+    samples are carried over when the store was updated in place
+    args:
+        dataset (Dataset): Generation being updated
+        epoch_columns (dict): Columns of the latest publication, streamed against dataset.epoch_store
+        sighting_data (list): List of visible pass dictionaries, dataset.sighting_data if unchanged
+        sources (dict): Strings of the 'epoch' and 'sighting' sources the data sets were loaded from
+    returns:
+        dataset (Dataset): The published generation, or the given one if nothing changed
+        delta (dict): Changes to the epoch store (see epoch_delta())
+    """
+    epoch_store, delta, reuse_old, reuse_new = update_epoch_store(dataset.epoch_store, epoch_columns)
+    if sighting_data is dataset.sighting_data and not (delta['added'] or delta['removed'] or delta['replaced']):
+        logging.info("EPOCH DATA UNCHANGED - KEEPING CURRENT GENERATION")
+        return dataset, delta
+    new_dataset = publish_dataset(epoch_store, sighting_data, sources, epoch_delta=delta)
+    carry_ground_track(dataset, new_dataset, reuse_old, reuse_new)
+    if sighting_data is dataset.sighting_data:
+        carry_response_cache(dataset, new_dataset)
+    if delta['in_place']:
+        carry_pass_samples(dataset, new_dataset)
+    logging.info(f"EPOCHS ADDED: {delta['added']} REMOVED: {delta['removed']} REPLACED: {delta['replaced']}")
+    return new_dataset, delta
+
+
+def reload_epoch_data(stream_func, epoch_source:str)->tuple:
+    """
+    Incrementally reloads the positioning data set, keeping the current sighting data set. The source is streamed
+    against the epoch store being served and applied to it (see publish_epoch_delta()), then snapshotted. Falls back
+    to a full load when nothing has been loaded yet
+    args:
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        epoch_source (str): String of url or path to positioning xml
+    returns:
+        dataset (Dataset): The published generation, or the current one if nothing changed
+        delta (dict): Changes to the epoch store, None after a full load
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        sighting_source = SIGHTING_URL if stream_func is stream_xml_data_url else SIGHTING_FILE
+        return load_data_sets(stream_func, epoch_source, sighting_source), None
+    signature = source_signature(epoch_source) if SNAPSHOT_DIR is not None else None
+    start = time.perf_counter()
+    epoch_columns = stream_epoch_columns(stream_func, epoch_source, dataset.epoch_store)
+    record_load('epoch', 'parse', time.perf_counter() - start)
+    new_dataset, delta = publish_epoch_delta(dataset, epoch_columns, dataset.sighting_data,
+                                             dict(dataset.sources, epoch=epoch_source))
+    if signature is not None:
+        try:
+            save_epoch_snapshot(epoch_source, signature, new_dataset.epoch_store)
+        except OSError:
+            logging.warning("UNABLE TO WRITE SNAPSHOT")
+    return new_dataset, delta
+
+
+def get_sighting_process_pool()->ProcessPoolExecutor:
+    """
+    Process pool parsing sighting shards, started on first use and kept for later loads so the workers only import
+    the app once
+    args:
+        (none)
+    returns:
+        (ProcessPoolExecutor): Pool of SIGHTING_PARSE_PROCESSES worker processes
+    """
+    global sighting_process_pool
+    with sighting_pool_lock:
+        if sighting_process_pool is None:
+            # spawn rather than fork, the server process has threads that may hold locks at fork time
+            sighting_process_pool = ProcessPoolExecutor(max_workers=SIGHTING_PARSE_PROCESSES or os.cpu_count() or 1,
+                                                        mp_context=multiprocessing.get_context('spawn'))
+        return sighting_process_pool
+
+
+def reset_sighting_process_pool(pool:ProcessPoolExecutor=None):
+    """
+    Shuts down the sighting process pool so the next load starts a fresh one (e.g. after a worker died)
+    args:
+        pool (ProcessPoolExecutor): Only reset if this is still the current pool, None resets whichever is current
+    returns:
+        (none)
+    """
+    global sighting_process_pool
+    with sighting_pool_lock:
+        if sighting_process_pool is not None and pool in (None, sighting_process_pool):
+            sighting_process_pool.shutdown(wait=False, cancel_futures=True)
+            sighting_process_pool = None
+
+
+def forget_sighting_process_pool():
+    """
+    Drops the sighting process pool in a forked child, whose workers belong to the parent process
+    """
+    global sighting_process_pool, sighting_pool_lock
+    sighting_process_pool = None
+    sighting_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=forget_sighting_process_pool)
+
+
+def parse_sighting_shard(stream_func, source_str:str)->tuple:
+    """
+    Parses one sighting shard in a worker process and returns it encoded (see encode_sighting_data()), which is far
+    cheaper to send back to the server process than the pass dictionaries
+    args:
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        source_str (str): String of url or path to sighting xml
+    returns:
+        (tuple): (fields, codes, strings) of the shard
+    """
+    return encode_sighting_data(stream_sighting_data(stream_func, source_str))
+
+
+def load_sighting_sources(stream_func, sighting_source)->list:
+    """
+    Loads every sighting shard, downloading and parsing up to SIGHTING_FETCH_THREADS shards without a current snapshot
+    at once in the sighting process pool (xmltodict parsing holds the GIL), and merges them into one deduplicated data set
+    args:
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        sighting_source (str or list): String of url or path to sighting xml, or a list or glob of them
+    returns:
+        sighting_data (list): List of unique visible pass dictionaries
+    """
+    source_list = expand_sources(sighting_source)
+    if len(source_list) == 1:
+        return load_with_snapshot('sighting', stream_func, source_list[0])
+    process_pool = get_sighting_process_pool()
+    def parse_in_process(stream_func, source_str):
+        try:
+            return decode_sighting_data(*process_pool.submit(parse_sighting_shard, stream_func, source_str).result())
+        except BrokenProcessPool:
+            reset_sighting_process_pool(process_pool)
+            raise
+    with ThreadPoolExecutor(max_workers=min(len(source_list), SIGHTING_FETCH_THREADS), thread_name_prefix='isspsdt-shard') as executor:
+        shards = list(executor.map(
+            lambda source_str: load_with_snapshot('sighting', stream_func, source_str, parse_in_process), source_list))
+    logging.info(f"{len(source_list)} SIGHTING SHARDS LOADED")
+    return merge_sighting_shards(shards)
+
+
+def load_data_sets(stream_func, epoch_source:str, sighting_source)->Dataset:
+    """
+    Loads the positioning and sighting sources concurrently and publishes them together as the next dataset generation
+    args:
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        epoch_source (str): String of url or path to positioning xml
+        sighting_source (str or list): String of url or path to sighting xml, or a list or glob of them
+    returns:
+        dataset (Dataset): The published generation
+    """
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='isspsdt-fetch') as executor:
+        epoch_future = executor.submit(load_with_snapshot, 'epoch', stream_func, epoch_source)
+        sighting_future = executor.submit(load_sighting_sources, stream_func, sighting_source)
+        epoch_store = epoch_future.result()
+        sighting_data = sighting_future.result()
+    return publish_dataset(epoch_store, sighting_data, {'epoch': epoch_source, 'sighting': sighting_source})
+
+
+def submit_load_job(stream_func, epoch_source:str, sighting_source:str, incremental:bool=False)->dict:
+    """
+    Queues load_data_sets() (or reload_epoch_data()) on the background load thread and returns a job record that can
+    be polled
+    args:
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        epoch_source (str): String of url or path to positioning xml
+        sighting_source (str): String of url or path to sighting xml
+        incremental (bool): Only reload the positioning data set incrementally
+    returns:
+        job (dict): Job record with 'job_id' and 'status' ('pending', 'running', 'done' or 'failed')
+    """
+    job = {
+        'job_id': uuid.uuid4().hex, 'status': 'pending', 'generation': None, 'error': None,
+        'sources': {'epoch': epoch_source, 'sighting': sighting_source}, 'incremental': incremental, 'epoch_delta': None,
+        'submitted_at': datetime.now(timezone.utc).isoformat(), 'finished_at': None,
+    }
+    with load_jobs_lock:
+        load_jobs[job['job_id']] = job
+        while len(load_jobs) > MAX_LOAD_JOBS:
+            load_jobs.popitem(last=False)
+    load_job_executor.submit(run_load_job, job, stream_func, epoch_source, sighting_source, incremental)
+    logging.info("LOAD JOB SUBMITTED")
+    return job
+
+
+def run_load_job(job:dict, stream_func, epoch_source:str, sighting_source:str, incremental:bool=False):
+    """
+    Runs a queued load job, recording its outcome in the job record
+    args:
+        job (dict): Job record created by submit_load_job()
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        epoch_source (str): String of url or path to positioning xml
+        sighting_source (str): String of url or path to sighting xml
+        incremental (bool): Only reload the positioning data set incrementally
+    returns:
+        (none)
+    """
+    job['status'] = 'running'
+    try:
+        if incremental:
+            dataset, job['epoch_delta'] = reload_epoch_data(stream_func, epoch_source)
+        else:
+            dataset = load_data_sets(stream_func, epoch_source, sighting_source)
+        job['generation'] = dataset.generation
+        job['status'] = 'done'
+    except Exception as e:
+        logging.exception("LOAD JOB FAILED")
+        job['error'] = f'{type(e).__name__}: {e}'
+        job['status'] = 'failed'
+    job['finished_at'] = datetime.now(timezone.utc).isoformat()
+
+
+def parse_sighting_time(sighting:dict)->float:
+    """
+    Converts the utc_date (e.g. Feb 17, 2022) and utc_time (e.g. 12:13) of a visible pass into POSIX seconds
+    args:
+        sighting (dict): Visible pass dictionary
+    returns:
+        (float): Seconds since 1970-01-01T00:00:00Z, NaN if the pass has no parsable time
+    """
+    try:
+        sighting_dt = datetime.strptime(f"{sighting['utc_date']} {sighting['utc_time']}", SIGHTING_TIME_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        return np.nan
+    return sighting_dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+def parse_sighting_number(value)->float:
+    """
+    Converts a numeric field of a visible pass (duration_minutes, max_elevation) into a float
+    args:
+        value (str): Field value from sighting xml
+    returns:
+        (float): Parsed value, NaN if it is missing or not a number
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_sighting_store(sighting_data:list)->dict:
+    """
+    Parses the time, duration and elevation of every visible pass into typed columns sorted by time
+    args:
+        sighting_data (list): List of visible pass dictionaries
+    returns:
+        sighting_store (dict): Dictionary holding
+                               'times' (np.ndarray) float64 pass times in POSIX seconds, sorted (unparsable last),
+                               'order' (np.ndarray) row of sighting_data for each sorted pass,
+                               'duration' (np.ndarray) float64 duration_minutes,
+                               'elevation' (np.ndarray) float64 max_elevation,
+                               'country' (np.ndarray) int32 code of the pass country,
+                               'country_codes' (dict) country to code
+    """
+    country_codes = {}
+    times = np.array([parse_sighting_time(x) for x in sighting_data], dtype=np.float64)
+    order = np.argsort(times, kind='stable')
+    sighting_store = {
+        'times': times[order],
+        'order': order,
+        'duration': np.array([parse_sighting_number(x.get('duration_minutes')) for x in sighting_data], dtype=np.float64)[order],
+        'elevation': np.array([parse_sighting_number(x.get('max_elevation')) for x in sighting_data], dtype=np.float64)[order],
+        'country': np.array([country_codes.setdefault(x.get('country'), len(country_codes)) for x in sighting_data], dtype=np.int32)[order],
+        'country_codes': country_codes,
+    }
+    logging.info("SIGHTING STORE BUILT SUCCESSFULLY")
+    return sighting_store
+
+
+def query_sightings(sighting_store:dict, sighting_data:list, from_time:float, to_time:float, min_elevation:float=None,
+                    min_duration:float=None, country:str=None)->list:
+    """
+    Finds visible passes in a time range with binary searches on the sorted times, then filters them with vectorized
+    masks on the typed columns
+    args:
+        sighting_store (dict): Sorted columns built by build_sighting_store()
+        sighting_data (list): List of visible pass dictionaries the store was built from
+        from_time (float): Earliest pass time in POSIX seconds
+        to_time (float): Latest pass time in POSIX seconds
+        min_elevation (float): (optional) Minimum max_elevation in degrees
+        min_duration (float): (optional) Minimum duration_minutes
+        country (str): (optional) Country of the passes
+    returns:
+        (list): Visible pass dictionaries in time order
+    """
+    lo = int(np.searchsorted(sighting_store['times'], from_time, side='left'))
+    hi = int(np.searchsorted(sighting_store['times'], to_time, side='right'))
+    mask = np.ones(max(0, hi - lo), dtype=bool)
+    if min_elevation is not None:
+        mask &= sighting_store['elevation'][lo:hi] >= min_elevation
+    if min_duration is not None:
+        mask &= sighting_store['duration'][lo:hi] >= min_duration
+    if country is not None:
+        mask &= sighting_store['country'][lo:hi] == sighting_store['country_codes'].get(country, -1)
+    rows = sighting_store['order'][lo:hi][mask].tolist()
+    if isinstance(sighting_data, SightingList):
+        return sighting_data.take(rows)
+    return [sighting_data[i] for i in rows]
+
+
+def lookup_epochs(epoch_store:dict, epoch_strs:list)->list:
+    """
+    Resolves a batch of exact epoch strings against the epoch index in one pass
+    args:
+        epoch_store (dict): Columnar epoch store
+        epoch_strs (list): Epoch strings to look up
+    returns:
+        state_vectors (list): State vector dictionary (or {'EPOCH','error'} dictionary on a miss) for each input epoch
+    """
+    state_vectors = []
+    for epoch in epoch_strs:
+        idx = epoch_store['index'].get(epoch) if isinstance(epoch, str) else None
+        if idx is None:
+            state_vectors.append({'EPOCH': epoch, 'error': 'NO MATCH FOR INPUT EPOCH KEY FOUND IN DATA SET'})
+        else:
+            state_vectors.append(epoch_state_vector(epoch_store, idx))
+    return state_vectors
+
+
+def lookup_cities(sighting_index:dict, city_keys:list)->list:
+    """
+    Resolves a batch of (country, region, city) keys against the sighting index in one pass
+    args:
+        sighting_index (dict): Index built by build_sighting_index()
+        city_keys (list): [country, region, city] lists or {'country','region','city'} dictionaries
+    returns:
+        results (list): {'country','region','city','sightings'} (or {'country','region','city','error'} on a miss)
+                        dictionary for each input key
+    """
+    results = []
+    for key in city_keys:
+        if isinstance(key, dict):
+            key = [key.get('country'), key.get('region'), key.get('city')]
+        if not isinstance(key, (list, tuple)) or len(key) != 3:
+            results.append({'key': key, 'error': 'KEY MUST BE [country, region, city] OR {"country","region","city"}'})
+            continue
+        country, region, city = key
+        result = {'country': country, 'region': region, 'city': city}
+        country_node = sighting_index.get(country) if isinstance(country, str) else None
+        region_node = country_node['regions'].get(region) if country_node is not None and isinstance(region, str) else None
+        city_sightings = region_node['cities'].get(city) if region_node is not None and isinstance(city, str) else None
+        if country_node is None:
+            result['error'] = 'NO MATCH FOR INPUT COUNTRY KEY FOUND IN DATA SET'
+        elif region_node is None:
+            result['error'] = 'NO MATCH FOR INPUT REGION KEY FOUND IN COUNTRY DATA SET'
+        elif city_sightings is None:
+            result['error'] = 'NO MATCH FOR INPUT CITY KEY FOUND IN COUNTRY-REGION DATA SET'
+        else:
+            result['sightings'] = list(city_sightings)
+        results.append(result)
+    return results
+
+
+def get_batch_body(list_key:str)->list:
+    """
+    Reads the list of keys of a batch request from its json body
+    args:
+        list_key (str): Name of the list when the body is a dictionary
+    returns:
+        (list): Keys of the batch
+        (None): If the body is not a json list (or dictionary holding one under list_key) of at most MAX_BATCH_SIZE keys
+    """
+    body = request.get_json(silent=True)
+    keys = body.get(list_key) if isinstance(body, dict) else body
+    if not isinstance(keys, list) or len(keys) > MAX_BATCH_SIZE:
+        return None
+    return keys
+
+
+def epoch_window(epoch_times:np.ndarray, query_args:dict)->tuple:
+    """
+    Finds the rows of the sorted time axis inside the start/end query arguments with binary searches
+    args:
+        epoch_times (np.ndarray): Sorted epoch times in POSIX seconds
+        query_args (dict): Query string arguments, with optional 'start' and 'end' time strings
+    returns:
+        (tuple): (start, stop) row numbers, stop >= start
+    raises:
+        ValueError: If start or end cannot be parsed
+    """
+    start_idx = 0
+    end_idx = len(epoch_times)
+    if 'start' in query_args:
+        start_idx = int(np.searchsorted(epoch_times, parse_epoch(query_args['start']), side='left'))
+    if 'end' in query_args:
+        end_idx = int(np.searchsorted(epoch_times, parse_epoch(query_args['end']), side='right'))
+    return start_idx, max(start_idx, end_idx)
+
+
+def get_query_args()->dict:
+    """
+    Returns the query string arguments of the current request (empty when a route is called outside of a request)
+    args:
+        (none)
+    returns:
+        (dict): Query string arguments
+    """
+    if has_request_context():
+        return request.args
+    return {}
+
+############################################################################################################################
+### GROUND TRACK FUNCTIONS
+def gmst_angle(epoch_times:np.ndarray)->np.ndarray:
+    """
+    Greenwich mean sidereal time angle (IAU 1982 expression) for POSIX times
+    args:
+        epoch_times (np.ndarray): Seconds since 1970-01-01T00:00:00Z
+    returns:
+        (np.ndarray): GMST in radians, in [0, 2*pi)
+    """
+    days = epoch_times/86400.0 + 2440587.5 - 2451545.0
+    centuries = days/36525.0
+    gmst_deg = 280.46061837 + 360.98564736629*days + 0.000387933*centuries**2 - centuries**3/38710000.0
+    return np.radians(np.mod(gmst_deg, 360.0))
+
+
+def eci_to_ecef(position:np.ndarray, epoch_times:np.ndarray)->np.ndarray:
+    """
+    Rotates inertial X/Y/Z positions by GMST into the earth fixed frame (precession and nutation since J2000 are
+    neglected)
+    args:
+        position (np.ndarray): (n,3) X/Y/Z in km
+        epoch_times (np.ndarray): (n,) POSIX seconds of each position
+    returns:
+        (np.ndarray): (n,3) earth fixed X/Y/Z in km
+    """
+    theta = gmst_angle(epoch_times)
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    return np.column_stack([cos_t*position[:, 0] + sin_t*position[:, 1],
+                            -sin_t*position[:, 0] + cos_t*position[:, 1],
+                            position[:, 2]])
+
+
+def eci_to_geodetic(position:np.ndarray, epoch_times:np.ndarray)->tuple:
+    """
+    Converts inertial X/Y/Z positions to WGS-84 geodetic coordinates in one vectorized pass, rotating by GMST into the
+    earth fixed frame (precession and nutation since J2000 are neglected) and using Bowring's formula for latitude
+    args:
+        position (np.ndarray): (n,3) X/Y/Z in km
+        epoch_times (np.ndarray): (n,) POSIX seconds of each position
+    returns:
+        latitude (np.ndarray): Geodetic latitude in degrees
+        longitude (np.ndarray): Longitude in degrees, in [-180, 180)
+        altitude (np.ndarray): Height above the WGS-84 ellipsoid in km
+    """
+    x, y, z = eci_to_ecef(position, epoch_times).T
+    b = WGS84_A*(1 - WGS84_F)
+    e2 = WGS84_F*(2 - WGS84_F)
+    ep2 = e2/(1 - e2)
+    p = np.hypot(x, y)
+    u = np.arctan2(z*WGS84_A, p*b)
+    lat = np.arctan2(z + ep2*b*np.sin(u)**3, p - e2*WGS84_A*np.cos(u)**3)
+    n = WGS84_A/np.sqrt(1 - e2*np.sin(lat)**2)
+    altitude = p/np.cos(lat) - n
+    longitude = np.mod(np.degrees(np.arctan2(y, x)) + 180.0, 360.0) - 180.0
+    return np.degrees(lat), longitude, altitude
+
+
+def dataset_ground_track(dataset:Dataset)->tuple:
+    """
+    Geodetic ground track of every state vector of a dataset generation, computed once per generation
+    args:
+        dataset (Dataset): Generation to convert
+    returns:
+        (tuple): (latitude, longitude, altitude) arrays parallel to the epoch store (see eci_to_geodetic())
+    """
+    with ground_track_lock:
+        if ground_track_cache['generation'] == dataset.generation:
+            return ground_track_cache['track']
+    track = eci_to_geodetic(dataset.epoch_store['position'], dataset.epoch_store['times'])
+    with ground_track_lock:
+        ground_track_cache['generation'] = dataset.generation
+        ground_track_cache['track'] = track
+    logging.info("GROUND TRACK COMPUTED FOR DATASET GENERATION")
+    return track
+
+
+class GroundTrackRecords(Sequence):
+    """
+    Ground track of a dataset generation as {EPOCH, latitude, longitude, altitude} records, built only for the
+    positions that are read, so the collection routes can paginate and stream it without building the whole list
+    """
+    def __init__(self, dataset:Dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset.epoch_store['times'])
+
+    def __getitem__(self, idx):
+        if not isinstance(idx, slice):
+            if idx < 0:
+                idx += len(self)
+            if not 0 <= idx < len(self):
+                raise IndexError(idx)
+            return self[idx:idx + 1][0]
+        latitude, longitude, altitude = dataset_ground_track(self.dataset)
+        return [{'EPOCH': epoch_str, 'latitude': lat, 'longitude': lon, 'altitude': alt}
+                for epoch_str, lat, lon, alt in zip(self.dataset.epoch_store['epochs'][idx], latitude[idx].tolist(),
+                                                    longitude[idx].tolist(), altitude[idx].tolist())]
+
+
+def carry_ground_track(old_dataset:Dataset, new_dataset:Dataset, reuse_old:np.ndarray, reuse_new:np.ndarray):
+    """
+    Seeds the ground track of an incrementally reloaded generation from the cached track of the generation it
+    replaced, converting only the added and replaced state vectors. Does nothing if the old track was never computed
+    args:
+        old_dataset (Dataset): Generation that was replaced
+        new_dataset (Dataset): Generation that replaced it
+        reuse_old (np.ndarray): Rows of the old epoch store that are unchanged (see diff_epoch_stores())
+        reuse_new (np.ndarray): Matching rows of the new epoch store
+    returns:
+        (none)
+    """
+    with ground_track_lock:
+        if ground_track_cache['generation'] != old_dataset.generation:
+            return
+        old_track = ground_track_cache['track']
+    epoch_store = new_dataset.epoch_store
+    compute_rows = np.setdiff1d(np.arange(len(epoch_store['times'])), reuse_new, assume_unique=True)
+    computed = eci_to_geodetic(epoch_store['position'][compute_rows], epoch_store['times'][compute_rows])
+    track = []
+    for old_column, computed_column in zip(old_track, computed):
+        column = np.empty(len(epoch_store['times']))
+        column[reuse_new] = old_column[reuse_old]
+        column[compute_rows] = computed_column
+        track.append(column)
+    with ground_track_lock:
+        ground_track_cache['generation'] = new_dataset.generation
+        ground_track_cache['track'] = tuple(track)
+    logging.info(f"GROUND TRACK CARRIED OVER - {len(compute_rows)} STATE VECTORS CONVERTED")
+
+
+def carry_pass_samples(old_dataset:Dataset, new_dataset:Dataset):
+    """
+    Seeds the pass prediction samples of a generation whose epoch store was extended in place from those of the
+    generation it replaced. Samples between unchanged state vectors are kept and only the ones past the old last epoch
+    are interpolated. Does nothing if the old samples were never computed or the sample grids do not line up
+    args:
+        old_dataset (Dataset): Generation that was replaced
+        new_dataset (Dataset): Generation that replaced it, sharing the epoch buffer of old_dataset
+    returns:
+        (none)
+    """
+    with pass_cache_lock:
+        if pass_cache['generation'] != old_dataset.generation or pass_cache['samples'] is None:
+            return
+        old_times, old_ecef = pass_cache['samples']
+    epoch_times = new_dataset.epoch_store['times']
+    if len(epoch_times) < 2:
+        return
+    grid_offset = (epoch_times[0] - old_times[0])/PASS_SAMPLE_STEP
+    # the last old sample is the old last epoch rather than a grid point
+    keep = (old_times[:-1] >= epoch_times[0]) & (old_times[:-1] < epoch_times[-1])
+    if abs(grid_offset - round(grid_offset)) > 1e-6 or not keep.any():
+        return
+    kept_times, kept_ecef = old_times[:-1][keep], old_ecef[:-1][keep]
+    tail_times = np.append(np.arange(kept_times[-1] + PASS_SAMPLE_STEP, epoch_times[-1], PASS_SAMPLE_STEP), epoch_times[-1])
+    position, _ = interpolate_state_vectors(new_dataset.epoch_store, tail_times)
+    samples = (np.concatenate([kept_times, tail_times]), np.concatenate([kept_ecef, eci_to_ecef(position, tail_times)]))
+    with pass_cache_lock:
+        if pass_cache['generation'] == old_dataset.generation:
+            pass_cache['generation'] = new_dataset.generation
+            pass_cache['samples'] = samples
+            pass_cache['lru'] = OrderedDict()
+    logging.info(f"PASS SAMPLES CARRIED OVER - {len(tail_times)} SAMPLES INTERPOLATED")
+
+
+def region_intervals(epoch_store:dict, start_time:float, end_time:float, lat_range:tuple, lon_range:tuple)->list:
+    """
+    Finds the time intervals in which the sub-satellite point is inside a latitude/longitude box, by sampling the
+    interpolated ground track every REGION_SAMPLE_STEP seconds in one vectorized pass
+    args:
+        epoch_store (dict): Columnar epoch store, with at least two state vectors
+        start_time (float): POSIX seconds to start searching from (inside the ephemeris)
+        end_time (float): POSIX seconds to stop searching at (inside the ephemeris)
+        lat_range (tuple): (min, max) latitude in degrees
+        lon_range (tuple): (min, max) longitude in degrees, min > max for a box crossing the antimeridian
+    returns:
+        intervals (list): {'start','end','duration_seconds'} dictionary for each visit, start/end being the first and
+                          last sample inside the box
+    """
+    if end_time < start_time:
+        return []
+    sample_times = np.append(np.arange(start_time, end_time, REGION_SAMPLE_STEP), end_time)
+    position, _ = interpolate_state_vectors(epoch_store, sample_times)
+    lat, lon, _ = eci_to_geodetic(position, sample_times)
+    inside = (lat >= lat_range[0]) & (lat <= lat_range[1])
+    if lon_range[0] <= lon_range[1]:
+        inside &= (lon >= lon_range[0]) & (lon <= lon_range[1])
+    else:
+        inside &= (lon >= lon_range[0]) | (lon <= lon_range[1])
+    edges = np.diff(np.concatenate([[0], inside.astype(np.int8), [0]]))
+    intervals = []
+    for first, last in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1):
+        intervals.append({
+            'start': format_epoch(sample_times[first]),
+            'end': format_epoch(sample_times[last]),
+            'duration_seconds': float(sample_times[last] - sample_times[first]),
+        })
+    return intervals
+
+############################################################################################################################
+### PASS PREDICTION FUNCTIONS
+def geodetic_to_ecef(latitude:np.ndarray, longitude:np.ndarray, altitude:np.ndarray)->tuple:
+    """
+    Converts WGS-84 geodetic observer locations to earth fixed positions and local vertical (up) unit vectors
+    args:
+        latitude (np.ndarray): Geodetic latitude in degrees
+        longitude (np.ndarray): Longitude in degrees
+        altitude (np.ndarray): Height above the WGS-84 ellipsoid in km
+    returns:
+        position (np.ndarray): (m,3) earth fixed X/Y/Z in km
+        up (np.ndarray): (m,3) unit vectors normal to the ellipsoid
+    """
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    e2 = WGS84_F*(2 - WGS84_F)
+    n = WGS84_A/np.sqrt(1 - e2*np.sin(lat)**2)
+    up = np.column_stack([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)])
+    position = np.column_stack([(n + altitude)*up[:, 0], (n + altitude)*up[:, 1], (n*(1 - e2) + altitude)*up[:, 2]])
+    return position, up
+
+
+def pass_samples(dataset:Dataset)->tuple:
+    """
+    Earth fixed positions interpolated every PASS_SAMPLE_STEP seconds over the whole ephemeris, computed once per
+    generation and shared by every observer
+    args:
+        dataset (Dataset): Generation to sample, with at least two state vectors
+    returns:
+        sample_times (np.ndarray): POSIX seconds of each sample, the last one at the last epoch
+        sample_ecef (np.ndarray): (n,3) earth fixed X/Y/Z in km
+    """
+    with pass_cache_lock:
+        if pass_cache['generation'] == dataset.generation and pass_cache['samples'] is not None:
+            return pass_cache['samples']
+    epoch_times = dataset.epoch_store['times']
+    sample_times = np.append(np.arange(epoch_times[0], epoch_times[-1], PASS_SAMPLE_STEP), epoch_times[-1])
+    position, _ = interpolate_state_vectors(dataset.epoch_store, sample_times)
+    samples = (sample_times, eci_to_ecef(position, sample_times))
+    with pass_cache_lock:
+        if pass_cache['generation'] != dataset.generation:
+            pass_cache['generation'] = dataset.generation
+            pass_cache['lru'] = OrderedDict()
+        pass_cache['samples'] = samples
+    logging.info("PASS SAMPLES COMPUTED FOR DATASET GENERATION")
+    return samples
+
+
+def sine_elevation(epoch_store:dict, times:np.ndarray, observer_ecef:np.ndarray, observer_up:np.ndarray)->np.ndarray:
+    """
+    Sine of the elevation of the interpolated ISS position above the horizon of each observer at the matching time
+    args:
+        epoch_store (dict): Columnar epoch store
+        times (np.ndarray): (k,) POSIX seconds inside the ephemeris
+        observer_ecef (np.ndarray): (k,3) earth fixed observer positions in km
+        observer_up (np.ndarray): (k,3) observer up unit vectors
+    returns:
+        (np.ndarray): (k,) sine of the elevation
+    """
+    position, _ = interpolate_state_vectors(epoch_store, times)
+    line_of_sight = eci_to_ecef(position, times) - observer_ecef
+    return np.einsum('ij,ij->i', line_of_sight, observer_up)/np.linalg.norm(line_of_sight, axis=1)
+
+
+def refine_crossings(epoch_store:dict, t_lo:np.ndarray, t_hi:np.ndarray, f_lo:np.ndarray, f_hi:np.ndarray,
+                     observer_ecef:np.ndarray, observer_up:np.ndarray, threshold:float, iterations:int=3)->np.ndarray:
+    """
+    Refines the times at which the elevation crosses the threshold between two samples by false position, evaluating
+    the interpolated ephemeris at every step, for all crossings at once
+    args:
+        epoch_store (dict): Columnar epoch store
+        t_lo, t_hi (np.ndarray): (k,) POSIX seconds of the samples bracketing each crossing
+        f_lo, f_hi (np.ndarray): (k,) sine of the elevation at those samples
+        observer_ecef (np.ndarray): (k,3) earth fixed observer positions in km
+        observer_up (np.ndarray): (k,3) observer up unit vectors
+        threshold (float): Sine of the threshold elevation
+        iterations (int): False position steps
+    returns:
+        (np.ndarray): (k,) POSIX seconds of each crossing
+    """
+    t_lo, t_hi, f_lo, f_hi = t_lo.copy(), t_hi.copy(), f_lo - threshold, f_hi - threshold
+    t_mid = t_lo + (t_hi - t_lo)*f_lo/(f_lo - f_hi)
+    for _ in range(iterations):
+        f_mid = sine_elevation(epoch_store, t_mid, observer_ecef, observer_up) - threshold
+        lower = np.sign(f_mid) == np.sign(f_lo)
+        t_lo, f_lo = np.where(lower, t_mid, t_lo), np.where(lower, f_mid, f_lo)
+        t_hi, f_hi = np.where(lower, t_hi, t_mid), np.where(lower, f_hi, f_mid)
+        t_mid = t_lo + (t_hi - t_lo)*f_lo/(f_lo - f_hi)
+    return t_mid
+
+
+def refine_culminations(epoch_store:dict, peak_times:np.ndarray, observer_ecef:np.ndarray, observer_up:np.ndarray,
+                        step:float)->tuple:
+    """
+    Refines the times of highest elevation by fitting a parabola through the interpolated ephemeris a step either
+    side of each estimate, for all passes at once
+    args:
+        epoch_store (dict): Columnar epoch store
+        peak_times (np.ndarray): (k,) POSIX seconds of the estimated culminations
+        observer_ecef (np.ndarray): (k,3) earth fixed observer positions in km
+        observer_up (np.ndarray): (k,3) observer up unit vectors
+        step (float): Seconds either side of the estimate to evaluate
+    returns:
+        peak_times (np.ndarray): (k,) POSIX seconds of each culmination
+        peak_sin (np.ndarray): (k,) sine of the elevation at culmination
+    """
+    epoch_times = epoch_store['times']
+    lo = np.maximum(peak_times - step, epoch_times[0])
+    hi = np.minimum(peak_times + step, epoch_times[-1])
+    f0, f1, f2 = (sine_elevation(epoch_store, t, observer_ecef, observer_up) for t in (lo, peak_times, hi))
+    curvature = f0 - 2*f1 + f2
+    safe = (curvature < 0) & (lo < peak_times) & (peak_times < hi)
+    offset = np.clip(0.5*(f0 - f2)/np.where(safe, curvature, -1.0), -1, 1)
+    vertex_times = np.where(safe, peak_times + offset*step, peak_times)
+    vertex_sin = sine_elevation(epoch_store, vertex_times, observer_ecef, observer_up)
+    better = vertex_sin > f1
+    return np.where(better, vertex_times, peak_times), np.where(better, vertex_sin, f1)
+
+
+def predict_passes(dataset:Dataset, observers:np.ndarray, min_elevation:float)->list:
+    """
+    Predicts the passes of the ISS over many observers. Look angles are evaluated for all sample times and a chunk of
+    observers with a pair of matrix products, each run of samples above min_elevation is one pass, its rise and set
+    are refined by false position and its culmination by parabolas through the interpolated ephemeris. Passes are
+    geometric (sunlight and darkness are ignored)
+    args:
+        dataset (Dataset): Generation to predict from, with at least two state vectors
+        observers (np.ndarray): (m,3) latitude (deg), longitude (deg) and altitude (km) of each observer
+        min_elevation (float): Elevation in degrees (0 to 90) at which a pass rises and sets
+    returns:
+        passes (list): For each observer, a list of {'rise','culmination','set','max_elevation','duration_seconds'}
+                       dictionaries in time order ('rise'/'set' are None for passes cut off by the ephemeris)
+    """
+    epoch_store = dataset.epoch_store
+    sample_times, sample_ecef = pass_samples(dataset)
+    last = len(sample_times) - 1
+    observer_ecef, observer_up = geodetic_to_ecef(observers[:, 0], observers[:, 1], observers[:, 2])
+    threshold = np.sin(np.radians(min_elevation))
+    chunk_size = max(1, PASS_CHUNK_ELEMENTS//len(sample_times))
+    passes = []
+    for chunk in range(0, len(observers), chunk_size):
+        obs, up = observer_ecef[chunk:chunk+chunk_size], observer_up[chunk:chunk+chunk_size]
+        # (observers, samples) height above the horizon plane; the range is only needed where that is positive
+        height = up @ sample_ecef.T
+        height -= np.einsum('ij,ij->i', obs, up)[:, None]
+        obs_idx, sample_idx = np.nonzero(height > 0)
+        def sin_at(o, i):
+            line_of_sight = sample_ecef[i] - obs[o]
+            return np.einsum('ij,ij->i', line_of_sight, up[o])/np.linalg.norm(line_of_sight, axis=1)
+        sin_el = sin_at(obs_idx, sample_idx)
+        above = sin_el > threshold
+        obs_idx, sample_idx, sin_el = obs_idx[above], sample_idx[above], sin_el[above]
+        if len(obs_idx) == 0:
+            passes.extend([] for _ in range(len(obs)))
+            continue
+        # every run of consecutive samples above the threshold for one observer is a pass
+        run_start = np.flatnonzero((np.diff(obs_idx, prepend=-1) != 0) | (np.diff(sample_idx, prepend=-2) != 1))
+        run_end = np.append(run_start[1:], len(obs_idx)) - 1
+        run_id = np.repeat(np.arange(len(run_start)), np.diff(np.append(run_start, len(obs_idx))))
+        peak = np.lexsort((-sin_el, run_id))[run_start]
+        pass_obs, first, final = obs_idx[run_start], sample_idx[run_start], sample_idx[run_end]
+        rise_times = np.full(len(run_start), np.nan)
+        set_times = np.full(len(run_start), np.nan)
+        has_rise, has_set = first > 0, final < last
+        o, i = pass_obs[has_rise], first[has_rise]
+        rise_times[has_rise] = refine_crossings(epoch_store, sample_times[i - 1], sample_times[i], sin_at(o, i - 1),
+                                                sin_at(o, i), obs[o], up[o], threshold)
+        o, i = pass_obs[has_set], final[has_set]
+        set_times[has_set] = refine_crossings(epoch_store, sample_times[i], sample_times[i + 1], sin_at(o, i),
+                                              sin_at(o, i + 1), obs[o], up[o], threshold)
+        peak_times, peak_sin = refine_culminations(epoch_store, sample_times[sample_idx[peak]], obs[pass_obs],
+                                                   up[pass_obs], PASS_SAMPLE_STEP/2)
+        peak_sin = np.maximum(peak_sin, sin_el[peak])
+        max_elevation = np.round(np.degrees(np.arcsin(np.clip(peak_sin, -1, 1))), 2).tolist()
+        duration = np.round(set_times - rise_times, 1).tolist()
+        rise_strs = format_epochs(np.nan_to_num(rise_times))
+        set_strs = format_epochs(np.nan_to_num(set_times))
+        peak_strs = format_epochs(peak_times)
+        chunk_passes = [[] for _ in range(len(obs))]
+        for n, k in enumerate(pass_obs.tolist()):
+            chunk_passes[k].append({
+                'rise': rise_strs[n] if first[n] > 0 else None,
+                'culmination': peak_strs[n],
+                'set': set_strs[n] if final[n] < last else None,
+                'max_elevation': max_elevation[n],
+                'duration_seconds': duration[n] if first[n] > 0 and final[n] < last else None,
+            })
+        passes.extend(chunk_passes)
+    return passes
+
+
+def observer_passes(dataset:Dataset, observers:list, min_elevation:float)->list:
+    """
+    Pass predictions for a batch of observers, rounded to PASS_LOCATION_DECIMALS and served from a per generation
+    LRU cache, predicting every uncached location in one vectorized call
+    args:
+        dataset (Dataset): Generation to predict from, with at least two state vectors
+        observers (list): (latitude, longitude, altitude) tuples in degrees, degrees and km
+        min_elevation (float): Elevation in degrees at which a pass rises and sets
+    returns:
+        passes (list): List of passes (see predict_passes()) for each observer
+    """
+    keys = [(round(lat, PASS_LOCATION_DECIMALS), round((lon + 180.0) % 360.0 - 180.0, PASS_LOCATION_DECIMALS),
+             round(alt, 3), float(min_elevation)) for lat, lon, alt in observers]
+    found = {}
+    with pass_cache_lock:
+        if pass_cache['generation'] != dataset.generation:
+            pass_cache.update({'generation': dataset.generation, 'samples': None, 'lru': OrderedDict()})
+        for key in keys:
+            if key in pass_cache['lru']:
+                pass_cache['lru'].move_to_end(key)
+                found[key] = pass_cache['lru'][key]
+    missing = list(dict.fromkeys(key for key in keys if key not in found))
+    if missing:
+        predicted = predict_passes(dataset, np.array([key[:3] for key in missing], dtype=float), min_elevation)
+        found.update(zip(missing, predicted))
+        with pass_cache_lock:
+            if pass_cache['generation'] == dataset.generation:
+                for key in missing:
+                    pass_cache['lru'][key] = found[key]
+                while len(pass_cache['lru']) > PASS_CACHE_SIZE:
+                    pass_cache['lru'].popitem(last=False)
+    return [found[key] for key in keys]
+
+
+def parse_observer(observer)->tuple:
+    """
+    Reads an observer location from a [lat, lon(, alt)] list or {'lat','lon'(,'alt')} dictionary
+    args:
+        observer (list or dict): Latitude and longitude in degrees, optional altitude in km (default 0)
+    returns:
+        (tuple): (latitude, longitude, altitude) floats
+    raises:
+        ValueError: If the location is malformed or the latitude is outside [-90, 90]
+    """
+    if isinstance(observer, dict):
+        observer = [observer.get('lat'), observer.get('lon'), observer.get('alt', 0.0)]
+    if not isinstance(observer, (list, tuple)) or len(observer) not in (2, 3):
+        raise ValueError('observer must be [lat, lon, alt] or {"lat","lon","alt"}')
+    lat, lon, alt = (list(observer) + [0.0])[:3]
+    if any(isinstance(x, bool) or not isinstance(x, (int, float)) for x in (lat, lon, alt)):
+        raise ValueError('observer coordinates must be numbers')
+    lat, lon, alt = float(lat), float(lon), float(alt)
+    if not (-90.0 <= lat <= 90.0 and np.isfinite(lon) and np.isfinite(alt)):
+        raise ValueError('observer latitude must be within [-90, 90]')
+    return lat, lon, alt
+
+
+def get_min_elevation(query_args:dict)->float:
+    """
+    Reads the min_elevation query argument of the pass routes
+    args:
+        query_args (dict): Query string arguments
+    returns:
+        (float): Elevation in degrees, PASS_MIN_ELEVATION if not given
+    raises:
+        ValueError: If it is not a number in [0, 90)
+    """
+    min_elevation = float(query_args.get('min_elevation', PASS_MIN_ELEVATION))
+    if not 0.0 <= min_elevation < 90.0:
+        raise ValueError('min_elevation must be within [0, 90)')
+    return min_elevation
+
+############################################################################################################################
+### SNAPSHOT FUNCTIONS
+def source_signature(source_str:str)->str:
+    """
+    Describes the current version of a data source so snapshots of it can be checked for staleness without parsing it
+    args:
+        source_str (str): String of url or path to ISS data xml
+    returns:
+        (str): Path with modification time and size for files, url with ETag/Last-Modified validators for urls
+        (None): If the url offers no validators (its snapshot could never be checked for staleness)
+    """
+    if source_str.startswith(('http://', 'https://')):
+        head_resp = http_session.head(url=source_str, allow_redirects=True, timeout=HTTP_TIMEOUT)
+        validators = [head_resp.headers.get(key, '') for key in ('ETag', 'Last-Modified', 'Content-Length')]
+        if not (validators[0] or validators[1]):
+            return None
+        return '|'.join([source_str] + validators)
+    file_stat = os.stat(source_str)
+    return f'{os.path.abspath(source_str)}|{file_stat.st_mtime_ns}|{file_stat.st_size}'
+
+
+def snapshot_path(kind:str, source_str:str, base_dir:str=None)->str:
+    """
+    Directory that holds the snapshot of a data source (one per source, overwritten when the source changes)
+    args:
+        kind (str): 'epoch' or 'sighting'
+        source_str (str): String of url or path to ISS data xml
+        base_dir (str): Directory holding the snapshots, defaults to SNAPSHOT_DIR
+    returns:
+        (str): Path of snapshot directory
+    """
+    source_key = source_str if source_str.startswith(('http://', 'https://')) else os.path.abspath(source_str)
+    return os.path.join(base_dir or SNAPSHOT_DIR, f'{kind}-{hashlib.sha256(source_key.encode()).hexdigest()[:16]}')
+
+
+def write_snapshot(kind:str, source_str:str, signature:str, arrays:dict, meta:dict, base_dir:str=None):
+    """
+    Writes numpy arrays and a json metadata file into a fresh snapshot directory, then swaps it into place
+    args:
+        kind (str): 'epoch' or 'sighting'
+        source_str (str): String of url or path to ISS data xml
+        signature (str): Signature of the source the arrays were parsed from
+        arrays (dict): File name stem to np.ndarray or bytes (string tables)
+        meta (dict): Json serializable metadata
+        base_dir (str): Directory holding the snapshots, defaults to SNAPSHOT_DIR
+    returns:
+        (none)
+    """
+    base_dir = base_dir or SNAPSHOT_DIR
+    target_dir = snapshot_path(kind, source_str, base_dir)
+    os.makedirs(base_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=base_dir, prefix='.tmp-')
+    try:
+        for name, value in arrays.items():
+            if isinstance(value, bytes):
+                with open(os.path.join(tmp_dir, name + '.bin'), 'wb') as f:
+                    f.write(value)
+            else:
+                np.save(os.path.join(tmp_dir, name + '.npy'), value)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(dict(meta, signature=signature), f)
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.rename(tmp_dir, target_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    logging.info("SNAPSHOT WRITTEN SUCCESSFULLY")
+
+
+def read_snapshot_meta(kind:str, source_str:str, signature:str, base_dir:str=None)->dict:
+    """
+    Reads the metadata of a data source snapshot if it was taken from the same version of the source
+    args:
+        kind (str): 'epoch' or 'sighting'
+        source_str (str): String of url or path to ISS data xml
+        signature (str): Current signature of the source
+        base_dir (str): Directory holding the snapshots, defaults to SNAPSHOT_DIR
+    returns:
+        (dict): Snapshot metadata
+        (None): If there is no snapshot or it is stale
+    """
+    try:
+        with open(os.path.join(snapshot_path(kind, source_str, base_dir), 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('signature') != signature:
+        logging.info("SNAPSHOT IS STALE")
+        return None
+    return meta
+
+
+def save_epoch_snapshot(source_str:str, signature:str, epoch_store:dict, base_dir:str=None):
+    """
+    Writes the columnar epoch store to disk as fixed width epoch strings and float64 arrays
+    args:
+        source_str (str): String of url or path to positioning xml
+        signature (str): Signature of the source the store was parsed from
+        epoch_store (dict): Columnar epoch store
+        base_dir (str): Directory holding the snapshots, defaults to SNAPSHOT_DIR
+    returns:
+        (none)
+    """
+    arrays = {
+        'epochs': np.array(list(epoch_store['epochs']), dtype=np.bytes_),
+        'times': epoch_store['times'],
+        'position': epoch_store['position'],
+        'velocity': epoch_store['velocity'],
+    }
+    write_snapshot('epoch', source_str, signature, arrays, {'units': epoch_store['units']}, base_dir)
+
+
+def load_epoch_snapshot(source_str:str, signature:str, base_dir:str=None)->dict:
+    """
+    Memory maps the epoch store snapshot of a source
+    args:
+        source_str (str): String of url or path to positioning xml
+        signature (str): Current signature of the source
+        base_dir (str): Directory holding the snapshots, defaults to SNAPSHOT_DIR
+    returns:
+        epoch_store (dict): Columnar epoch store backed by read-only memory maps
+        (None): If there is no current snapshot of the source
+    """
+    meta = read_snapshot_meta('epoch', source_str, signature, base_dir)
+    if meta is None:
+        return None
+    snap_dir = snapshot_path('epoch', source_str, base_dir)
+    arrays = {name: np.load(os.path.join(snap_dir, name + '.npy'), mmap_mode='r') for name in ('epochs', 'times', 'position', 'velocity')}
+    epoch_list = [x.decode() for x in arrays['epochs'].tolist()]
+    logging.info("EPOCH SNAPSHOT LOADED SUCCESSFULLY")
+    return make_epoch_store(epoch_list, arrays['times'], arrays['position'], arrays['velocity'], meta['units'])
+
+
+def encode_sighting_data(sighting_data:list)->tuple:
+    """
+    Encodes the sighting data set as a string table and an int32 (passes x fields) array of string table codes
+    (-1 for a missing field, -2 for an empty one)
+    args:
+        sighting_data (list): List of visible pass dictionaries
+    returns:
+        fields (list): Field names, in order of first appearance
+        codes (np.ndarray): int32 (passes x fields) string table codes
+        strings (list): String table
+    """
+    fields = []
+    for x in sighting_data:
+        for key in x:
+            if key not in fields:
+                fields.append(key)
+    string_codes = {}
+    codes = np.full((len(sighting_data), len(fields)), -1, dtype=np.int32)
+    for i, x in enumerate(sighting_data):
+        for j, key in enumerate(fields):
+            if key in x:
+                codes[i, j] = -2 if x[key] is None else string_codes.setdefault(x[key], len(string_codes))
+    return fields, codes, list(string_codes)
+
+
+def decode_sighting_data(fields:list, codes:np.ndarray, strings:list)->list:
+    """
+    Rebuilds the sighting data set encoded by encode_sighting_data()
+    args:
+        fields (list): Field names
+        codes (np.ndarray): int32 (passes x fields) string table codes
+        strings (list): String table
+    returns:
+        sighting_data (list): List of visible pass dictionaries
+    """
+    sighting_data = []
+    for row in codes.tolist():
+        sighting_data.append({key: (None if code == -2 else strings[code]) for key, code in zip(fields, row) if code != -1})
+    return sighting_data
+
+
+def save_sighting_snapshot(source_str:str, signature:str, sighting_data:list, base_dir:str=None):
+    """
+    Writes the sighting data set to disk encoded by encode_sighting_data(), the string table joined by NUL characters
+    args:
+        source_str (str): String of url or path to sighting xml
+        signature (str): Signature of the source the data set was parsed from
+        sighting_data (list): List of visible pass dictionaries
+        base_dir (str): Directory holding the snapshots, defaults to SNAPSHOT_DIR
+    returns:
+        (none)
+    """
+    fields, codes, strings = encode_sighting_data(sighting_data)
+    arrays = {'codes': codes, 'strings': '\x00'.join(strings).encode()}
+    write_snapshot('sighting', source_str, signature, arrays, {'fields': fields, 'string_count': len(strings)}, base_dir)
+
+
+def load_sighting_snapshot(source_str:str, signature:str, base_dir:str=None)->list:
+    """
+    Rebuilds the sighting data set from its snapshot
+    args:
+        source_str (str): String of url or path to sighting xml
+        signature (str): Current signature of the source
+        base_dir (str): Directory holding the snapshots, defaults to SNAPSHOT_DIR
+    returns:
+        sighting_data (list): List of visible pass dictionaries
+        (None): If there is no current snapshot of the source
+    """
+    meta = read_snapshot_meta('sighting', source_str, signature, base_dir)
+    if meta is None:
+        return None
+    snap_dir = snapshot_path('sighting', source_str, base_dir)
+    codes = np.load(os.path.join(snap_dir, 'codes.npy'), mmap_mode='r')
+    with open(os.path.join(snap_dir, 'strings.bin'), 'rb') as f:
+        strings = f.read().decode().split('\x00') if meta['string_count'] else []
+    sighting_data = decode_sighting_data(meta['fields'], codes, strings)
+    logging.info("SIGHTING SNAPSHOT LOADED SUCCESSFULLY")
+    return sighting_data
+
+
+def load_with_snapshot(kind:str, stream_func, source_str:str, parse_func=None):
+    """
+    Loads a data source from its snapshot when the snapshot is current, otherwise streams and parses the xml and
+    snapshots the result for the next load
+    args:
+        kind (str): 'epoch' or 'sighting'
+        stream_func (callable): stream_xml_data_url or stream_xml_data_file
+        source_str (str): String of url or path to ISS data xml
+        parse_func (callable): Replaces stream_epoch_store/stream_sighting_data, e.g. to parse in another process
+    returns:
+        (dict): Columnar epoch store for 'epoch'
+        (list): List of visible pass dictionaries for 'sighting'
+    """
+    load_func, save_func, default_parse_func = {
+        'epoch': (load_epoch_snapshot, save_epoch_snapshot, stream_epoch_store),
+        'sighting': (load_sighting_snapshot, save_sighting_snapshot, stream_sighting_data),
+    }[kind]
+    parse_func = parse_func or default_parse_func
+    start = time.perf_counter()
+    if SNAPSHOT_DIR is None:
+        data = parse_func(stream_func, source_str)
+        record_load(kind, 'parse', time.perf_counter() - start)
+        return data
+    signature = source_signature(source_str)
+    if signature is not None:
+        try:
+            data = load_func(source_str, signature)
+        except (OSError, ValueError, IndexError, KeyError):
+            logging.warning("UNABLE TO READ SNAPSHOT - PARSING SOURCE INSTEAD")
+            data = None
+        if data is not None:
+            record_load(kind, 'snapshot', time.perf_counter() - start)
+            return data
+    start = time.perf_counter()
+    data = parse_func(stream_func, source_str)
+    record_load(kind, 'parse', time.perf_counter() - start)
+    if signature is not None:
+        try:
+            save_func(source_str, signature, data)
+        except OSError:
+            logging.warning("UNABLE TO WRITE SNAPSHOT")
+    return data
+
+
+def restore_from_snapshots(epoch_source:str, sighting_source)->bool:
+    """
+    Loads the data sets at start up only if all sources have current snapshots, so a cold start never parses xml
+    args:
+        epoch_source (str): String of url or path to positioning xml
+        sighting_source (str or list): String of url or path to sighting xml, or a list or glob of them
+    returns:
+        (bool): True if the data sets were restored
+    """
+    if SNAPSHOT_DIR is None:
+        return False
+    try:
+        epoch_store = load_epoch_snapshot(epoch_source, source_signature(epoch_source))
+        shards = [load_sighting_snapshot(source_str, source_signature(source_str))
+                  for source_str in expand_sources(sighting_source)]
+    except (OSError, ValueError, IndexError, KeyError, requests.exceptions.RequestException):
+        logging.warning("UNABLE TO RESTORE DATA FROM SNAPSHOTS")
+        return False
+    if epoch_store is None or any(shard is None for shard in shards):
+        return False
+    sighting_data = merge_sighting_shards(shards)
+    publish_dataset(epoch_store, sighting_data, {'epoch': epoch_source, 'sighting': sighting_source})
+    logging.info("DATA RESTORED FROM SNAPSHOTS")
+    return True
+
+############################################################################################################################
+### METRICS FUNCTIONS
+def record_load(kind:str, stage:str, seconds:float):
+    """
+    Adds the duration of one stage of loading a data source to load_metrics
+    args:
+        kind (str): 'epoch' or 'sighting'
+        stage (str): 'fetch' (url download), 'parse' (xml parse, including the download when streamed) or 'snapshot'
+        seconds (float): Duration of the stage
+    returns:
+        (none)
+    """
+    with metrics_lock:
+        stats = load_metrics.setdefault(kind, {}).setdefault(stage, {
+            'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'last_seconds': None, 'last_at': None,
+        })
+        stats['count'] += 1
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        stats['last_seconds'] = seconds
+        stats['last_at'] = datetime.now(timezone.utc).isoformat()
+
+
+def record_request(route:str, method:str, status_code:int, seconds:float):
+    """
+    Counts a request and adds its latency to the histogram of its route
+    args:
+        route (str): Url rule of the route, e.g. /epochs/<epoch>
+        method (str): Http method
+        status_code (int): Status code of the response
+        seconds (float): Time taken to build the response
+    returns:
+        (none)
+    """
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with metrics_lock:
+        stats = route_metrics.get((route, method))
+        if stats is None:
+            stats = route_metrics[(route, method)] = {
+                'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'status': {}, 'buckets': [0]*(len(LATENCY_BUCKETS)+1),
+            }
+        stats['count'] += 1
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        stats['status'][status_code] = stats['status'].get(status_code, 0) + 1
+        stats['buckets'][bucket] += 1
+
+
+@app.before_request
+def start_request_metrics():
+    """
+    Starts the request timer, applies LOG_LEVEL and decides whether the request's DEBUG/INFO lines are logged
+    """
+    g.request_start = time.perf_counter()
+    apply_log_level()
+    if REQUEST_LOG_SAMPLE_RATE < 1.0:
+        g.log_sampled = random.random() < REQUEST_LOG_SAMPLE_RATE
+
+
+@app.after_request
+def note_response_status(response):
+    """
+    Remembers the status code of the response for finish_request_metrics()
+    """
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    """
+    Records the count and latency of a finished request. Runs even when the view raised, which Flask skips the
+    after_request hooks for, so requests that ended in an unhandled exception are counted as 500s
+    """
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        status = 500 if exc is not None else g.get('response_status', 500)
+        record_request(route, request.method, status, time.perf_counter() - start)
+
+
+def metrics_snapshot()->dict:
+    """
+    Collects the request, load, dataset and cache metrics of this process
+    args:
+        (none)
+    returns:
+        (dict): Json serializable metrics
+    """
+    with metrics_lock:
+        routes = []
+        for (route, method), stats in route_metrics.items():
+            cumulative = list(itertools.accumulate(stats['buckets']))
+            routes.append({
+                'route': route, 'method': method, 'count': stats['count'],
+                'status': {str(code): count for code, count in stats['status'].items()},
+                'mean_ms': 1000*stats['total_seconds']/stats['count'], 'max_ms': 1000*stats['max_seconds'],
+                'total_seconds': stats['total_seconds'],
+                'latency_buckets': dict(zip([str(x) for x in LATENCY_BUCKETS] + ['+Inf'], cumulative)),
+            })
+        loads = {kind: {stage: dict(stats) for stage, stats in stages.items()} for kind, stages in load_metrics.items()}
+    with response_cache_lock:
+        cache = dict(response_cache_stats, entries=len(response_cache['pinned']) + len(response_cache['lru']))
+    lookups = cache['hits'] + cache['misses']
+    cache['hit_rate'] = cache['hits']/lookups if lookups else None
+    dataset = iss_dataset
+    with load_jobs_lock:
+        job_status = [job['status'] for job in load_jobs.values()]
+    return {
+        'uptime_seconds': time.time() - started_at,
+        'routes': routes,
+        'loads': loads,
+        'fetch': fetch_stats_snapshot(),
+        'dataset': None if dataset is None else {
+            'generation': dataset.generation, 'loaded_at': dataset.loaded_at, 'sources': dataset.sources,
+            'epochs': len(dataset.epoch_store['epochs']), 'sightings': len(dataset.sighting_data),
+            'countries': len(dataset.sighting_index), 'epoch_delta': dataset.epoch_delta,
+        },
+        'response_cache': cache,
+        'ground_track_cached': dataset is not None and ground_track_cache['generation'] == dataset.generation,
+        'load_jobs': {status: job_status.count(status) for status in set(job_status)},
+        'logging': {'level': logging.getLevelName(logging.getLogger().level), 'request_sample_rate': REQUEST_LOG_SAMPLE_RATE,
+                    'queued_records': log_queue.qsize()},
+    }
+
+
+def prometheus_metrics(metrics:dict)->str:
+    """
+    Renders metrics_snapshot() in the Prometheus text exposition format
+    args:
+        metrics (dict): Metrics from metrics_snapshot()
+    returns:
+        (str): Prometheus text
+    """
+    lines = [f'isspsdt_uptime_seconds {metrics["uptime_seconds"]}']
+    for x in metrics['routes']:
+        labels = f'route="{x["route"]}",method="{x["method"]}"'
+        for code, count in x['status'].items():
+            lines.append(f'isspsdt_requests_total{{{labels},status="{code}"}} {count}')
+        for le, count in x['latency_buckets'].items():
+            lines.append(f'isspsdt_request_duration_seconds_bucket{{{labels},le="{le}"}} {count}')
+        lines.append(f'isspsdt_request_duration_seconds_sum{{{labels}}} {x["total_seconds"]}')
+        lines.append(f'isspsdt_request_duration_seconds_count{{{labels}}} {x["count"]}')
+    for kind, stages in metrics['loads'].items():
+        for stage, stats in stages.items():
+            labels = f'kind="{kind}",stage="{stage}"'
+            lines.append(f'isspsdt_load_seconds_sum{{{labels}}} {stats["total_seconds"]}')
+            lines.append(f'isspsdt_load_seconds_count{{{labels}}} {stats["count"]}')
+            lines.append(f'isspsdt_load_last_seconds{{{labels}}} {stats["last_seconds"]}')
+    dataset = metrics['dataset']
+    if dataset is not None:
+        lines.append(f'isspsdt_dataset_generation {dataset["generation"]}')
+        lines.append(f'isspsdt_dataset_loaded_timestamp_seconds {datetime.fromisoformat(dataset["loaded_at"]).timestamp()}')
+        for key in ('epochs', 'sightings', 'countries'):
+            lines.append(f'isspsdt_dataset_{key} {dataset[key]}')
+    for key in ('hits', 'misses', 'not_modified', 'evictions'):
+        lines.append(f'isspsdt_response_cache_{key}_total {metrics["response_cache"][key]}')
+    lines.append(f'isspsdt_response_cache_entries {metrics["response_cache"]["entries"]}')
+    lines.append(f'isspsdt_log_queued_records {metrics["logging"]["queued_records"]}')
+    return '\n'.join(lines) + '\n'
+
+############################################################################################################################
+### SHARED DATASET FUNCTIONS
+class StringTable(Sequence):
+    """
+    String table of a shared generation, utf-8 encoded back to back in one mapped byte array with an array of offsets,
+    decoded on access
+    """
+    def __init__(self, data:np.ndarray, offsets:np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code):
+        return self.data[self.offsets[code]:self.offsets[code + 1]].tobytes().decode()
+
+
+class StringArray(Sequence):
+    """
+    Epoch strings of a shared generation, held in a mapped fixed width bytes array and decoded on access
+    """
+    def __init__(self, data:np.ndarray):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [x.decode() for x in self.data[idx].tolist()]
+        return self.data[idx].decode()
+
+
+class SortedIndex(Mapping):
+    """
+    Epoch string to row number lookup of a shared generation, found by binary search over its mapped sorted epoch
+    strings. The last of repeated epochs wins, as in a dictionary built in row order
+    """
+    def __init__(self, keys:np.ndarray, rows:np.ndarray):
+        self.keys = keys
+        self.rows = rows
+
+    def __getitem__(self, epoch_str):
+        try:
+            key = epoch_str.encode()
+        except (AttributeError, UnicodeEncodeError):
+            raise KeyError(epoch_str)
+        i = int(np.searchsorted(self.keys, key, side='right')) - 1
+        if i < 0 or self.keys[i] != key:
+            raise KeyError(epoch_str)
+        return int(self.rows[i])
+
+    def __iter__(self):
+        return iter(dict.fromkeys(x.decode() for x in self.keys.tolist()))
+
+    def __len__(self):
+        return len(np.unique(self.keys))
+
+
+class SightingList(Sequence):
+    """
+    Visible pass dictionaries of a shared generation, decoded on access from its mapped (passes x fields) code array
+    (see encode_sighting_data()). rows selects passes, e.g. those of one city, in data set order
+    """
+    def __init__(self, tables:dict, rows:np.ndarray=None):
+        self.tables = tables
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.tables['codes'] if self.rows is None else self.rows)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.take(np.arange(*idx.indices(len(self))))
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return self.take([idx])[0]
+
+    def __iter__(self):
+        for start in range(0, len(self), NDJSON_CHUNK_SIZE):
+            yield from self[start:start + NDJSON_CHUNK_SIZE]
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, SightingList)):
+            return NotImplemented
+        return len(other) == len(self) and all(a == b for a, b in zip(self, other))
+
+    def take(self, positions)->list:
+        """
+        Decodes a batch of passes, each distinct string once
+        args:
+            positions (list): Positions of the passes in the list
+        returns:
+            (list): Visible pass dictionaries
+        """
+        rows = np.asarray(positions, dtype=np.int64)
+        block = self.tables['codes'][rows if self.rows is None else self.rows[rows]]
+        strings = {code: self.tables['strings'][code] for code in np.unique(block[block >= 0]).tolist()}
+        strings[-2] = None
+        fields = self.tables['fields']
+        return [{key: strings[code] for key, code in zip(fields, row) if code != -1} for row in block.tolist()]
+
+
+class SightingNames(Mapping):
+    """
+    Name to node number lookup of the children of one node of the shared sighting tree (the countries of the root, the
+    regions of a country or the cities of a region), iterated in order of first appearance and found by binary search
+    over the children sorted by name
+    """
+    def __init__(self, tables:dict, level:str, parent:int):
+        self.tables = tables
+        self.level = level
+        self.start = int(tables[f'{level}_offsets'][parent])
+        self.stop = int(tables[f'{level}_offsets'][parent + 1])
+
+    def name(self, node:int)->str:
+        code = int(self.tables[f'{self.level}_name'][node])
+        return None if code == -2 else self.tables['strings'][code]
+
+    def __getitem__(self, name):
+        if not isinstance(name, str):
+            raise KeyError(name)
+        by_name = self.tables[f'{self.level}_by_name']
+        lo, hi = self.start, self.stop
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.name(by_name[mid]) or '') < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.stop and self.name(by_name[lo]) == name:
+            return int(by_name[lo])
+        raise KeyError(name)
+
+    def __iter__(self):
+        return (self.name(node) for node in self.tables[f'{self.level}_order'][self.start:self.stop].tolist())
+
+    def __len__(self):
+        return self.stop - self.start
+
+
+class SightingTree(Mapping):
+    """
+    Country -> region -> city index of a shared generation in the shape of build_sighting_index(), whose nodes are
+    built on access from the mapped tree arrays (see pack_sighting_tables())
+    """
+    def __init__(self, tables:dict, level:str='country', parent:int=0):
+        self.tables = tables
+        self.level = level
+        self.names = SightingNames(tables, level, parent)
+
+    def __getitem__(self, name):
+        node = self.names[name]
+        offsets = self.tables[f'{self.level}_row_offsets']
+        sightings = SightingList(self.tables, self.tables[f'{self.level}_rows'][offsets[node]:offsets[node + 1]])
+        if self.level == 'city':
+            return sightings
+        if self.level == 'country':
+            return {'sightings': sightings, 'regions': SightingTree(self.tables, 'region', node)}
+        return {'sightings': sightings, 'cities': SightingTree(self.tables, 'city', node)}
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def shared_pointer_path()->str:
+    """
+    Path of the file naming the current shared generation
+    args:
+        (none)
+    returns:
+        (str): Path of SHARED_DATASET_DIR/current.json
+    """
+    return os.path.join(SHARED_DATASET_DIR, 'current.json')
+
+
+def read_shared_pointer()->dict:
+    """
+    Reads the current shared generation
+    args:
+        (none)
+    returns:
+        (dict): Pointer with 'generation', 'loaded_at' and 'sources'
+        (None): If no generation has been shared yet
+    """
+    try:
+        with open(shared_pointer_path(), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_shared_epochs(name:str, epoch_store:dict):
+    """
+    Writes the epoch store of a shared generation: the columns, plus the epoch strings sorted with their rows so workers
+    look epochs up by binary search on the mapped files instead of building an index each
+    args:
+        name (str): Name of the generation
+        epoch_store (dict): Columnar epoch store
+    returns:
+        (none)
+    """
+    epochs = np.array(list(epoch_store['epochs']), dtype=np.bytes_)
+    order = np.argsort(epochs, kind='stable')
+    arrays = {
+        'epochs': epochs,
+        'times': epoch_store['times'],
+        'position': epoch_store['position'],
+        'velocity': epoch_store['velocity'],
+        'epoch_keys': epochs[order],
+        'epoch_rows': order,
+    }
+    write_snapshot('epoch', name, name, arrays, {'units': epoch_store['units']}, SHARED_DATASET_DIR)
+
+
+def pack_sighting_tables(sighting_data:list)->tuple:
+    """
+    Packs the sighting data set, its country -> region -> city index and its sorted columns into flat arrays that
+    workers memory map (see SightingList, SightingTree). The tree is stored per level ('country', 'region', 'city') as
+    node name codes, the rows of each node's passes in data set order, and each parent's children in order of first
+    appearance and sorted by name
+    args:
+        sighting_data (list): List of visible pass dictionaries
+    returns:
+        arrays (dict): File name stem to np.ndarray
+        meta (dict): Field names of the code array
+    """
+    fields, codes, strings = encode_sighting_data(sighting_data)
+    encoded = [x.encode() for x in strings]
+    string_codes = {x: i for i, x in enumerate(strings)}
+    arrays = {
+        'codes': codes,
+        'string_data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'string_offsets': np.cumsum([0] + [len(x) for x in encoded], dtype=np.int64),
+    }
+    levels = ('country', 'region', 'city')
+    nodes = {level: {} for level in levels}
+    pass_nodes = {level: np.empty(len(sighting_data), dtype=np.int64) for level in levels}
+    for i, x in enumerate(sighting_data):
+        parent = 0
+        for level in levels:
+            parent = pass_nodes[level][i] = nodes[level].setdefault((parent, x[level]), len(nodes[level]))
+    parent_count = 1
+    for level in levels:
+        keys = list(nodes[level])
+        parents = np.array([parent for parent, _ in keys], dtype=np.int64)
+        arrays[f'{level}_name'] = np.array([-2 if name is None else string_codes[name] for _, name in keys], dtype=np.int32)
+        arrays[f'{level}_rows'] = np.argsort(pass_nodes[level], kind='stable')
+        arrays[f'{level}_row_offsets'] = np.cumsum([0] + np.bincount(pass_nodes[level], minlength=len(keys)).tolist(), dtype=np.int64)
+        arrays[f'{level}_order'] = np.argsort(parents, kind='stable')
+        arrays[f'{level}_by_name'] = np.array(sorted(range(len(keys)), key=lambda node: (keys[node][0], keys[node][1] or '')), dtype=np.int64)
+        arrays[f'{level}_offsets'] = np.cumsum([0] + np.bincount(parents, minlength=parent_count).tolist(), dtype=np.int64)
+        parent_count = len(keys)
+    sighting_store = build_sighting_store(sighting_data)
+    for key in ('times', 'order', 'duration', 'elevation', 'country'):
+        arrays[key] = sighting_store[key]
+    return arrays, {'fields': fields}
+
+
+def save_shared_sightings(name:str, sighting_data:list):
+    """
+    Writes the sighting tables of a shared generation (see pack_sighting_tables())
+    args:
+        name (str): Name of the generation
+        sighting_data (list): List of visible pass dictionaries
+    returns:
+        (none)
+    """
+    arrays, meta = pack_sighting_tables(sighting_data)
+    write_snapshot('sighting', name, name, arrays, meta, SHARED_DATASET_DIR)
+
+
+def link_shared_sightings(source_name:str, name:str)->bool:
+    """
+    Hard links the sighting tables of a shared generation into the next one when the sighting data set is unchanged,
+    so an epoch refresh neither re-encodes nor duplicates them
+    args:
+        source_name (str): Name of the generation holding the sighting tables
+        name (str): Name of the new generation
+    returns:
+        (bool): True if linked, False if the source generation has no sighting tables
+    """
+    meta = read_snapshot_meta('sighting', source_name, source_name, SHARED_DATASET_DIR)
+    if meta is None:
+        return False
+    source_dir = snapshot_path('sighting', source_name, SHARED_DATASET_DIR)
+    tmp_dir = tempfile.mkdtemp(dir=SHARED_DATASET_DIR, prefix='.tmp-')
+    try:
+        for entry in os.listdir(source_dir):
+            if entry != 'meta.json':
+                os.link(os.path.join(source_dir, entry), os.path.join(tmp_dir, entry))
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(dict(meta, signature=name), f)
+        os.rename(tmp_dir, snapshot_path('sighting', name, SHARED_DATASET_DIR))
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+    return True
+
+
+def load_shared_tables(kind:str, name:str)->tuple:
+    """
+    Memory maps the arrays of a shared generation
+    args:
+        kind (str): 'epoch' or 'sighting'
+        name (str): Name of the generation
+    returns:
+        tables (dict): File name stem to read-only np.memmap
+        meta (dict): Metadata of the arrays
+    raises:
+        FileNotFoundError: If the generation has no such arrays
+    """
+    meta = read_snapshot_meta(kind, name, name, SHARED_DATASET_DIR)
+    if meta is None:
+        raise FileNotFoundError(f'Shared {kind} tables of {name} are missing')
+    snap_dir = snapshot_path(kind, name, SHARED_DATASET_DIR)
+    tables = {entry[:-4]: np.load(os.path.join(snap_dir, entry), mmap_mode='r')
+              for entry in os.listdir(snap_dir) if entry.endswith('.npy')}
+    return tables, meta
+
+
+def share_dataset(epoch_store:dict, sighting_data:list, sources:dict, epoch_delta:dict=None)->Dataset:
+    """
+    Writes freshly loaded data sets to SHARED_DATASET_DIR as the next generation and swaps the shared pointer to it,
+    then attaches this process to it. Every structure the routes read is memory mapped from the shared files, so
+    every worker reads the same page cache rather than holding its own copy
+    args:
+        epoch_store (dict): Columnar epoch store of the positioning data set
+        sighting_data (list): List of visible pass dictionaries parsed from sighting xml
+        sources (dict): Strings of the 'epoch' and 'sighting' sources the data sets were loaded from
+        epoch_delta (dict): Changes to the epoch store of an incremental reload (see diff_epoch_stores())
+    returns:
+        dataset (Dataset): The published generation
+    """
+    os.makedirs(SHARED_DATASET_DIR, exist_ok=True)
+    with open(os.path.join(SHARED_DATASET_DIR, 'lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        current = read_shared_pointer()
+        dataset = iss_dataset
+        generation = max(current['generation'] if current else 0, dataset.generation if dataset else 0) + 1
+        name = f'generation-{generation}'
+        save_shared_epochs(name, epoch_store)
+        if not (dataset is not None and sighting_data is dataset.sighting_data
+                and link_shared_sightings(f'generation-{dataset.generation}', name)):
+            save_shared_sightings(name, sighting_data)
+        pointer = {'generation': generation, 'loaded_at': datetime.now(timezone.utc).isoformat(), 'sources': sources,
+                   'epoch_delta': epoch_delta}
+        with tempfile.NamedTemporaryFile('w', dir=SHARED_DATASET_DIR, prefix='.tmp-', delete=False) as f:
+            json.dump(pointer, f)
+        os.replace(f.name, shared_pointer_path())
+        # keep the previous generation for workers that have not attached the new one yet
+        keep = {os.path.basename(snapshot_path(kind, f'generation-{x}', SHARED_DATASET_DIR))
+                for kind in ('epoch', 'sighting') for x in (generation, generation-1)}
+        for entry in os.listdir(SHARED_DATASET_DIR):
+            if entry.startswith(('epoch-', 'sighting-')) and entry not in keep:
+                shutil.rmtree(os.path.join(SHARED_DATASET_DIR, entry), ignore_errors=True)
+    logging.info(f"SHARED GENERATION {generation} WRITTEN")
+    return attach_shared_dataset(pointer)
+
+
+def attach_shared_dataset(pointer:dict)->Dataset:
+    """
+    Publishes a shared generation in this process as views over the memory mapped files in SHARED_DATASET_DIR. Nothing
+    is decoded or indexed up front, so attaching costs the same however large the data sets are
+    args:
+        pointer (dict): Shared generation pointer from read_shared_pointer()
+    returns:
+        dataset (Dataset): The published generation
+    """
+    name = f"generation-{pointer['generation']}"
+    epoch_tables, epoch_meta = load_shared_tables('epoch', name)
+    sighting_tables, sighting_meta = load_shared_tables('sighting', name)
+    epoch_buffer = {
+        'epochs': StringArray(epoch_tables['epochs']),
+        'times': epoch_tables['times'],
+        'position': epoch_tables['position'],
+        'velocity': epoch_tables['velocity'],
+        'rows': SortedIndex(epoch_tables['epoch_keys'], epoch_tables['epoch_rows']),
+        'stop': len(epoch_tables['times']),
+    }
+    epoch_store = epoch_store_view(epoch_buffer, 0, len(epoch_tables['times']), epoch_meta['units'])
+    sighting_tables['fields'] = sighting_meta['fields']
+    sighting_tables['strings'] = StringTable(sighting_tables['string_data'], sighting_tables['string_offsets'])
+    sighting_store = {key: sighting_tables[key] for key in ('times', 'order', 'duration', 'elevation', 'country')}
+    sighting_store['country_codes'] = SightingNames(sighting_tables, 'country', 0)
+    return publish_dataset(epoch_store, SightingList(sighting_tables), pointer['sources'], pointer['generation'],
+                           pointer['loaded_at'], pointer.get('epoch_delta'), SightingTree(sighting_tables), sighting_store)
+
+
+def sync_shared_dataset()->bool:
+    """
+    Attaches the current shared generation if another worker has published a newer one. Costs one stat() of the
+    pointer file when nothing changed
+    args:
+        (none)
+    returns:
+        (bool): True if this process has a dataset after syncing
+    """
+    global shared_pointer_stat
+    try:
+        pointer_stat = os.stat(shared_pointer_path())
+    except OSError:
+        return iss_dataset is not None
+    stat_key = (pointer_stat.st_ino, pointer_stat.st_mtime_ns)
+    if stat_key == shared_pointer_stat:
+        return iss_dataset is not None
+    with shared_attach_lock:
+        if stat_key != shared_pointer_stat:
+            pointer = read_shared_pointer()
+            dataset = iss_dataset
+            try:
+                if pointer is not None and (dataset is None or dataset.generation < pointer['generation']):
+                    attach_shared_dataset(pointer)
+                    logging.info(f"SHARED GENERATION {pointer['generation']} ATTACHED")
+                shared_pointer_stat = stat_key
+            except (OSError, ValueError, IndexError, KeyError):
+                logging.warning("UNABLE TO ATTACH SHARED GENERATION - RETRYING")
+    return iss_dataset is not None
+
+
+def run_shared_watcher(interval:float, stop_event:threading.Event):
+    """
+    Background loop attaching newly shared generations until stop_event is set
+    args:
+        interval (float): Seconds between checks of the shared pointer
+        stop_event (threading.Event): Event that ends the loop
+    returns:
+        (none)
+    """
+    while not stop_event.is_set():
+        try:
+            sync_shared_dataset()
+        except Exception:
+            logging.exception("SHARED GENERATION WATCHER FAILED")
+        stop_event.wait(interval)
+
+
+def start_shared_watcher(interval:float)->threading.Thread:
+    """
+    Starts (or restarts) the shared generation watcher thread of this process
+    args:
+        interval (float): Seconds between checks of the shared pointer
+    returns:
+        (threading.Thread): Daemon thread running run_shared_watcher()
+    """
+    global shared_watcher_stop
+    stop_shared_watcher()
+    shared_watcher_stop = threading.Event()
+    watcher = threading.Thread(target=run_shared_watcher, args=(interval, shared_watcher_stop),
+                               name='isspsdt-shared-watcher', daemon=True)
+    watcher.start()
+    logging.info("SHARED GENERATION WATCHER STARTED")
+    return watcher
+
+
+def stop_shared_watcher():
+    """
+    Signals the shared generation watcher thread (if any) to stop
+    args:
+        (none)
+    returns:
+        (none)
+    """
+    global shared_watcher_stop
+    if shared_watcher_stop is not None:
+        shared_watcher_stop.set()
+        shared_watcher_stop = None
+        logging.info("SHARED GENERATION WATCHER STOPPED")
+
+
+def forget_shared_watcher():
+    """
+    Drops the shared generation watcher inherited from the parent in a forked child, where its thread does not run
+    """
+    global shared_watcher_stop
+    shared_watcher_stop = None
+
+
+os.register_at_fork(after_in_child=forget_shared_watcher)
+
+
+@app.before_request
+def start_shared_watcher_before_request():
+    """
+    Starts the shared generation watcher of a worker on its first request when SHARED_DATASET_DIR is set, and attaches
+    the current generation right away if the worker has none yet. Later generations are attached by the watcher
+    """
+    if SHARED_DATASET_DIR is not None and shared_watcher_stop is None:
+        with shared_watcher_lock:
+            if shared_watcher_stop is None:
+                start_shared_watcher(SHARED_POLL_INTERVAL)
+    if SHARED_DATASET_DIR is not None and iss_dataset is None:
+        sync_shared_dataset()
 
 ############################################################################################################################
-### VARIABLES DECLARED FOR GLOBAL SCOPE
-iss_epoch_data = []
-iss_sighting_data = []
-readonce = False
+### REFRESH FUNCTIONS
+def update_fetch_stats(url_str:str, counts:tuple=(), **values)->dict:
+    """
+    Updates the fetch statistics of a url source under fetch_stats_lock
+    args:
+        url_str (str): String of url to ISS data xml
+        counts (tuple): Names of the counters to increment
+        values: Statistics to set, e.g. last_status=200
+    returns:
+        (dict): Copy of the updated statistics
+    """
+    with fetch_stats_lock:
+        stats = fetch_stats.setdefault(url_str, {
+            'url': url_str, 'fetch_count': 0, 'not_modified_count': 0, 'unchanged_count': 0, 'parsed_count': 0,
+            'error_count': 0, 'last_fetch': None, 'last_status': None, 'last_change': None, 'last_error': None,
+            'last_fetch_seconds': None, 'last_parse_seconds': None, 'bytes_downloaded': 0,
+            'etag': None, 'last_modified': None, 'sha256': None,
+        })
+        for key in counts:
+            stats[key] += 1
+        stats['bytes_downloaded'] += values.pop('bytes_downloaded', 0)
+        stats.update(values)
+        return dict(stats)
+
+
+def fetch_stats_snapshot(url_strs:list=None)->list:
+    """
+    Copies the fetch statistics of url sources under fetch_stats_lock
+    args:
+        url_strs (list): Urls to report, in order (those never fetched are left out), None reports every url
+    returns:
+        (list): Fetch statistics dictionary of each url
+    """
+    with fetch_stats_lock:
+        if url_strs is None:
+            url_strs = list(fetch_stats)
+        return [dict(fetch_stats[url_str]) for url_str in url_strs if url_str in fetch_stats]
+
+
+def fetch_url_source(kind:str, url_str:str, force:bool=False, parse_func=None):
+    """
+    Conditionally downloads a url source (If-None-Match/If-Modified-Since) into a temporary file while hashing it, and
+    only parses it when the server reports a change and the body hash differs from the last fetch
+    args:
+        kind (str): 'epoch' or 'sighting'
+        url_str (str): String of url to ISS data xml
+        force (bool): Ignore the validators and hash of the last fetch
+        parse_func (callable): Replaces stream_epoch_store/stream_sighting_data, e.g. to stream epoch columns
+    returns:
+        (dict): Columnar epoch store for 'epoch' (or what parse_func returns) if the source changed
+        (list): List of visible pass dictionaries for 'sighting' if the source changed
+        (None): If the source is unchanged or could not be fetched (see fetch_stats)
+    """
+    parse_func = parse_func or {'epoch': stream_epoch_store, 'sighting': stream_sighting_data}[kind]
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    stats = update_fetch_stats(url_str, ('fetch_count',), last_fetch=fetched_at)
+    headers = {}
+    if not force and stats['etag']:
+        headers['If-None-Match'] = stats['etag']
+    if not force and stats['last_modified']:
+        headers['If-Modified-Since'] = stats['last_modified']
+    tmp_path = None
+    try:
+        fetch_start = time.perf_counter()
+        with http_session.get(url=url_str, headers=headers, stream=True, timeout=HTTP_TIMEOUT) as data_resp:
+            update_fetch_stats(url_str, last_status=data_resp.status_code)
+            if data_resp.status_code == 304:
+                update_fetch_stats(url_str, ('not_modified_count',))
+                logging.info("URL SOURCE NOT MODIFIED - SKIPPING PARSE")
+                return None
+            data_resp.raise_for_status()
+            body_hash = hashlib.sha256()
+            with tempfile.NamedTemporaryFile(suffix='.xml', delete=False) as tmp:
+                tmp_path = tmp.name
+                for chunk in data_resp.iter_content(chunk_size=1<<16):
+                    body_hash.update(chunk)
+                    tmp.write(chunk)
+                    update_fetch_stats(url_str, bytes_downloaded=len(chunk))
+            fetch_seconds = time.perf_counter() - fetch_start
+            update_fetch_stats(url_str, etag=data_resp.headers.get('ETag'), last_modified=data_resp.headers.get('Last-Modified'),
+                               last_fetch_seconds=fetch_seconds)
+        record_load(kind, 'fetch', fetch_seconds)
+        if not force and body_hash.hexdigest() == stats['sha256']:
+            update_fetch_stats(url_str, ('unchanged_count',))
+            logging.info("URL SOURCE BODY UNCHANGED - SKIPPING PARSE")
+            return None
+        parse_start = time.perf_counter()
+        data = parse_func(stream_xml_data_file, tmp_path)
+        parse_seconds = time.perf_counter() - parse_start
+        record_load(kind, 'parse', parse_seconds)
+        update_fetch_stats(url_str, ('parsed_count',), last_parse_seconds=parse_seconds, sha256=body_hash.hexdigest(),
+                           last_change=fetched_at)
+        return data
+    except (requests.exceptions.RequestException, OSError, ExpatError, KeyError, ValueError) as e:
+        update_fetch_stats(url_str, ('error_count',), last_error=f'{type(e).__name__}: {e}')
+        logging.error("UNABLE TO FETCH URL SOURCE")
+        return None
+    finally:
+        if tmp_path is not None:
+            os.remove(tmp_path)
+
+
+def refresh_from_urls()->bool:
+    """
+    Fetches every url source conditionally and replaces whichever data sets changed, re-merging the sighting shards
+    when any of them changed
+    args:
+        (none)
+    returns:
+        (bool): True if new data was loaded
+    """
+    with refresh_lock:
+        dataset = iss_dataset
+        sources = {'epoch': EPOCH_URL, 'sighting': SIGHTING_URL}
+        if dataset is not None and dataset.sources != sources:
+            logging.info("CURRENT DATA NOT LOADED FROM URL SOURCES - SKIPPING REFRESH")
+            return False
+        sighting_urls = expand_sources(SIGHTING_URL)
+        with ThreadPoolExecutor(max_workers=1+min(len(sighting_urls), SIGHTING_FETCH_THREADS), thread_name_prefix='isspsdt-fetch') as executor:
+            # once data is served, the epoch source is streamed against it and applied incrementally
+            epoch_parse = None if dataset is None else partial(stream_epoch_columns, epoch_store=dataset.epoch_store)
+            epoch_future = executor.submit(fetch_url_source, 'epoch', EPOCH_URL, dataset is None, epoch_parse)
+            shard_futures = {url_str: executor.submit(fetch_url_source, 'sighting', url_str,
+                                                      dataset is None or url_str not in refresh_shards)
+                             for url_str in sighting_urls}
+            epoch_data = epoch_future.result()
+            changed_shards = {url_str: future.result() for url_str, future in shard_futures.items()}
+        changed_shards = {url_str: shard for url_str, shard in changed_shards.items() if shard is not None}
+        refresh_shards.update(changed_shards)
+        sighting_data = None
+        if changed_shards and all(url_str in refresh_shards for url_str in sighting_urls):
+            sighting_data = merge_sighting_shards([refresh_shards[url_str] for url_str in sighting_urls])
+        if epoch_data is None and sighting_data is None:
+            return False
+        if dataset is None and (epoch_data is None or sighting_data is None):
+            logging.error("UNABLE TO REFRESH ALL URL SOURCES FOR FIRST LOAD")
+            return False
+        if dataset is None:
+            publish_dataset(epoch_data, sighting_data, sources)
+        elif epoch_data is None:
+            publish_dataset(dataset.epoch_store, sighting_data, sources)
+        else:
+            new_dataset, _ = publish_epoch_delta(dataset, epoch_data,
+                                                 dataset.sighting_data if sighting_data is None else sighting_data, sources)
+            if new_dataset is dataset:
+                return False
+    logging.info("DATA REFRESHED FROM URL SOURCES")
+    return True
+
+
+def run_refresher(interval:float, stop_event:threading.Event):
+    """
+    Background loop refreshing the data sets from the url sources until stop_event is set
+    args:
+        interval (float): Seconds between refreshes
+        stop_event (threading.Event): Event that ends the loop
+    returns:
+        (none)
+    """
+    while not stop_event.is_set():
+        try:
+            refresh_from_urls()
+        except Exception:
+            logging.exception("BACKGROUND REFRESH FAILED")
+        stop_event.wait(interval)
+
+
+def start_refresher(interval:float)->threading.Thread:
+    """
+    Starts (or restarts) the background refresher thread
+    args:
+        interval (float): Seconds between refreshes
+    returns:
+        (threading.Thread): Daemon thread running run_refresher()
+    """
+    global refresher_stop
+    stop_refresher()
+    refresher_stop = threading.Event()
+    refresher = threading.Thread(target=run_refresher, args=(interval, refresher_stop), name='isspsdt-refresher', daemon=True)
+    refresher.start()
+    logging.info("BACKGROUND REFRESHER STARTED")
+    return refresher
+
+
+def stop_refresher():
+    """
+    Signals the background refresher thread (if any) to stop
+    args:
+        (none)
+    returns:
+        (none)
+    """
+    global refresher_stop
+    if refresher_stop is not None:
+        refresher_stop.set()
+        refresher_stop = None
+        logging.info("BACKGROUND REFRESHER STOPPED")
 
 ############################################################################################################################
-### MISCELLANEOUS FUNCTIONS
-def get_xml_data_url(url_str:str)->dict:
-    """                                                                                                                                                                                              
-    Uses input url string to web accessible xml contnet and outputs dictionary filed from parsed xml data                       
+### RESPONSE CACHE FUNCTIONS
+def encode_response_entry(data, headers:dict=None)->dict:
+    """
+    Serializes a json response once and keeps its strong ETag. Compressed variants are added by encoded_body() the
+    first time a client asks for them
     args:
-        url_str (str): String of url to xml of ISS positioning data                                                                                                                                  
-    returns:                                                                                                                                                                                         
-        data_dict (dict): Dictionary containing ISS positioning data                                                                                                                            
+        data (list or dict): Json serializable response data
+        headers (dict): (optional) Headers sent with every variant of the response
+    returns:
+        entry (dict): Dictionary of the 'identity' body, the 'etag' hash and any 'headers'
     """
-    data_resp = requests.get(url=url_str)
-    data_dict = xmltodict.parse(data_resp.content)
-    logging.info("DATA PARSED SUCCESSFULLY FROM URL")
-    return data_dict
+    body = json.dumps(data, separators=(',', ':')).encode()
+    entry = {'identity': body, 'etag': hashlib.sha256(body).hexdigest()[:32]}
+    if headers:
+        entry['headers'] = headers
+    return entry
 
 
-def get_xml_data_file(file_str:str)->dict:
-    """                                                                                                                                                                                              
-    Uses input url string to local xml content file and outputs dictionary filed from parsed xml data                       
+def encoded_body(entry:dict, encoding:str)->bytes:
+    """
+    Body of a cached response in one content encoding, compressing and keeping it in the entry on first use
     args:
-        file_str (str): String of url to xml of ISS positioning data                                                                                                                                  
-    returns:                                                                                                                                                                                         
-        data_dict (dict): Dictionary containing ISS positioning data                                                                                                                            
+        entry (dict): Entry built by encode_response_entry()
+        encoding (str): 'identity', 'gzip' or 'br'
+    returns:
+        (bytes): Encoded body
     """
-    with open(file_str, 'r') as f:
-        data_dict = xmltodict.parse( f.read() )
-    logging.info("DATA PARSED SUCCESSFULLY FROM FILE")
-    return data_dict
+    body = entry.get(encoding)
+    if body is None:
+        if encoding == 'br':
+            body = brotli.compress(entry['identity'], quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(entry['identity'], compresslevel=GZIP_LEVEL)
+        entry[encoding] = body
+    return body
+
+
+def carry_response_cache(old_dataset:Dataset, new_dataset:Dataset):
+    """
+    Moves the cached responses of a generation to the generation that replaced it with the same sighting data set,
+    dropping only the responses of the routes built from the positioning data set (EPOCH_CACHE_ROUTES)
+    args:
+        old_dataset (Dataset): Generation that was replaced
+        new_dataset (Dataset): Generation that replaced it
+    returns:
+        (none)
+    """
+    with response_cache_lock:
+        if response_cache['generation'] != old_dataset.generation:
+            return
+        response_cache['generation'] = new_dataset.generation
+        response_cache['pinned'] = {key: entry for key, entry in response_cache['pinned'].items() if key[0] not in EPOCH_CACHE_ROUTES}
+        response_cache['lru'] = OrderedDict((key, entry) for key, entry in response_cache['lru'].items() if key[0] not in EPOCH_CACHE_ROUTES)
+    logging.info("SIGHTING RESPONSES CARRIED OVER")
+
+
+def cached_json_response(dataset:Dataset, cache_key:tuple, build_func, pinned:bool=False, with_headers:bool=False)->Response:
+    """
+    Answers a list route from the response cache of the current dataset generation, serializing it on the first hit.
+    Unparameterized routes are pinned for the whole generation; parameterized ones share a bounded LRU. The whole cache
+    is dropped at once when a new generation is seen
+    args:
+        dataset (Dataset): Generation the response is built from
+        cache_key (tuple): Route name and arguments
+        build_func (callable): Builds the response data on a cache miss
+        pinned (bool): Keep the response for the whole generation instead of in the LRU
+        with_headers (bool): build_func returns (data, headers), the headers being cached with the response
+    returns:
+        (Response): Json response (304 if the client's If-None-Match matches)
+    """
+    with response_cache_lock:
+        if response_cache['generation'] != dataset.generation:
+            response_cache['generation'] = dataset.generation
+            response_cache['pinned'] = {}
+            response_cache['lru'] = OrderedDict()
+        entry = response_cache['pinned'].get(cache_key) or response_cache['lru'].get(cache_key)
+        if entry is not None:
+            response_cache_stats['hits'] += 1
+            if not pinned:
+                response_cache['lru'].move_to_end(cache_key)
+    if entry is None:
+        entry = encode_response_entry(*build_func()) if with_headers else encode_response_entry(build_func())
+        with response_cache_lock:
+            response_cache_stats['misses'] += 1
+            if response_cache['generation'] == dataset.generation:
+                if pinned:
+                    response_cache['pinned'][cache_key] = entry
+                else:
+                    response_cache['lru'][cache_key] = entry
+                    while len(response_cache['lru']) > RESPONSE_CACHE_SIZE:
+                        response_cache['lru'].popitem(last=False)
+                        response_cache_stats['evictions'] += 1
+    return encoded_response(entry)
+
+
+def encoded_response(entry:dict)->Response:
+    """
+    Picks the variant of a cached response the client accepts (br, gzip or identity) and answers If-None-Match
+    args:
+        entry (dict): Entry built by encode_response_entry()
+    returns:
+        (Response): Json response, or an empty 304 response if the client already has this variant
+    """
+    encoding = 'identity'
+    if has_request_context():
+        if brotli is not None and request.accept_encodings['br']:
+            encoding = 'br'
+        elif request.accept_encodings['gzip']:
+            encoding = 'gzip'
+    etag = entry['etag'] if encoding == 'identity' else f"{entry['etag']}-{encoding}"
+    headers = dict(entry.get('headers', {}), **{'ETag': f'"{etag}"', 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'})
+    if has_request_context() and request.if_none_match.contains(etag):
+        with response_cache_lock:
+            response_cache_stats['not_modified'] += 1
+        return Response(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(encoded_body(entry, encoding), mimetype='application/json', headers=headers)
+
+def collection_response(dataset:Dataset, cache_key:tuple, items:list, keyed:bool=False, key_positions:dict=None,
+                        window:tuple=(0, None), pinned:bool=False):
+    """
+    Answers a collection route with ?limit=&after= pagination and ?format=ndjson streaming. Lists of keys (epochs,
+    countries, regions, cities) use the last key sent as their cursor and lists of sighting records use the number of
+    records sent; the cursor of the next page (if any) is sent in the X-Next-Cursor header
+    args:
+        dataset (Dataset): Generation the items come from
+        cache_key (tuple): Route name and arguments
+        items (list): Items of the collection, or a function building them (records only, not windowed), which is
+                      only called when the page is not cached or is streamed
+        keyed (bool): Items are unique keys that serve as their own cursors
+        key_positions (dict): (optional) Key to position of keyed items, built on demand when not given
+        window (tuple): (start, stop) positions the collection is restricted to before paginating
+        pinned (bool): Keep the unpaginated collection cached for the whole generation
+    returns:
+        (Response): Json or streamed ndjson response
+        (str): Error string stating that limit, after or format could not be used
+    """
+    query_args = get_query_args()
+    start = window[0]
+    try:
+        limit = int(query_args['limit']) if 'limit' in query_args else None
+        if limit is not None and limit < 0:
+            raise ValueError(limit)
+        output_format = query_args.get('format', 'json')
+        if output_format not in ('json', 'ndjson'):
+            raise ValueError(output_format)
+        if callable(items) and output_format == 'json':
+            start = max(start, int(query_args.get('after', 0)))
+        else:
+            items = items() if callable(items) else items
+            stop = len(items) if window[1] is None else window[1]
+            if 'after' in query_args:
+                if keyed:
+                    positions = key_positions if key_positions is not None else {key: i for i, key in enumerate(items)}
+                    start = max(start, positions[query_args['after']] + 1)
+                else:
+                    start = max(start, int(query_args['after']))
+            start = min(start, stop)
+            page_stop = stop if limit is None else min(stop, start + limit)
+    except (ValueError, KeyError):
+        logging.error("UNABLE TO PARSE USER INPUT PAGINATION")
+        return 'UNABLE TO PARSE limit/after/format QUERY ARGUMENTS \n'
+    if callable(items):
+        def build_page():
+            records = items()
+            page_start = min(start, len(records))
+            page_stop = len(records) if limit is None else min(len(records), page_start + limit)
+            headers = {'X-Next-Cursor': str(page_stop)} if page_start < page_stop < len(records) else {}
+            return records[page_start:page_stop], headers
+        return cached_json_response(dataset, cache_key + (start, limit), build_page, with_headers=True)
+    if output_format == 'ndjson':
+        response = ndjson_response(items, start, page_stop)
+    else:
+        whole = (start, page_stop) == (0, len(items))
+        response = cached_json_response(dataset, cache_key + (start, page_stop), lambda: items[start:page_stop], pinned=pinned and whole)
+    if start < page_stop < stop:
+        response.headers['X-Next-Cursor'] = items[page_stop - 1] if keyed else str(page_stop)
+    return response
+
+
+def ndjson_response(items:list, start:int, stop:int)->Response:
+    """
+    Streams items[start:stop] as newline delimited json, serializing records chunk by chunk as they are sent
+    args:
+        items (list): Items of the collection
+        start (int): Position of first item to send
+        stop (int): Position after the last item to send
+    returns:
+        (Response): Streamed application/x-ndjson response
+    """
+    def generate_lines():
+        for chunk_start in range(start, stop, NDJSON_CHUNK_SIZE):
+            chunk_stop = min(stop, chunk_start + NDJSON_CHUNK_SIZE)
+            yield ''.join(json.dumps(items[i], separators=(',', ':')) + '\n' for i in range(chunk_start, chunk_stop))
+    return Response(generate_lines(), mimetype='application/x-ndjson')
 
 ############################################################################################################################
 ### USAGE INFOFORMATION FUNCTION
@@ -75,22 +3094,37 @@ def usage_info():
         ['/', '(GET) Print Route Information'],
         ['/load_url', '(POST) Loads/Overwrites Data from URL ISS sources'  ],
         ['/load_file', '(POST) Loads/Overwrites Data from local ISS data files'  ],
+        ['/load_url?async=true, /load_file?async=true', '(POST) Load in the background and return a job id'],
+        ['/load_url?incremental=true, /load_file?incremental=true', '(POST) Reload only the Epochs that changed'],
+        ['/load_jobs/<job_id>', '(GET) Status of background load <job_id>'],
+        ['/refresh', '(GET) Fetch Statistics of URL ISS sources, (POST) Refresh Data from URL sources if changed'],
+        ['/metrics', '(GET) Request, Load, Dataset and Cache Metrics (?format=prometheus for Prometheus text)'],
     ]
 
     pos_tab = [
         ['Epoch, Positioning and Velocity Data Query Routes:', ''],
         ['/epochs', '(GET) List all Epochs'],
+        ['/epochs?start=<start>&end=<end>&limit=<limit>', '(GET) List Epochs between <start> and <end> (up to <limit>)'],
         ['/epochs/<epoch>', '(GET) Position and Velocity Data for <epoch>'],
+        ['/interpolate?time=<time>', '(GET) Interpolated Position and Velocity Data at <time>'],
+        ['/interpolate', '(POST) Interpolated Position and Velocity Data for a JSON list of times'],
+        ['/batch/epochs', '(POST) Position and Velocity Data for a JSON list of epochs'],
+        ['/ground_track?start=<start>&end=<end>&limit=<limit>', '(GET) Latitude, Longitude and Altitude of each Epoch'],
+        ['/over_region?min_lat=&max_lat=&min_lon=&max_lon=', '(GET) Time Intervals with the ISS over a Lat/Lon box'],
+        ['/passes?lat=&lon=&alt=&min_elevation=', '(GET) Predicted Passes over any Observer Location'],
+        ['/batch/passes', '(POST) Predicted Passes for a JSON list of [<lat>,<lon>,<alt>] Observers'],
     ]
     
     sight_tab = [
         ['Regional Sightings Data Query Routes:',''],
+        ['/sightings?from=&to=&min_elevation=&min_duration=&country=','(GET) Sightings anywhere in a time range, filtered'],
         ['/countries','(GET) List of all countries in data set'],
         ['/countries/<country>','(GET) Sighting Information in Specified <country>'],
         ['/countries/<country>/regions','(GET) List of all regions in <country>'],
         ['/countries/<country>/regions/<region>','(GET) Sighting Information in Specified <country>&<region>'],
         ['/countries/<country>/regions/<region>/cities','(GET) List of all cities in <country>&<region>'],
         ['/countries/<country>/regions/<region>/cities/<city>','(GET) Sighting Information in Specified <country>&<region>&<city>'],
+        ['/batch/cities','(POST) Sighting Information for a JSON list of [<country>,<region>,<city>] keys'],
 
     ]
 
@@ -111,18 +3145,22 @@ def read_data_from_url():
     """                                                                                                                                                                                              
     Called to update the global positioning and sighting data sets used for services                    
     args:
-        (none)                                                                                                                               
+        async (str): (query, optional) When true, load in the background and return a job to poll at /load_jobs/<job_id>
+        incremental (str): (query, optional) When true, only reload the positioning data set, applying the change since the last load
     returns:                                                                                                                                                                                         
        (str): Comfirmation of completed parse                                                                                                                           
+       (jsonify-ed dict): Jsonified job record when loading asynchronously
     """
-    global iss_epoch_data
-    global iss_sighting_data
-    global readonce
-    iss_epoch_data = get_xml_data_url(EPOCH_URL)['ndm']['oem']['body']['segment']['data']['stateVector']
-    iss_sighting_data = get_xml_data_url(SIGHTING_URL)['visible_passes']['visible_pass']
-    if not readonce:
-        logging.info("DATA LOADED ONCE BY USER")
-        readonce = True
+    query_args = get_query_args()
+    incremental = query_args.get('incremental', '').lower() in ('1', 'true', 'yes')
+    if query_args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return jsonify(submit_load_job(stream_xml_data_url, EPOCH_URL, SIGHTING_URL, incremental)), 202
+    if incremental:
+        dataset, delta = reload_epoch_data(stream_xml_data_url, EPOCH_URL)
+        if delta is not None:
+            return f'Positioning data has been reloaded incrementally from the URL source below: \n Positioning: {EPOCH_URL} \n Generation: {dataset.generation} \n Epochs added: {delta["added"]}, removed: {delta["removed"]}, replaced: {delta["replaced"]}, unchanged: {delta["unchanged"]} \n'
+    else:
+        load_data_sets(stream_xml_data_url, EPOCH_URL, SIGHTING_URL)
     return f'Data has been scraped from ISS positioning and sighting URL sources below: \n Positioning: {EPOCH_URL} \n Sighting: {SIGHTING_URL} \n'
 
 
@@ -131,19 +3169,80 @@ def read_data_from_file():
     """                                                                                                                                                                                              
     Called to update the global positioning and sighting data sets used for services                    
     args:
-        (none)                                                                                                                               
+        async (str): (query, optional) When true, load in the background and return a job to poll at /load_jobs/<job_id>
+        incremental (str): (query, optional) When true, only reload the positioning data set, applying the change since the last load
     returns:                                                                                                                                                                                         
        (str): Comfirmation of completed parse                                                                                                                           
+       (jsonify-ed dict): Jsonified job record when loading asynchronously
     """
-    global iss_epoch_data
-    global iss_sighting_data
-    global readonce
-    iss_epoch_data = get_xml_data_file(EPOCH_FILE)['ndm']['oem']['body']['segment']['data']['stateVector']
-    iss_sighting_data = get_xml_data_file(SIGHTING_FILE)['visible_passes']['visible_pass']
-    if not readonce:
-        logging.info("DATA LOADED ONCE BY USER")
-        readonce = True
+    query_args = get_query_args()
+    incremental = query_args.get('incremental', '').lower() in ('1', 'true', 'yes')
+    if query_args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return jsonify(submit_load_job(stream_xml_data_file, EPOCH_FILE, SIGHTING_FILE, incremental)), 202
+    if incremental:
+        dataset, delta = reload_epoch_data(stream_xml_data_file, EPOCH_FILE)
+        if delta is not None:
+            return f'Positioning data has been reloaded incrementally from the file below: \n Positioning: {EPOCH_FILE} \n Generation: {dataset.generation} \n Epochs added: {delta["added"]}, removed: {delta["removed"]}, replaced: {delta["replaced"]}, unchanged: {delta["unchanged"]} \n'
+    else:
+        load_data_sets(stream_xml_data_file, EPOCH_FILE, SIGHTING_FILE)
     return f'Data has been scraped from ISS positioning and sighting files below: \n Positioning: {EPOCH_FILE} \n Sighting: {SIGHTING_FILE} \n'
+
+
+@app.route('/load_jobs/<job_id>', methods=['GET'])
+def load_job_status(job_id:str):
+    """
+    Called to poll an asynchronous load job
+    args:
+        job_id (str): String of job id returned by /load_url?async=true or /load_file?async=true
+    returns:
+        (jsonify-ed dict): Jsonified job record
+        (str): Error string stating that the job id was not found
+    """
+    with load_jobs_lock:
+        job = load_jobs.get(job_id)
+    if job is None:
+        logging.error("NO MATCH FOR USER INPUT JOB ID")
+        return 'NO MATCH FOR INPUT JOB ID FOUND \n'
+    logging.info("SENDING LOAD JOB STATUS TO USER")
+    return jsonify(dict(job))
+
+
+@app.route('/refresh', methods=['GET', 'POST'])
+def refresh_info():
+    """
+    Called to report the fetch statistics of the url sources, or (POST) to conditionally refresh from them right away
+    args:
+        (none)
+    returns:
+        (jsonify-ed dict): Jsonified Dictionary of refresher state and per url fetch statistics
+    """
+    refreshed = None
+    if request.method == 'POST':
+        refreshed = refresh_from_urls()
+        logging.info("REFRESH REQUESTED BY USER")
+    logging.info("SENDING REFRESH STATISTICS TO USER")
+    return jsonify({
+        'refreshed': refreshed,
+        'refresher_running': refresher_stop is not None,
+        'refresh_interval': REFRESH_INTERVAL,
+        'sources': fetch_stats_snapshot([EPOCH_URL] + expand_sources(SIGHTING_URL)),
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Called to report per route request counts and latency histograms, load durations, dataset sizes and cache hit rates
+    args:
+        format (str): (query, optional) 'prometheus' for the Prometheus text exposition format
+    returns:
+        (jsonify-ed dict): Jsonified Dictionary of metrics
+        (Response): Prometheus text
+    """
+    snapshot = metrics_snapshot()
+    if get_query_args().get('format') == 'prometheus':
+        return Response(prometheus_metrics(snapshot), mimetype='text/plain; version=0.0.4')
+    return jsonify(snapshot)
     
 
 ############################################################################################################################
@@ -151,20 +3250,31 @@ def read_data_from_file():
 @app.route('/epochs', methods=['GET'])
 def epochs():
     """                                                                                                                                                                                              
-    Called to return all epochs in the ISS positioning data set 
+    Called to return all epochs in the ISS positioning data set, optionally restricted to a time window
     args:                                                                                                                                                                                            
-        (none)                                                                                                                                 
+        start (str): (query, optional) Earliest epoch to return, OEM day-of-year or ISO 8601 UTC string
+        end (str): (query, optional) Latest epoch to return, OEM day-of-year or ISO 8601 UTC string
+        limit (int): (query, optional) Maximum number of epochs to return
+        after (str): (query, optional) Return epochs after this epoch (cursor from X-Next-Cursor)
+        format (str): (query, optional) 'json' (default) or 'ndjson'
     returns:                                                                                                                                                                                       
-        (jsonify-ed list): Jsonified List containing all Epochs in Position Data Set                                                                                                                    
+        (jsonify-ed list): Jsonified List containing all Epochs in Position Data Set (inside the window)
+        (str): Error string stating that a query argument could not be parsed
     """
-    if not readonce:
+    dataset = iss_dataset
+    if dataset is None:
         logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
         return 'Use /load route to load data before proceeding \n'
-    epoch_vec = []
-    for x in iss_epoch_data:
-        epoch_vec.append(x['EPOCH'])
+    query_args = get_query_args()
+    epoch_times = dataset.epoch_store['times']
+    try:
+        window = epoch_window(epoch_times, query_args)
+    except ValueError:
+        logging.error("UNABLE TO PARSE USER INPUT EPOCH RANGE")
+        return 'UNABLE TO PARSE start/end QUERY ARGUMENTS \n'
     logging.info("SENDING EPOCHS LIST TO USER")
-    return jsonify(epoch_vec)
+    return collection_response(dataset, ('epochs',), dataset.epoch_store['epochs'], keyed=True,
+                               key_positions=dataset.epoch_store['index'], window=window, pinned=True)
 
 
 @app.route('/epochs/<epoch>',methods=['GET'])
@@ -177,39 +3287,274 @@ def epoch_state(epoch:str):
         (jsonify-ed dict): Jsonified Dictionary of Positioning Information at input epoch                                                                                                                    
         (str): Error string stating that specified epoch was not found 
     """
-    if not readonce:
+    dataset = iss_dataset
+    if dataset is None:
         logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
         return 'Use /load route to load data before proceeding \n'
-    for x in iss_epoch_data:
-        if epoch == x['EPOCH']:
-            logging.info("EPOCH KEY FOUND - SENDING RESPECTIVE DICTIONARY TO USER")
-            return jsonify(x)
+    if epoch in dataset.epoch_store['index']:
+        logging.info("EPOCH KEY FOUND - SENDING RESPECTIVE DICTIONARY TO USER")
+        return jsonify(epoch_state_vector(dataset.epoch_store, dataset.epoch_store['index'][epoch]))
     logging.error("NO MATCH FOR USER INPUT EPOCH")
     return 'NO MATCH FOR INPUT EPOCH KEY FOUND IN DATA SET \n'
 
 
+@app.route('/batch/epochs', methods=['POST'])
+def batch_epoch_states():
+    """
+    Called to return positioning information about a batch of epochs in one response
+    args:
+        epochs (list): (POST json body) List of epoch strings, as a bare list or under an "epochs" key
+    returns:
+        (jsonify-ed list): Jsonified List of Positioning Information (or error entry on a miss) for each input epoch
+        (str): Error string stating that the body is not a list of epochs
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
+        return 'Use /load route to load data before proceeding \n'
+    epoch_strs = get_batch_body('epochs')
+    if epoch_strs is None:
+        logging.error("USER INPUT EPOCHS BODY IS NOT A LIST")
+        return f'POST BODY MUST BE A JSON LIST OF AT MOST {MAX_BATCH_SIZE} EPOCHS OR {{"epochs": [...]}} \n'
+    logging.info("SENDING BATCH OF EPOCH STATE VECTORS TO USER")
+    return jsonify(lookup_epochs(dataset.epoch_store, epoch_strs))
+
+
+@app.route('/interpolate', methods=['GET', 'POST'])
+def interpolated_state():
+    """
+    Called to return position and velocity interpolated from the ISS positioning data set at arbitrary UTC times
+    args:
+        time (str): (GET query) OEM day-of-year or ISO 8601 UTC time string
+        times (list): (POST json body) List of time strings, as a bare list or under a "times" key
+    returns:
+        (jsonify-ed dict): Jsonified Dictionary of interpolated Positioning Information at input time (GET)
+        (jsonify-ed list): Jsonified List of interpolated Positioning Information at each input time (POST)
+        (str): Error string stating that the time was missing, unparsable or outside the ephemeris
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
+        return 'Use /load route to load data before proceeding \n'
+    if request.method == 'POST':
+        time_strs = get_batch_body('times')
+        if time_strs is None:
+            logging.error("USER INPUT TIMES BODY IS NOT A LIST")
+            return f'POST BODY MUST BE A JSON LIST OF AT MOST {MAX_BATCH_SIZE} TIMES OR {{"times": [...]}} \n'
+        logging.info("SENDING BATCH OF INTERPOLATED STATE VECTORS TO USER")
+        return jsonify(interpolate_epochs(dataset.epoch_store, time_strs))
+    if 'time' not in request.args:
+        logging.error("NO USER INPUT TIME")
+        return 'USE /interpolate?time=<time> TO PROVIDE A TIME \n'
+    state_vector = interpolate_epochs(dataset.epoch_store, [request.args['time']])[0]
+    if 'error' in state_vector:
+        logging.error("UNABLE TO INTERPOLATE AT USER INPUT TIME")
+        return f"{state_vector['error']} \n"
+    logging.info("SENDING INTERPOLATED STATE VECTOR TO USER")
+    return jsonify(state_vector)
+
+
+@app.route('/ground_track', methods=['GET'])
+def ground_track():
+    """
+    Called to return the geodetic sub-satellite point (WGS-84) of every epoch, optionally restricted to a time window
+    args:
+        start (str): (query, optional) Earliest epoch to return, OEM day-of-year or ISO 8601 UTC string
+        end (str): (query, optional) Latest epoch to return, OEM day-of-year or ISO 8601 UTC string
+        limit (int): (query, optional) Maximum number of points to return
+        after (int): (query, optional) Return points after this many (cursor from X-Next-Cursor)
+        format (str): (query, optional) 'json' (default) or 'ndjson'
+    returns:
+        (jsonify-ed list): Jsonified List of {EPOCH, latitude (deg), longitude (deg), altitude (km)} dictionaries
+        (str): Error string stating that a query argument could not be parsed
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
+        return 'Use /load route to load data before proceeding \n'
+    try:
+        window = epoch_window(dataset.epoch_store['times'], get_query_args())
+    except ValueError:
+        logging.error("UNABLE TO PARSE USER INPUT GROUND TRACK RANGE")
+        return 'UNABLE TO PARSE start/end QUERY ARGUMENTS \n'
+    logging.info("SENDING GROUND TRACK TO USER")
+    return collection_response(dataset, ('ground_track',), GroundTrackRecords(dataset), window=window)
+
+
+@app.route('/over_region', methods=['GET'])
+def over_region():
+    """
+    Called to return the time intervals in which the sub-satellite point is inside a latitude/longitude box
+    args:
+        min_lat, max_lat (float): (query) Latitude bounds of the box in degrees
+        min_lon, max_lon (float): (query) Longitude bounds of the box in degrees (min_lon > max_lon crosses 180)
+        start (str): (query, optional) Time to start searching from, OEM day-of-year or ISO 8601 UTC string
+        end (str): (query, optional) Time to stop searching at, OEM day-of-year or ISO 8601 UTC string
+    returns:
+        (jsonify-ed list): Jsonified List of {start, end, duration_seconds} dictionaries
+        (str): Error string stating that a query argument is missing or could not be parsed
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
+        return 'Use /load route to load data before proceeding \n'
+    epoch_times = dataset.epoch_store['times']
+    if len(epoch_times) < 2:
+        logging.error("NOT ENOUGH EPOCHS FOR GROUND TRACK SEARCH")
+        return 'AT LEAST TWO EPOCHS ARE NEEDED TO SEARCH THE GROUND TRACK \n'
+    query_args = get_query_args()
+    try:
+        lat_range = (float(query_args['min_lat']), float(query_args['max_lat']))
+        lon_range = (float(query_args['min_lon']), float(query_args['max_lon']))
+        start_time = max(epoch_times[0], parse_epoch(query_args['start'])) if 'start' in query_args else epoch_times[0]
+        end_time = min(epoch_times[-1], parse_epoch(query_args['end'])) if 'end' in query_args else epoch_times[-1]
+    except (KeyError, ValueError):
+        logging.error("UNABLE TO PARSE USER INPUT REGION")
+        return 'USE /over_region?min_lat=<deg>&max_lat=<deg>&min_lon=<deg>&max_lon=<deg>[&start=<time>&end=<time>] \n'
+    logging.info("SENDING REGION INTERVALS TO USER")
+    return cached_json_response(dataset, ('over_region', lat_range, lon_range, float(start_time), float(end_time)),
+                                lambda: region_intervals(dataset.epoch_store, start_time, end_time, lat_range, lon_range))
+
+
+@app.route('/passes', methods=['GET'])
+def passes():
+    """
+    Called to predict the passes of the ISS over any observer location from the positioning data set
+    args:
+        lat, lon (float): (query) Observer latitude and longitude in degrees
+        alt (float): (query, optional) Observer height above the WGS-84 ellipsoid in km, default 0
+        min_elevation (float): (query, optional) Elevation in degrees at which a pass rises and sets, default 10
+        start, end (str): (query, optional) Time window for the culminations, OEM day-of-year or ISO 8601 UTC string
+    returns:
+        (jsonify-ed dict): Jsonified Dictionary of the observer location and its List of
+                           {rise, culmination, set, max_elevation (deg), duration_seconds} passes
+        (str): Error string stating that a query argument is missing or could not be parsed
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
+        return 'Use /load route to load data before proceeding \n'
+    if len(dataset.epoch_store['times']) < 2:
+        logging.error("NOT ENOUGH EPOCHS FOR PASS PREDICTION")
+        return 'AT LEAST TWO EPOCHS ARE NEEDED TO PREDICT PASSES \n'
+    query_args = get_query_args()
+    try:
+        observer = parse_observer([float(query_args['lat']), float(query_args['lon']), float(query_args.get('alt', 0.0))])
+        min_elevation = get_min_elevation(query_args)
+        start_time = parse_epoch(query_args['start']) if 'start' in query_args else -np.inf
+        end_time = parse_epoch(query_args['end']) if 'end' in query_args else np.inf
+    except (KeyError, ValueError):
+        logging.error("UNABLE TO PARSE USER INPUT OBSERVER")
+        return 'USE /passes?lat=<deg>&lon=<deg>[&alt=<km>&min_elevation=<deg>&start=<time>&end=<time>] \n'
+    observer_pass_list = observer_passes(dataset, [observer], min_elevation)[0]
+    if start_time > -np.inf or end_time < np.inf:
+        observer_pass_list = [x for x in observer_pass_list if start_time <= parse_epoch(x['culmination']) <= end_time]
+    logging.info("SENDING PREDICTED PASSES TO USER")
+    return jsonify({'lat': observer[0], 'lon': observer[1], 'alt': observer[2], 'min_elevation': min_elevation,
+                    'passes': observer_pass_list})
+
+
+@app.route('/batch/passes', methods=['POST'])
+def batch_passes():
+    """
+    Called to predict the passes of the ISS over a batch of observer locations in one response
+    args:
+        observers (list): (POST json body) List of [lat, lon, alt] lists or {"lat","lon","alt"} dictionaries (alt in km,
+                          optional), as a bare list or under an "observers" key
+        min_elevation (float): (query, optional) Elevation in degrees at which a pass rises and sets, default 10
+    returns:
+        (jsonify-ed list): Jsonified List of {lat, lon, alt, passes} (or {observer, error} on a malformed location)
+                           dictionaries for each input observer
+        (str): Error string stating that the body is not a list of observers
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
+        return 'Use /load route to load data before proceeding \n'
+    if len(dataset.epoch_store['times']) < 2:
+        logging.error("NOT ENOUGH EPOCHS FOR PASS PREDICTION")
+        return 'AT LEAST TWO EPOCHS ARE NEEDED TO PREDICT PASSES \n'
+    observer_list = get_batch_body('observers')
+    try:
+        min_elevation = get_min_elevation(get_query_args())
+    except ValueError:
+        observer_list = None
+    if observer_list is None:
+        logging.error("USER INPUT OBSERVERS BODY IS NOT A LIST")
+        return f'POST BODY MUST BE A JSON LIST OF AT MOST {MAX_BATCH_SIZE} [lat, lon, alt] OBSERVERS OR {{"observers": [...]}}, min_elevation WITHIN [0, 90) \n'
+    results, observers = [], []
+    for observer in observer_list:
+        try:
+            observers.append(parse_observer(observer))
+            results.append(None)
+        except ValueError as e:
+            results.append({'observer': observer, 'error': str(e).upper()})
+    predicted = iter(observer_passes(dataset, observers, min_elevation))
+    parsed = iter(observers)
+    for i, result in enumerate(results):
+        if result is None:
+            lat, lon, alt = next(parsed)
+            results[i] = {'lat': lat, 'lon': lon, 'alt': alt, 'passes': next(predicted)}
+    logging.info("SENDING BATCH OF PREDICTED PASSES TO USER")
+    return jsonify(results)
+
+
 
 ############################################################################################################################
 ### SIGHTING DATA FUNCTIONS 
 
+@app.route('/sightings', methods=['GET'])
+def sightings():
+    """
+    Called to return the sightings anywhere in the ISS sighting data set in a time range, filtered by elevation,
+    duration and country
+    args:
+        from (str): (query, optional) Earliest pass time, OEM day-of-year or ISO 8601 UTC string
+        to (str): (query, optional) Latest pass time, OEM day-of-year or ISO 8601 UTC string
+        min_elevation (float): (query, optional) Minimum max_elevation in degrees
+        min_duration (float): (query, optional) Minimum duration_minutes
+        country (str): (query, optional) Country of the passes
+        limit, after, format (str): (query, optional) Pagination and ndjson output, see collection_response()
+    returns:
+        (jsonify-ed list): Jsonified List of sightings in time order
+        (str): Error string stating that a query argument could not be parsed
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
+        return 'Use /load route to load data before proceeding \n'
+    query_args = get_query_args()
+    try:
+        from_time = parse_epoch(query_args['from']) if 'from' in query_args else -np.inf
+        to_time = parse_epoch(query_args['to']) if 'to' in query_args else np.inf
+        min_elevation = float(query_args['min_elevation']) if 'min_elevation' in query_args else None
+        min_duration = float(query_args['min_duration']) if 'min_duration' in query_args else None
+    except ValueError:
+        logging.error("UNABLE TO PARSE USER INPUT SIGHTING FILTERS")
+        return 'UNABLE TO PARSE from/to/min_elevation/min_duration QUERY ARGUMENTS \n'
+    country = query_args.get('country')
+    def build_results():
+        return query_sightings(dataset.sighting_store, dataset.sighting_data, from_time, to_time, min_elevation,
+                               min_duration, country)
+    logging.info("SENDING FILTERED SIGHTINGS TO USER")
+    return collection_response(dataset, ('sightings', from_time, to_time, min_elevation, min_duration, country), build_results)
+
+
 @app.route('/countries', methods=['GET'])
 def countries():
     """                                                                                                                                                                                              
     Called to return all countries in the ISS sightings data set                                                                                                                                    
     args:                                                                                                                                                                                            
-        (none)                                                                                                                                                                                       
+        limit, after, format (str): (query, optional) Pagination and ndjson output, see collection_response()
     returns:                                                                                                                                                                                         
         (jsonify-ed list): Jsonified List containing all countries in sightings Data Set                                                                                       
     """
-    if not readonce:
+    dataset = iss_dataset
+    if dataset is None:
         logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
         return 'Use /load route to load data before proceeding \n'
-    countries_vec = []
-    for x in iss_sighting_data:
-        if not (x['country'] in countries_vec):
-            countries_vec.append(x['country'])
     logging.info("SENDING COUNTRIES LIST TO USER")
-    return jsonify(countries_vec)
+    return collection_response(dataset, ('countries',), list(dataset.sighting_index), keyed=True, pinned=True)
 
 
 @app.route('/countries/<country>',methods=['GET'])
@@ -219,20 +3564,18 @@ def country_sightings(country:str):
                                                                                                                                                                                                      
     args:                                                                                                                                                                                            
         country (str): String of country obtained from route                                                                                                                                             
+        limit, after, format (str): (query, optional) Pagination and ndjson output, see collection_response()
     returns:                                                                                                                                                                                      
         (jsonify-ed dict): Jsonified Dictionary of sighting information at input country                                                                                                          
         (str): Error string stating that specified country was not found                                                                                                                               
     """
-    if not readonce:
+    dataset = iss_dataset
+    if dataset is None:
         logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
         return 'Use /load route to load data before proceeding \n'
-    country_info_vec = []
-    for x in iss_sighting_data:
-        if country == x['country']:
-            country_info_vec.append(x)
-    if len(country_info_vec)>0:
+    if country in dataset.sighting_index:
         logging.info("SENDING COUNTRY SIGHTING INFORMATION TO USER")
-        return jsonify(country_info_vec)
+        return collection_response(dataset, ('country', country), dataset.sighting_index[country]['sightings'])
     else:
         logging.error("NO MATCH FOR USER INPUT COUNTRY")
         return 'NO MATCH FOR INPUT COUNTRY KEY FOUND IN DATA SET \n'
@@ -243,24 +3586,18 @@ def country_regions(country:str):
     Called to return sighting regions in specified country in the ISS sighting data set                                                                                                    
     args:                                                                                                                                                                                            
         country (str): String of country obtained from route                                                                                                                                         
+        limit, after, format (str): (query, optional) Pagination and ndjson output, see collection_response()
     returns:                                                                                                                                                                                                 
         (jsonify-ed list): Jsonified list of sighting regions in input country                                                                                                                     
         (str): Error string stating that specified country was not found                                                                                                                                 
     """
-    if not readonce:
+    dataset = iss_dataset
+    if dataset is None:
         logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
         return 'Use /load route to load data before proceeding \n'
-    country_info_vec = []
-    for x in iss_sighting_data:
-        if country == x['country']:
-            country_info_vec.append(x)
-    if len(country_info_vec)>0:
-        regions_list = []
-        for y in country_info_vec:
-            if not (y['region'] in regions_list):
-                regions_list.append(y['region'])
+    if country in dataset.sighting_index:
         logging.info("SENDING REGIONS (IN COUNTRY) LIST TO USER")
-        return jsonify(regions_list)
+        return collection_response(dataset, ('regions', country), list(dataset.sighting_index[country]['regions']), keyed=True)
     else:
         logging.error("NO MATCH FOR USER INPUT COUNTRY")
         return 'NO MATCH FOR INPUT COUNTRY KEY FOUND IN DATA SET \n'
@@ -273,25 +3610,20 @@ def country_region_info(country:str,region:str):
     args:                                                                                                                                                                                            
         country (str): String of country obtained from route
         region (str): String of region obtained from route
+        limit, after, format (str): (query, optional) Pagination and ndjson output, see collection_response()
     returns:                                                                                                                                                                                         
         (jsonify-ed dict): Jsonified dictionary of sighting information for specified country-region                                                                                                                      
         (str): Error string stating that specified country or region was not found                                                                                                                           
     """
-    if not readonce:
+    dataset = iss_dataset
+    if dataset is None:
         logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
         return 'Use /load route to load data before proceeding \n'
-    country_info_vec = []
-    for x in iss_sighting_data:
-        if country == x['country']:
-            country_info_vec.append(x)
-    if len(country_info_vec)>0:
-        region_info_vec = []
-        for y in country_info_vec:
-            if y['region'] == region:
-                region_info_vec.append(y)
-        if len(region_info_vec)>0:
+    if country in dataset.sighting_index:
+        regions_dict = dataset.sighting_index[country]['regions']
+        if region in regions_dict:
             logging.info("SENDING COUNTRY-REGION SIGHTING INFORMATION TO USER")
-            return jsonify(region_info_vec)
+            return collection_response(dataset, ('region', country, region), regions_dict[region]['sightings'])
         else:
             logging.error("NO MATCH FOR USER INPUT REGION")
             return 'NO MATCH FOR INPUT REGION KEY FOUND IN COUNTRY DATA SET \n'
@@ -308,29 +3640,20 @@ def country_region_cities(country:str,region:str):
     args:
         country (str): String of country obtained from route                                                                                                                                                 
         region (str): String of region obtained from route                                                                                                                                               
+        limit, after, format (str): (query, optional) Pagination and ndjson output, see collection_response()
     returns:                                                                                                                                                                                         
         (jsonify-ed list): Jsonified list of cities in specified country-region                                                                                                                              
         (str): Error string stating that specified country or region was not found                                                                                                                              
     """
-    if not readonce:
+    dataset = iss_dataset
+    if dataset is None:
         logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
         return 'Use /load route to load data before proceeding \n'
-    country_info_vec = []
-    for x in iss_sighting_data:
-        if country == x['country']:
-            country_info_vec.append(x)
-    if len(country_info_vec)>0:
-        region_info_vec = []
-        for y in country_info_vec:
-            if y['region'] == region:
-                region_info_vec.append(y)
-        if len(region_info_vec)>0:
-            cities_list = []
-            for z in region_info_vec:
-                if not (z['city'] in cities_list):
-                    cities_list.append(z['city'])
+    if country in dataset.sighting_index:
+        regions_dict = dataset.sighting_index[country]['regions']
+        if region in regions_dict:
             logging.info("SENDING CITIES (IN COUNTRY-REGION) LIST TO USER")
-            return jsonify(cities_list)
+            return collection_response(dataset, ('cities', country, region), list(regions_dict[region]['cities']), keyed=True)
         else:
             logging.error("NO MATCH FOR USER INPUT REGION")
             return 'NO MATCH FOR INPUT REGION KEY FOUND IN COUNTRY DATA SET \n'
@@ -347,30 +3670,22 @@ def country_region_city_info(country:str,region:str,city:str):
         country (str): String of country obtained from route                                                                                                                                                 
         region (str): String of region obtained from route 
         city (str): String of city obtained from route                                                                                                                                              
+        limit, after, format (str): (query, optional) Pagination and ndjson output, see collection_response()
     returns:                                                                                                  
         (jsonify-ed dict): Jsonified dictionary of sightings in specified country-region-city                                                                                                                              
         (str): Error string stating that specified country, region, or city was not found                                                                                                                                                                                                                                    
     """
-    if not readonce:
+    dataset = iss_dataset
+    if dataset is None:
         logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
         return 'Use /load route to load data before proceeding \n'
-    country_info_vec = []
-    for x in iss_sighting_data:
-        if country == x['country']:
-            country_info_vec.append(x)
-    if len(country_info_vec)>0:
-        region_info_vec = []
-        for y in country_info_vec:
-            if y['region'] == region:
-                region_info_vec.append(y)
-        if len(region_info_vec)>0:
-            cities_info_vec = []
-            for z in region_info_vec:
-                if z['city'] == city:
-                    cities_info_vec.append(z)
-            if len(cities_info_vec)>0:
+    if country in dataset.sighting_index:
+        regions_dict = dataset.sighting_index[country]['regions']
+        if region in regions_dict:
+            cities_dict = regions_dict[region]['cities']
+            if city in cities_dict:
                 logging.info("SENDING COUNTRY-REGION-CITY SIGHTING INFORMATION TO USER")
-                return jsonify(cities_info_vec)
+                return collection_response(dataset, ('city', country, region, city), cities_dict[city])
             else:
                 logging.error("NO MATCH FOR USER INPUT CITY")
                 return 'NO MATCH FOR INPUT CITY KEY FOUND IN COUNTRY-REGION DATA SET \n'
@@ -381,9 +3696,37 @@ def country_region_city_info(country:str,region:str,city:str):
         logging.error("NO MATCH FOR USER INPUT COUNTRY")
         return 'NO MATCH FOR INPUT COUNTRY KEY FOUND IN DATA SET \n'
 
+
+@app.route('/batch/cities', methods=['POST'])
+def batch_city_info():
+    """
+    Called to return the sighting data of a batch of country-region-city keys in one response
+    args:
+        cities (list): (POST json body) List of [country, region, city] lists or {"country","region","city"}
+                       dictionaries, as a bare list or under a "cities" key
+    returns:
+        (jsonify-ed list): Jsonified List of sightings (or error entry on a miss) for each input key
+        (str): Error string stating that the body is not a list of keys
+    """
+    dataset = iss_dataset
+    if dataset is None:
+        logging.warning("USER HAS NOT LOADED DATA SET BUT ATTEMPTING TO USE SERVICES")
+        return 'Use /load route to load data before proceeding \n'
+    city_keys = get_batch_body('cities')
+    if city_keys is None:
+        logging.error("USER INPUT CITIES BODY IS NOT A LIST")
+        return f'POST BODY MUST BE A JSON LIST OF AT MOST {MAX_BATCH_SIZE} [country, region, city] KEYS OR {{"cities": [...]}} \n'
+    logging.info("SENDING BATCH OF COUNTRY-REGION-CITY SIGHTING INFORMATION TO USER")
+    return jsonify(lookup_cities(dataset.sighting_index, city_keys))
+
 ############################################################################################################################
 ### MAIN 
 if __name__ == '__main__':
+    if SHARED_DATASET_DIR is None or not sync_shared_dataset():
+        if not restore_from_snapshots(EPOCH_FILE, SIGHTING_FILE):
+            restore_from_snapshots(EPOCH_URL, SIGHTING_URL)
+    if REFRESH_INTERVAL is not None:
+        start_refresher(REFRESH_INTERVAL)
     app.run(debug=True, host='0.0.0.0')
 
 ############################################################################################################################
@@ -0,0 +1,447 @@
+"""
+Offline benchmark of the ISS Positioning and Sighting Data Tracker (ISSPSDT)
+
+Generates synthetic ISS.OEM_J2K_EPH.xml and visible_passes documents of each requested size, serves them from a local
+stand-in http server, and measures /load_file and /load_url parse time and peak memory (each in a fresh process) and
+the latency percentiles and throughput of the query routes through the Flask test client, sequentially and under
+concurrent load. Results are written as json, and comparing them against an earlier run flags regressions. Nothing
+is fetched from the network.
+
+usage:
+    python bench.py --sizes 1000,10000,100000 --output bench_results.json
+    python bench.py --sizes 1000,10000,100000 --baseline bench_results.json --tolerance 0.25
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+############################################################################################################################
+### CONSTANTS
+EPOCH_NAME = 'ISS.OEM_J2K_EPH.xml'
+SIGHTING_NAME = 'XMLsightingData_cities.xml'
+START_TIME = datetime(2022, 2, 11, 12, tzinfo=timezone.utc)
+EPOCH_STEP = 240.0              # seconds between synthetic state vectors, as in the NASA publication
+ORBIT_RADIUS = 6790.0           # km
+ORBIT_PERIOD = 5560.0           # seconds
+ORBIT_INCLINATION = 51.64       # degrees
+COUNTRIES = ['United_States', 'Canada', 'Mexico', 'Brazil', 'France', 'Germany', 'India', 'Japan', 'Kenya', 'Australia']
+REGIONS_PER_COUNTRY = 20
+CITIES_PER_REGION = 50
+WRITE_BATCH = 10000             # xml elements formatted per write
+DEFAULT_SIZES = '1000,10000,100000'
+DEFAULT_REQUESTS = 200          # timed requests per route
+DEFAULT_CONCURRENCY = 8         # client threads of the concurrent load
+WARMUP_REQUESTS = 5
+LATENCY_METRICS = ['p50_ms', 'p90_ms', 'p99_ms', 'mean_ms']
+
+############################################################################################################################
+### GENERATORS
+def write_oem_xml(path:str, rows:int):
+    """
+    Writes a synthetic OEM document of a circular, inclined orbit, streaming it to disk in batches so documents of
+    millions of state vectors never have to fit in memory
+    args:
+        path (str): Path of the xml file to write
+        rows (int): Number of state vectors
+    returns:
+        (none)
+    """
+    inclination = math.radians(ORBIT_INCLINATION)
+    omega = 2*math.pi/ORBIT_PERIOD
+    speed = ORBIT_RADIUS*omega
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<ndm><oem id="CCSDS_OEM_VERS" version="2.0"><header>'
+                '<CREATION_DATE>2022-042T12:00:00.000Z</CREATION_DATE></header><body><segment><metadata>'
+                '<OBJECT_NAME>ISS</OBJECT_NAME></metadata><data>\n')
+        for batch_start in range(0, rows, WRITE_BATCH):
+            lines = []
+            for i in range(batch_start, min(rows, batch_start + WRITE_BATCH)):
+                t = i*EPOCH_STEP
+                epoch = (START_TIME + timedelta(seconds=t)).strftime('%Y-%jT%H:%M:%S.%f')[:-3] + 'Z'
+                c, s = math.cos(omega*t), math.sin(omega*t)
+                lines.append(
+                    f'<stateVector><EPOCH>{epoch}</EPOCH>'
+                    f'<X units="km">{ORBIT_RADIUS*c:.6f}</X>'
+                    f'<Y units="km">{ORBIT_RADIUS*s*math.cos(inclination):.6f}</Y>'
+                    f'<Z units="km">{ORBIT_RADIUS*s*math.sin(inclination):.6f}</Z>'
+                    f'<X_DOT units="km/s">{-speed*s:.6f}</X_DOT>'
+                    f'<Y_DOT units="km/s">{speed*c*math.cos(inclination):.6f}</Y_DOT>'
+                    f'<Z_DOT units="km/s">{speed*c*math.sin(inclination):.6f}</Z_DOT></stateVector>\n')
+            f.write(''.join(lines))
+        f.write('</data></segment></body></oem></ndm>\n')
+
+
+def write_sighting_xml(path:str, rows:int):
+    """
+    Writes a synthetic visible_passes document spread over COUNTRIES, each with REGIONS_PER_COUNTRY regions of
+    CITIES_PER_REGION cities, with a pass every few hours
+    args:
+        path (str): Path of the xml file to write
+        rows (int): Number of visible passes
+    returns:
+        (none)
+    """
+    cities_per_country = REGIONS_PER_COUNTRY*CITIES_PER_REGION
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<visible_passes>\n')
+        for batch_start in range(0, rows, WRITE_BATCH):
+            lines = []
+            for i in range(batch_start, min(rows, batch_start + WRITE_BATCH)):
+                country = COUNTRIES[i % len(COUNTRIES)]
+                city = (i // len(COUNTRIES)) % cities_per_country
+                utc = START_TIME + timedelta(minutes=97*i)
+                duration = 1 + i % 6
+                lines.append(
+                    f'<visible_pass><country>{country}</country><region>Region_{city // CITIES_PER_REGION:02d}</region>'
+                    f'<city>City_{city:04d}</city><spacecraft>ISS</spacecraft>'
+                    f'<sighting_date>{utc.strftime("%a %b %d/%I:%M %p")}</sighting_date>'
+                    f'<duration_minutes>{duration}</duration_minutes><max_elevation>{10 + (7*i) % 80}</max_elevation>'
+                    f'<enters>10 above SW</enters><exits>10 above NE</exits><utc_offset>0.0</utc_offset>'
+                    f'<utc_time>{utc.strftime("%H:%M")}</utc_time><utc_date>{utc.strftime("%b %d, %Y")}</utc_date>'
+                    f'</visible_pass>\n')
+            f.write(''.join(lines))
+        f.write('</visible_passes>\n')
+
+############################################################################################################################
+### STAND-IN SERVER
+class QuietHandler(SimpleHTTPRequestHandler):
+    """
+    Static file handler that does not log every request to stderr
+    """
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory:str)->tuple:
+    """
+    Serves a directory over http on a free local port from a background thread
+    args:
+        directory (str): Directory to serve
+    returns:
+        server (ThreadingHTTPServer): Running server, shut down by the caller
+        base_url (str): Url of the served directory
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+############################################################################################################################
+### MEASUREMENTS
+def peak_rss_mb()->float:
+    """
+    Peak resident set size of this process
+    args:
+        (none)
+    returns:
+        (float): Peak RSS in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/(1<<20) if sys.platform == 'darwin' else peak/(1<<10)
+
+
+def configure_app(app_module, epoch_source:str, sighting_source:str, kind:str, with_logging:bool):
+    """
+    Points the app at the synthetic sources and turns off everything that would skip the parse
+    args:
+        app_module (module): Imported app module
+        epoch_source (str): Url or path of the synthetic OEM document
+        sighting_source (str): Url or path of the synthetic sighting document
+        kind (str): 'file' or 'url'
+        with_logging (bool): Keep the app's INFO logging on
+    returns:
+        (none)
+    """
+    if not with_logging:
+        logging.disable(logging.INFO)
+    app_module.SNAPSHOT_DIR = None
+    app_module.SHARED_DATASET_DIR = None
+    if kind == 'url':
+        app_module.EPOCH_URL, app_module.SIGHTING_URL = epoch_source, sighting_source
+    else:
+        app_module.EPOCH_FILE, app_module.SIGHTING_FILE = epoch_source, sighting_source
+
+
+def load_in_child(conn, kind:str, epoch_source:str, sighting_source:str, with_logging:bool):
+    """
+    Runs one load in a fresh process, so its peak memory is not hidden by earlier runs, and sends back the timings
+    args:
+        conn (multiprocessing.connection.Connection): Pipe end to send the result through
+        kind (str): 'file' or 'url'
+        epoch_source (str): Url or path of the synthetic OEM document
+        sighting_source (str): Url or path of the synthetic sighting document
+        with_logging (bool): Keep the app's INFO logging on
+    returns:
+        (none)
+    """
+    import app as isspsdt
+    configure_app(isspsdt, epoch_source, sighting_source, kind, with_logging)
+    client = isspsdt.app.test_client()
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    resp = client.post(f'/load_{kind}')
+    seconds = time.perf_counter() - start
+    dataset = isspsdt.iss_dataset
+    conn.send({
+        'status_code': resp.status_code,
+        'seconds': seconds,
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+        'epochs': len(dataset.epoch_store['epochs']) if dataset else 0,
+        'sightings': len(dataset.sighting_data) if dataset else 0,
+    })
+    conn.close()
+
+
+def measure_load(kind:str, epoch_source:str, sighting_source:str, with_logging:bool)->dict:
+    """
+    Measures a /load_file or /load_url call in a fresh process
+    args:
+        kind (str): 'file' or 'url'
+        epoch_source (str): Url or path of the synthetic OEM document
+        sighting_source (str): Url or path of the synthetic sighting document
+        with_logging (bool): Keep the app's INFO logging on
+    returns:
+        (dict): Load time, peak RSS before and after the load, and the number of rows loaded
+    """
+    context = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    child = context.Process(target=load_in_child, args=(child_conn, kind, epoch_source, sighting_source, with_logging))
+    child.start()
+    child_conn.close()
+    result = parent_conn.recv()
+    child.join()
+    return result
+
+
+def latency_summary(latencies:list, wall_seconds:float)->dict:
+    """
+    Summarizes request latencies
+    args:
+        latencies (list): Seconds taken by each request
+        wall_seconds (float): Wall clock seconds taken by all requests
+    returns:
+        (dict): Percentiles and mean in milliseconds, and requests per second
+    """
+    latencies_ms = np.array(latencies)*1000
+    return {
+        'requests': len(latencies),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p90_ms': float(np.percentile(latencies_ms, 90)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'mean_ms': float(latencies_ms.mean()),
+        'requests_per_second': len(latencies)/wall_seconds if wall_seconds else None,
+    }
+
+
+def timed_request(client, method:str, path:str, body)->float:
+    """
+    Sends one request through a Flask test client
+    args:
+        client (FlaskClient): Test client
+        method (str): 'GET' or 'POST'
+        path (str): Route with query string
+        body (list): Json body of POST requests
+    returns:
+        (float): Seconds taken
+    raises:
+        RuntimeError: If the route did not answer with 200
+    """
+    start = time.perf_counter()
+    resp = client.open(path, method=method, json=body)
+    seconds = time.perf_counter() - start
+    if resp.status_code != 200:
+        raise RuntimeError(f'{method} {path} answered {resp.status_code}')
+    return seconds
+
+
+def route_requests(dataset)->dict:
+    """
+    Representative requests for each query route, built from the keys of the loaded dataset
+    args:
+        dataset (Dataset): Loaded generation
+    returns:
+        (dict): Name to (method, path, json body) of each request
+    """
+    epochs = dataset.epoch_store['epochs']
+    mid_epoch = epochs[len(epochs)//2]
+    sighting = dataset.sighting_data[len(dataset.sighting_data)//2]
+    city_path = f"/countries/{sighting['country']}/regions/{sighting['region']}/cities/{sighting['city']}"
+    return {
+        'epochs_page': ('GET', '/epochs?limit=100', None),
+        'epoch': ('GET', f'/epochs/{mid_epoch}', None),
+        'batch_epochs': ('POST', '/batch/epochs', epochs[::max(1, len(epochs)//100)][:100]),
+        'interpolate': ('GET', f'/interpolate?time={epochs[len(epochs)//3][:-7]}30.000Z', None),
+        'interpolate_batch': ('POST', '/interpolate', epochs[::max(1, len(epochs)//100)][:100]),
+        'ground_track_page': ('GET', '/ground_track?limit=100', None),
+        'countries': ('GET', '/countries', None),
+        'city': ('GET', city_path, None),
+        'batch_cities': ('POST', '/batch/cities', [[x['country'], x['region'], x['city']] for x in dataset.sighting_data[:100]]),
+        'sightings_filtered': ('GET', f"/sightings?country={sighting['country']}&min_elevation=45&limit=100", None),
+        'passes': ('GET', '/passes?lat=30.27&lon=-97.74', None),
+        'batch_passes': ('POST', '/batch/passes', [[lat, lon] for lat in range(-50, 51, 10) for lon in range(-180, 180, 40)]),
+    }
+
+
+def measure_routes(epoch_source:str, sighting_source:str, request_count:int, concurrency:int, with_logging:bool)->dict:
+    """
+    Measures every representative route sequentially and under concurrent load, in this process
+    args:
+        epoch_source (str): Path of the synthetic OEM document
+        sighting_source (str): Path of the synthetic sighting document
+        request_count (int): Timed requests per route for each of the two runs
+        concurrency (int): Client threads of the concurrent run
+        with_logging (bool): Keep the app's INFO logging on
+    returns:
+        (dict): Route name to {'sequential': summary, 'concurrent': summary} (see latency_summary())
+    """
+    import app as isspsdt
+    configure_app(isspsdt, epoch_source, sighting_source, 'file', with_logging)
+    isspsdt.app.test_client().post('/load_file')
+    results = {}
+    for name, (method, path, body) in route_requests(isspsdt.iss_dataset).items():
+        client = isspsdt.app.test_client()
+        for _ in range(WARMUP_REQUESTS):
+            timed_request(client, method, path, body)
+        start = time.perf_counter()
+        sequential = [timed_request(client, method, path, body) for _ in range(request_count)]
+        sequential_wall = time.perf_counter() - start
+        thread_clients = threading.local()
+        def concurrent_request(_):
+            if not hasattr(thread_clients, 'client'):
+                thread_clients.client = isspsdt.app.test_client()
+            return timed_request(thread_clients.client, method, path, body)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            concurrent = list(executor.map(concurrent_request, range(request_count)))
+            concurrent_wall = time.perf_counter() - start
+        results[name] = {
+            'sequential': latency_summary(sequential, sequential_wall),
+            'concurrent': latency_summary(concurrent, concurrent_wall),
+        }
+    return results
+
+############################################################################################################################
+### REGRESSIONS
+def find_regressions(results:dict, baseline:dict, tolerance:float)->list:
+    """
+    Compares the timings of two benchmark runs of the same sizes
+    args:
+        results (dict): Results of this run
+        baseline (dict): Results of an earlier run
+        tolerance (float): Allowed relative slow down, e.g. 0.25 for 25%
+    returns:
+        regressions (list): Description of each timing that got slower than the tolerance allows
+    """
+    regressions = []
+    def check(label, new, old):
+        if new is not None and old and new > old*(1 + tolerance):
+            regressions.append(f'{label}: {old:.4g} -> {new:.4g} (+{100*(new/old - 1):.0f}%)')
+    baseline_sizes = {x['rows']: x for x in baseline.get('sizes', [])}
+    for size in results['sizes']:
+        old_size = baseline_sizes.get(size['rows'])
+        if old_size is None:
+            continue
+        for kind in ('load_file', 'load_url'):
+            if kind in size and kind in old_size:
+                check(f"{size['rows']} rows {kind} seconds", size[kind]['seconds'], old_size[kind]['seconds'])
+                check(f"{size['rows']} rows {kind} peak_rss_mb", size[kind]['peak_rss_mb'], old_size[kind]['peak_rss_mb'])
+        for route, runs in size.get('routes', {}).items():
+            for run, summary in runs.items():
+                old_summary = old_size.get('routes', {}).get(route, {}).get(run)
+                if old_summary is None:
+                    continue
+                for metric in LATENCY_METRICS:
+                    check(f"{size['rows']} rows {route} {run} {metric}", summary[metric], old_summary[metric])
+    return regressions
+
+############################################################################################################################
+### MAIN
+def main(argv:list=None)->int:
+    """
+    Runs the benchmark
+    args:
+        argv (list): Command line arguments, sys.argv[1:] by default
+    returns:
+        (int): Exit status, 1 if regressions against the baseline were found
+    """
+    parser = argparse.ArgumentParser(description='Offline ISSPSDT load and route benchmark')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated row counts of the synthetic documents')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='timed requests per route and run')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='client threads of the concurrent run')
+    parser.add_argument('--output', default='bench_results.json', help='json file to write the results to')
+    parser.add_argument('--baseline', help='json results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slow down against the baseline')
+    parser.add_argument('--skip-url', action='store_true', help='do not measure /load_url')
+    parser.add_argument('--skip-routes', action='store_true', help='do not measure the query routes')
+    parser.add_argument('--with-logging', action='store_true', help="keep the app's INFO logging on")
+    args = parser.parse_args(argv)
+    os.environ['NO_PROXY'] = os.environ['no_proxy'] = '127.0.0.1,localhost'
+    sizes = [int(x) for x in args.sizes.split(',') if x]
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'sizes': [],
+    }
+    with tempfile.TemporaryDirectory(prefix='isspsdt-bench-') as data_dir:
+        server, base_url = serve_directory(data_dir)
+        try:
+            for rows in sizes:
+                epoch_path, sighting_path = os.path.join(data_dir, EPOCH_NAME), os.path.join(data_dir, SIGHTING_NAME)
+                start = time.perf_counter()
+                write_oem_xml(epoch_path, rows)
+                write_sighting_xml(sighting_path, rows)
+                size = {
+                    'rows': rows,
+                    'oem_bytes': os.path.getsize(epoch_path),
+                    'sighting_bytes': os.path.getsize(sighting_path),
+                    'generate_seconds': time.perf_counter() - start,
+                }
+                print(f'{rows} rows: generated in {size["generate_seconds"]:.2f}s', flush=True)
+                size['load_file'] = measure_load('file', epoch_path, sighting_path, args.with_logging)
+                print(f'{rows} rows: /load_file {size["load_file"]["seconds"]:.3f}s, peak rss {size["load_file"]["peak_rss_mb"]:.0f} MB', flush=True)
+                if not args.skip_url:
+                    size['load_url'] = measure_load('url', base_url + EPOCH_NAME, base_url + SIGHTING_NAME, args.with_logging)
+                    print(f'{rows} rows: /load_url {size["load_url"]["seconds"]:.3f}s, peak rss {size["load_url"]["peak_rss_mb"]:.0f} MB', flush=True)
+                if not args.skip_routes:
+                    size['routes'] = measure_routes(epoch_path, sighting_path, args.requests, args.concurrency, args.with_logging)
+                    for route, runs in size['routes'].items():
+                        print(f'{rows} rows: {route:20s} p50 {runs["sequential"]["p50_ms"]:8.3f} ms  p99 {runs["sequential"]["p99_ms"]:8.3f} ms  '
+                              f'{runs["concurrent"]["requests_per_second"]:9.0f} req/s x{args.concurrency}', flush=True)
+                results['sizes'].append(size)
+        finally:
+            server.shutdown()
+            server.server_close()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {args.output}')
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
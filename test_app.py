@@ -106,3 +106,639 @@ def test_epochs():
 
 
 
+############################################################################################################################
+# LOCAL FIXTURE DATA - SMALL HAND-WRITTEN XML SETS SO ROUTE TESTS DO NOT NEED THE NASA FILES OR A NETWORK
+
+import app as isspsdt
+import subprocess
+import sys
+
+FIXTURE_EPOCH_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<ndm><oem id="CCSDS_OEM_VERS" version="2.0"><body><segment><data>
+<stateVector><EPOCH>2022-042T12:00:00.000Z</EPOCH><X units="km">-5097.51</X><Y units="km">2303.54</Y><Z units="km">-3916.13</Z><X_DOT units="km/s">-4.59</X_DOT><Y_DOT units="km/s">-4.58</Y_DOT><Z_DOT units="km/s">3.24</Z_DOT></stateVector>
+<stateVector><EPOCH>2022-042T12:04:00.000Z</EPOCH><X units="km">-5998.41</X><Y units="km">1140.71</Y><Z units="km">-3052.18</Z><X_DOT units="km/s">-2.84</X_DOT><Y_DOT units="km/s">-5.09</Y_DOT><Z_DOT units="km/s">3.94</Z_DOT></stateVector>
+<stateVector><EPOCH>2022-042T12:08:00.000Z</EPOCH><X units="km">-6454.66</X><Y units="km">-93.12</Y><Z units="km">-2052.09</Z><X_DOT units="km/s">-0.91</X_DOT><Y_DOT units="km/s">-5.14</Y_DOT><Z_DOT units="km/s">4.35</Z_DOT></stateVector>
+</data></segment></body></oem></ndm>
+'''
+
+FIXTURE_SIGHTING_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<visible_passes>
+<visible_pass><country>United_States</country><region>Texas</region><city>Austin</city><spacecraft>ISS</spacecraft><sighting_date>Thu Feb 17/06:13 AM</sighting_date><duration_minutes>1</duration_minutes><max_elevation>11</max_elevation><enters>10 above S</enters><exits>10 above SSE</exits><utc_offset>-6.0</utc_offset><utc_time>12:13</utc_time><utc_date>Feb 17, 2022</utc_date></visible_pass>
+<visible_pass><country>United_States</country><region>Texas</region><city>Dallas</city><spacecraft>ISS</spacecraft><sighting_date>Fri Feb 18/05:26 AM</sighting_date><duration_minutes>4</duration_minutes><max_elevation>37</max_elevation><enters>10 above SSW</enters><exits>21 above E</exits><utc_offset>-6.0</utc_offset><utc_time>11:26</utc_time><utc_date>Feb 18, 2022</utc_date></visible_pass>
+<visible_pass><country>United_States</country><region>Ohio</region><city>Akron</city><spacecraft>ISS</spacecraft><sighting_date>Sat Feb 19/06:15 AM</sighting_date><duration_minutes>6</duration_minutes><max_elevation>60</max_elevation><enters>10 above SW</enters><exits>10 above NE</exits><utc_offset>-5.0</utc_offset><utc_time>11:15</utc_time><utc_date>Feb 19, 2022</utc_date></visible_pass>
+<visible_pass><country>United_States</country><region>Texas</region><city>Austin</city><spacecraft>ISS</spacecraft><sighting_date>Sat Feb 19/05:27 AM</sighting_date><duration_minutes>2</duration_minutes><max_elevation>18</max_elevation><enters>10 above SW</enters><exits>17 above S</exits><utc_offset>-6.0</utc_offset><utc_time>11:27</utc_time><utc_date>Feb 19, 2022</utc_date></visible_pass>
+<visible_pass><country>Canada</country><region>Ontario</region><city>Toronto</city><spacecraft>ISS</spacecraft><sighting_date>Sun Feb 20/06:02 AM</sighting_date><duration_minutes>3</duration_minutes><max_elevation>25</max_elevation><enters>10 above W</enters><exits>12 above N</exits><utc_offset>-5.0</utc_offset><utc_time>11:02</utc_time><utc_date>Feb 20, 2022</utc_date></visible_pass>
+</visible_passes>
+'''
+
+@pytest.fixture
+def fixture_files(tmp_path, monkeypatch):
+    epoch_file = tmp_path / 'fixture_oem.xml'
+    sighting_file = tmp_path / 'fixture_sightings.xml'
+    epoch_file.write_text(FIXTURE_EPOCH_XML)
+    sighting_file.write_text(FIXTURE_SIGHTING_XML)
+    monkeypatch.setattr(isspsdt, 'EPOCH_FILE', str(epoch_file))
+    monkeypatch.setattr(isspsdt, 'SIGHTING_FILE', str(sighting_file))
+    monkeypatch.setattr(isspsdt, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    return epoch_file, sighting_file
+
+@pytest.fixture
+def client(fixture_files):
+    test_client = isspsdt.app.test_client()
+    test_client.post('/load_file')
+    return test_client
+
+############################################################################################################################
+
+def test_build_sighting_index():
+    sighting_data = xmltodict.parse(FIXTURE_SIGHTING_XML)['visible_passes']['visible_pass']
+    sighting_index = build_sighting_index(sighting_data)
+    assert list(sighting_index) == ['United_States', 'Canada']
+    assert list(sighting_index['United_States']['regions']) == ['Texas', 'Ohio']
+    assert list(sighting_index['United_States']['regions']['Texas']['cities']) == ['Austin', 'Dallas']
+    assert len(sighting_index['United_States']['sightings']) == 4
+    assert len(sighting_index['United_States']['regions']['Texas']['cities']['Austin']) == 2
+
+def test_sighting_routes(client):
+    assert client.get('/countries').get_json() == ['United_States', 'Canada']
+    assert len(client.get('/countries/United_States').get_json()) == 4
+    assert client.get('/countries/United_States/regions').get_json() == ['Texas', 'Ohio']
+    assert len(client.get('/countries/United_States/regions/Texas').get_json()) == 3
+    assert client.get('/countries/United_States/regions/Texas/cities').get_json() == ['Austin', 'Dallas']
+    assert len(client.get('/countries/United_States/regions/Texas/cities/Austin').get_json()) == 2
+    assert 'NO MATCH' in client.get('/countries/Mexico').get_data(as_text=True)
+    assert 'NO MATCH' in client.get('/countries/United_States/regions/Utah/cities').get_data(as_text=True)
+    assert 'NO MATCH' in client.get('/countries/United_States/regions/Texas/cities/Houston').get_data(as_text=True)
+
+############################################################################################################################
+
+def test_parse_epoch():
+    assert parse_epoch('2022-042T12:00:00.000Z') == 1644580800.0
+    assert parse_epoch('2022-02-11T12:00:00Z') == 1644580800.0
+    assert parse_epoch('2022-042T12:04:00.000Z') - parse_epoch('2022-042T12:00:00.000Z') == 240.0
+    with pytest.raises(ValueError):
+        parse_epoch('not an epoch')
+
+def test_epoch_routes(client):
+    assert client.get('/epochs').get_json()[0] == '2022-042T12:00:00.000Z'
+    assert client.get('/epochs?start=2022-042T12:01:00.000Z').get_json() == ['2022-042T12:04:00.000Z', '2022-042T12:08:00.000Z']
+    assert client.get('/epochs?end=2022-042T12:04:00.000Z').get_json() == ['2022-042T12:00:00.000Z', '2022-042T12:04:00.000Z']
+    assert client.get('/epochs?start=2022-02-11T12:00:00Z&limit=1').get_json() == ['2022-042T12:00:00.000Z']
+    assert 'UNABLE' in client.get('/epochs?start=yesterday').get_data(as_text=True)
+    assert client.get('/epochs/2022-042T12:04:00.000Z').get_json()['X']['#text'] == '-5998.41'
+    assert 'NO MATCH' in client.get('/epochs/2022-042T12:05:00.000Z').get_data(as_text=True)
+
+############################################################################################################################
+
+def test_build_epoch_store():
+    epoch_data = xmltodict.parse(FIXTURE_EPOCH_XML)['ndm']['oem']['body']['segment']['data']['stateVector']
+    epoch_store = build_epoch_store(epoch_data[::-1])
+    assert epoch_store['epochs'] == ['2022-042T12:00:00.000Z', '2022-042T12:04:00.000Z', '2022-042T12:08:00.000Z']
+    assert epoch_store['position'].shape == (3, 3)
+    assert epoch_store['velocity'].dtype == np.float64
+    assert epoch_store['units'] == {'X': 'km', 'Y': 'km', 'Z': 'km', 'X_DOT': 'km/s', 'Y_DOT': 'km/s', 'Z_DOT': 'km/s'}
+    assert epoch_store['index']['2022-042T12:08:00.000Z'] == 2
+    assert epoch_state_vector(epoch_store, 0) == dict(epoch_data[0])
+
+############################################################################################################################
+
+def test_interpolate_state_vectors():
+    epoch_data = xmltodict.parse(FIXTURE_EPOCH_XML)['ndm']['oem']['body']['segment']['data']['stateVector']
+    epoch_store = build_epoch_store(epoch_data)
+    position, velocity = interpolate_state_vectors(epoch_store, epoch_store['times'])
+    # HERMITE INTERPOLATION REPRODUCES THE STATE VECTORS AT THE NODES
+    assert np.allclose(position, epoch_store['position'])
+    assert np.allclose(velocity, epoch_store['velocity'])
+    position, velocity = interpolate_state_vectors(epoch_store, epoch_store['times'][:2].mean(keepdims=True))
+    assert position.shape == (1, 3)
+    assert np.all(np.minimum(*epoch_store['position'][:2]) - 100 < position[0])
+    assert np.all(np.maximum(*epoch_store['position'][:2]) + 100 > position[0])
+
+def test_interpolate_route(client):
+    state_vector = client.get('/interpolate?time=2022-042T12:04:00.000Z').get_json()
+    assert state_vector['EPOCH'] == '2022-042T12:04:00.000Z'
+    assert float(state_vector['X']['#text']) == pytest.approx(-5998.41)
+    assert 'OUTSIDE' in client.get('/interpolate?time=2022-043T12:00:00.000Z').get_data(as_text=True)
+    batch = client.post('/interpolate', json={'times': ['2022-02-11T12:02:00Z', 'soon', '2022-042T11:00:00.000Z']}).get_json()
+    assert batch[0]['EPOCH'] == '2022-042T12:02:00.000Z'
+    assert batch[0]['X']['@units'] == 'km'
+    assert batch[1]['error'] == 'UNABLE TO PARSE TIME'
+    assert batch[2]['error'] == 'TIME OUTSIDE OF EPHEMERIS SPAN'
+    assert 'AT MOST' in client.post('/interpolate', json=['2022-042T12:00:00.000Z']*(isspsdt.MAX_BATCH_SIZE+1)).get_data(as_text=True)
+
+############################################################################################################################
+
+@pytest.fixture
+def local_server(fixture_files):
+    # SERVE THE FIXTURE DIRECTORY OVER HTTP ON A FREE LOCAL PORT AS A STAND-IN FOR THE NASA BUCKET
+    import functools, http.server, threading
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(fixture_files[0].parent))
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+def test_stream_epoch_store(fixture_files):
+    epoch_data = xmltodict.parse(FIXTURE_EPOCH_XML)['ndm']['oem']['body']['segment']['data']['stateVector']
+    epoch_store = stream_epoch_store(stream_xml_data_file, str(fixture_files[0]))
+    assert epoch_store['epochs'] == build_epoch_store(epoch_data)['epochs']
+    assert np.array_equal(epoch_store['position'], build_epoch_store(epoch_data)['position'])
+    assert epoch_store['units']['X_DOT'] == 'km/s'
+
+def test_stream_sighting_data(fixture_files, local_server):
+    sighting_data = stream_sighting_data(stream_xml_data_file, str(fixture_files[1]))
+    assert sighting_data == xmltodict.parse(FIXTURE_SIGHTING_XML)['visible_passes']['visible_pass']
+    assert stream_sighting_data(stream_xml_data_url, local_server + '/fixture_sightings.xml') == sighting_data
+
+############################################################################################################################
+
+def test_snapshots(fixture_files, monkeypatch):
+    epoch_source, sighting_source = str(fixture_files[0]), str(fixture_files[1])
+    epoch_store = load_with_snapshot('epoch', stream_xml_data_file, epoch_source)
+    sighting_data = load_with_snapshot('sighting', stream_xml_data_file, sighting_source)
+    # SECOND LOAD MUST COME FROM THE SNAPSHOT WITHOUT PARSING ANY XML
+    def no_parse(*args):
+        raise AssertionError('xml parsed although snapshot is current')
+    monkeypatch.setattr(isspsdt, 'stream_epoch_store', no_parse)
+    monkeypatch.setattr(isspsdt, 'stream_sighting_data', no_parse)
+    snap_store = load_with_snapshot('epoch', stream_xml_data_file, epoch_source)
+    assert snap_store['epochs'] == epoch_store['epochs']
+    assert isinstance(snap_store['position'], np.memmap)
+    assert np.array_equal(snap_store['velocity'], epoch_store['velocity'])
+    assert snap_store['units'] == epoch_store['units']
+    assert load_with_snapshot('sighting', stream_xml_data_file, sighting_source) == sighting_data
+    assert restore_from_snapshots(epoch_source, sighting_source) == True
+    # A MODIFIED SOURCE INVALIDATES ITS SNAPSHOT
+    fixture_files[1].write_text(FIXTURE_SIGHTING_XML.replace('Austin', 'Round_Rock'))
+    os.utime(fixture_files[1], ns=(1, 1))
+    with pytest.raises(AssertionError):
+        load_with_snapshot('sighting', stream_xml_data_file, sighting_source)
+
+############################################################################################################################
+
+def test_refresh_from_urls(fixture_files, local_server, monkeypatch):
+    monkeypatch.setattr(isspsdt, 'EPOCH_URL', local_server + '/fixture_oem.xml')
+    monkeypatch.setattr(isspsdt, 'SIGHTING_URL', local_server + '/fixture_sightings.xml')
+    monkeypatch.setattr(isspsdt, 'fetch_stats', {})
+    monkeypatch.setattr(isspsdt, 'iss_dataset', None)
+    assert refresh_from_urls() == True
+    # LOCAL SERVER ANSWERS If-Modified-Since WITH 304 SO NOTHING IS RE-PARSED
+    assert refresh_from_urls() == False
+    epoch_stats = isspsdt.fetch_stats[isspsdt.EPOCH_URL]
+    assert epoch_stats['parsed_count'] == 1 and epoch_stats['not_modified_count'] == 1
+    # NEWER MODIFICATION TIME BUT SAME BODY IS CAUGHT BY THE BODY HASH
+    os.utime(fixture_files[0], (time.time() + 10, time.time() + 10))
+    assert refresh_from_urls() == False
+    assert epoch_stats['unchanged_count'] == 1 and epoch_stats['parsed_count'] == 1
+    # CHANGED BODY IS PARSED AND SERVED
+    fixture_files[1].write_text(FIXTURE_SIGHTING_XML.replace('Canada', 'Mexico'))
+    os.utime(fixture_files[1], (time.time() + 20, time.time() + 20))
+    assert refresh_from_urls() == True
+    with isspsdt.app.test_client() as test_client:
+        assert test_client.get('/countries').get_json() == ['United_States', 'Mexico']
+        assert len(test_client.get('/refresh').get_json()['sources']) == 2
+        # DATA LOADED FROM FILES IS NOT MIXED WITH URL DATA BY THE REFRESHER
+        test_client.post('/load_file')
+        fixture_files[1].write_text(FIXTURE_SIGHTING_XML)
+        os.utime(fixture_files[1], (time.time() + 30, time.time() + 30))
+        assert refresh_from_urls() == False
+        assert isspsdt.iss_dataset.sources['sighting'] == isspsdt.SIGHTING_FILE
+
+def test_refresh_stats_errors(monkeypatch):
+    monkeypatch.setattr(isspsdt, 'fetch_stats', {})
+    assert fetch_url_source('epoch', 'http://127.0.0.1:9/missing.xml') is None
+    assert isspsdt.fetch_stats['http://127.0.0.1:9/missing.xml']['error_count'] == 1
+
+def test_background_refresher(fixture_files, local_server, monkeypatch):
+    monkeypatch.setattr(isspsdt, 'EPOCH_URL', local_server + '/fixture_oem.xml')
+    monkeypatch.setattr(isspsdt, 'SIGHTING_URL', local_server + '/fixture_sightings.xml')
+    monkeypatch.setattr(isspsdt, 'fetch_stats', {})
+    monkeypatch.setattr(isspsdt, 'iss_dataset', None)
+    refresher = start_refresher(0.05)
+    time.sleep(0.5)
+    stop_refresher()
+    refresher.join(timeout=5)
+    assert not refresher.is_alive()
+    assert isspsdt.fetch_stats[isspsdt.EPOCH_URL]['fetch_count'] >= 2
+    assert isspsdt.fetch_stats[isspsdt.EPOCH_URL]['parsed_count'] <= 1
+
+############################################################################################################################
+
+def test_dataset_generations(client):
+    first = isspsdt.iss_dataset
+    assert isinstance(first, Dataset)
+    client.post('/load_file')
+    second = isspsdt.iss_dataset
+    assert second.generation > first.generation
+    # THE OLD GENERATION IS NEVER MUTATED BY A RELOAD
+    assert first.sighting_index is not second.sighting_index
+    assert list(first.sighting_index) == ['United_States', 'Canada']
+    assert second.sources['epoch'] == isspsdt.EPOCH_FILE
+
+def test_async_load_job(client):
+    generation = isspsdt.iss_dataset.generation
+    resp = client.post('/load_file?async=true')
+    assert resp.status_code == 202
+    job_id = resp.get_json()['job_id']
+    for _ in range(100):
+        job = client.get(f'/load_jobs/{job_id}').get_json()
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    assert job['status'] == 'done'
+    assert job['generation'] > generation
+    assert 'NO MATCH' in client.get('/load_jobs/not_a_job').get_data(as_text=True)
+
+############################################################################################################################
+
+def test_response_cache(client, monkeypatch):
+    resp = client.get('/countries/United_States/regions')
+    etag = resp.headers['ETag']
+    assert resp.get_json() == ['Texas', 'Ohio']
+    assert client.get('/countries/United_States/regions', headers={'If-None-Match': etag}).status_code == 304
+    gzip_resp = client.get('/countries/United_States/regions', headers={'Accept-Encoding': 'gzip'})
+    assert gzip_resp.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(gzip_resp.get_data())) == ['Texas', 'Ohio']
+    assert gzip_resp.headers['ETag'] != etag
+    entry = isspsdt.response_cache['lru'][('regions', 'United_States', 0, 2)]
+    assert 'gzip' in entry and 'br' not in entry
+    # A RELOAD PUBLISHES A NEW GENERATION AND DROPS EVERY CACHED RESPONSE AT ONCE
+    hits = isspsdt.response_cache_stats['hits']
+    client.post('/load_file')
+    assert client.get('/countries/United_States/regions').get_json() == ['Texas', 'Ohio']
+    assert isspsdt.response_cache_stats['hits'] == hits
+    # PARAMETERIZED ROUTES SHARE A BOUNDED LRU
+    monkeypatch.setattr(isspsdt, 'RESPONSE_CACHE_SIZE', 2)
+    for route in ['/countries/Canada', '/countries/Canada/regions', '/countries/United_States']:
+        client.get(route)
+    assert len(isspsdt.response_cache['lru']) == 2
+    client.get('/countries')
+    assert ('countries', 0, 2) in isspsdt.response_cache['pinned']
+
+############################################################################################################################
+
+def test_pagination(client):
+    resp = client.get('/epochs?limit=2')
+    assert resp.get_json() == ['2022-042T12:00:00.000Z', '2022-042T12:04:00.000Z']
+    assert resp.headers['X-Next-Cursor'] == '2022-042T12:04:00.000Z'
+    resp = client.get('/epochs?limit=2&after=2022-042T12:04:00.000Z')
+    assert resp.get_json() == ['2022-042T12:08:00.000Z']
+    assert 'X-Next-Cursor' not in resp.headers
+    assert client.get('/countries?after=United_States').get_json() == ['Canada']
+    resp = client.get('/countries/United_States?limit=3')
+    assert len(resp.get_json()) == 3
+    assert resp.headers['X-Next-Cursor'] == '3'
+    assert client.get('/countries/United_States?after=3').get_json()[0]['city'] == 'Austin'
+    assert client.get('/countries/United_States/regions/Texas/cities?limit=1').get_json() == ['Austin']
+    assert 'UNABLE' in client.get('/countries?after=Atlantis').get_data(as_text=True)
+    assert 'UNABLE' in client.get('/countries?limit=-1').get_data(as_text=True)
+
+def test_ndjson(client):
+    resp = client.get('/countries/United_States/regions/Texas?format=ndjson')
+    assert resp.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [x['city'] for x in records] == ['Austin', 'Dallas', 'Austin']
+    resp = client.get('/epochs?format=ndjson&limit=2')
+    assert resp.get_data(as_text=True) == '"2022-042T12:00:00.000Z"\n"2022-042T12:04:00.000Z"\n'
+
+############################################################################################################################
+
+def test_batch_epochs(client):
+    results = client.post('/batch/epochs', json=['2022-042T12:08:00.000Z', '2022-042T12:05:00.000Z']).get_json()
+    assert results[0]['X']['#text'] == '-6454.66'
+    assert results[1] == {'EPOCH': '2022-042T12:05:00.000Z', 'error': 'NO MATCH FOR INPUT EPOCH KEY FOUND IN DATA SET'}
+    assert len(client.post('/batch/epochs', json={'epochs': ['2022-042T12:00:00.000Z']}).get_json()) == 1
+    assert 'POST BODY' in client.post('/batch/epochs', json={'epoch': '2022-042T12:00:00.000Z'}).get_data(as_text=True)
+
+def test_batch_cities(client):
+    results = client.post('/batch/cities', json={'cities': [
+        ['United_States', 'Texas', 'Austin'],
+        {'country': 'Canada', 'region': 'Ontario', 'city': 'Toronto'},
+        ['United_States', 'Texas', 'Houston'],
+        ['United_States', 'Utah', 'Provo'],
+        ['Mexico', 'Jalisco', 'Guadalajara'],
+        'Austin',
+    ]}).get_json()
+    assert len(results[0]['sightings']) == 2
+    assert results[1]['sightings'][0]['city'] == 'Toronto'
+    assert 'CITY' in results[2]['error']
+    assert 'REGION' in results[3]['error']
+    assert 'COUNTRY' in results[4]['error']
+    assert 'error' in results[5]
+
+############################################################################################################################
+
+def test_eci_to_geodetic():
+    j2000 = parse_epoch('2000-01-01T12:00:00Z')
+    assert np.degrees(gmst_angle(np.array([j2000])))[0] == pytest.approx(280.46061837)
+    # ROUND TRIP AGAINST THE FORWARD WGS-84 FORMULA, ROTATED INTO THE INERTIAL FRAME BY GMST
+    lat, lon, alt = np.radians([35.0, -51.6]), np.radians([-97.0, 150.0]), np.array([420.0, 0.0])
+    e2 = WGS84_F*(2 - WGS84_F)
+    n = WGS84_A/np.sqrt(1 - e2*np.sin(lat)**2)
+    ecef = np.stack([(n + alt)*np.cos(lat)*np.cos(lon), (n + alt)*np.cos(lat)*np.sin(lon), (n*(1 - e2) + alt)*np.sin(lat)], axis=1)
+    times = np.array([j2000 + 3600.0, j2000 + 86400.0*8000])
+    theta = gmst_angle(times)
+    eci = np.stack([np.cos(theta)*ecef[:, 0] - np.sin(theta)*ecef[:, 1], np.sin(theta)*ecef[:, 0] + np.cos(theta)*ecef[:, 1], ecef[:, 2]], axis=1)
+    geo_lat, geo_lon, geo_alt = eci_to_geodetic(eci, times)
+    assert np.allclose(geo_lat, [35.0, -51.6])
+    assert np.allclose(geo_lon, [-97.0, 150.0])
+    assert np.allclose(geo_alt, [420.0, 0.0], atol=1e-6)
+
+def test_ground_track_routes(client):
+    track = client.get('/ground_track').get_json()
+    assert len(track) == 3
+    assert all(350 < point['altitude'] < 500 and abs(point['latitude']) < 52 for point in track)
+    page = client.get('/ground_track?start=2022-042T12:04:00.000Z&limit=1')
+    assert page.get_json() == track[1:2] and page.headers['X-Next-Cursor'] == '2'
+    assert client.get('/ground_track?after=2').get_json() == track[2:]
+    lines = client.get('/ground_track?end=2022-042T12:04:00.000Z&format=ndjson').get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == track[:2]
+    assert 'UNABLE' in client.get('/ground_track?limit=-1').get_data(as_text=True)
+    assert isspsdt.ground_track_cache['generation'] == isspsdt.iss_dataset.generation
+    everywhere = client.get('/over_region?min_lat=-90&max_lat=90&min_lon=-180&max_lon=180').get_json()
+    assert everywhere == [{'start': '2022-042T12:00:00.000Z', 'end': '2022-042T12:08:00.000Z', 'duration_seconds': 480.0}]
+    lat0, lon0 = track[0]['latitude'], track[0]['longitude']
+    near_first = client.get(f'/over_region?min_lat={lat0 - 1}&max_lat={lat0 + 1}&min_lon={lon0 - 1}&max_lon={lon0 + 1}').get_json()
+    assert len(near_first) == 1 and near_first[0]['start'] == '2022-042T12:00:00.000Z'
+    assert 'USE /over_region' in client.get('/over_region?min_lat=0').get_data(as_text=True)
+
+############################################################################################################################
+
+def test_build_sighting_store():
+    sighting_data = xmltodict.parse(FIXTURE_SIGHTING_XML)['visible_passes']['visible_pass']
+    sighting_store = build_sighting_store(sighting_data)
+    assert np.all(np.diff(sighting_store['times']) >= 0)
+    assert sighting_store['times'][0] == parse_epoch('2022-02-17T12:13:00Z')
+    assert sighting_store['elevation'].tolist() == [11.0, 37.0, 60.0, 18.0, 25.0]
+    results = query_sightings(sighting_store, sighting_data, parse_epoch('2022-02-18T00:00:00Z'), np.inf, min_elevation=20)
+    assert [x['city'] for x in results] == ['Dallas', 'Akron', 'Toronto']
+
+def test_sightings_route(client):
+    assert len(client.get('/sightings').get_json()) == 5
+    results = client.get('/sightings?from=2022-02-18T00:00:00Z&to=2022-02-19T23:59:59Z&min_duration=3').get_json()
+    assert [x['city'] for x in results] == ['Dallas', 'Akron']
+    assert [x['city'] for x in client.get('/sightings?country=Canada').get_json()] == ['Toronto']
+    assert client.get('/sightings?country=Mexico').get_json() == []
+    assert client.get('/sightings?min_elevation=30&limit=1').headers['X-Next-Cursor'] == '1'
+    assert 'UNABLE' in client.get('/sightings?min_elevation=high').get_data(as_text=True)
+
+def test_sightings_route_cached_query(client, monkeypatch):
+    queries = []
+    query_sightings = isspsdt.query_sightings
+    monkeypatch.setattr(isspsdt, 'query_sightings', lambda *args: queries.append(args) or query_sightings(*args))
+    first = client.get('/sightings?min_elevation=30&limit=1')
+    second = client.get('/sightings?min_elevation=30&limit=1')
+    revalidated = client.get('/sightings?min_elevation=30&limit=1', headers={'If-None-Match': first.headers['ETag']})
+    assert len(queries) == 1
+    assert second.get_json() == first.get_json() and second.headers['X-Next-Cursor'] == '1'
+    assert revalidated.status_code == 304 and revalidated.headers['X-Next-Cursor'] == '1'
+    lines = client.get('/sightings?min_elevation=30&format=ndjson').get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == client.get('/sightings?min_elevation=30').get_json()
+    assert len(queries) == 3
+
+def test_sighting_shards(fixture_files, monkeypatch):
+    lines = FIXTURE_SIGHTING_XML.strip().split('\n')
+    header, passes, footer = lines[:2], lines[2:-1], lines[-1:]
+    for name, shard in (('shard_a.xml', passes[:3]), ('shard_b.xml', passes[2:])):
+        (fixture_files[1].parent / name).write_text('\n'.join(header + shard + footer))
+    monkeypatch.setattr(isspsdt, 'SIGHTING_FILE', str(fixture_files[1].parent / 'shard_*.xml'))
+    assert [os.path.basename(source) for source in expand_sources(isspsdt.SIGHTING_FILE)] == ['shard_a.xml', 'shard_b.xml']
+    test_client = isspsdt.app.test_client()
+    test_client.post('/load_file')
+    assert len(isspsdt.iss_dataset.sighting_data) == 5
+    assert test_client.get('/countries').get_json() == ['United_States', 'Canada']
+    assert isspsdt.iss_dataset.sighting_data == xmltodict.parse(FIXTURE_SIGHTING_XML)['visible_passes']['visible_pass']
+    # THE PROCESS POOL IS KEPT FOR LATER LOADS
+    process_pool, snapshot_dir = isspsdt.sighting_process_pool, isspsdt.SNAPSHOT_DIR
+    monkeypatch.setattr(isspsdt, 'SNAPSHOT_DIR', None)
+    test_client.post('/load_file')
+    assert isspsdt.sighting_process_pool is process_pool
+    monkeypatch.setattr(isspsdt, 'SNAPSHOT_DIR', snapshot_dir)
+    assert len(merge_sighting_shards([[{'city': 'A', 'region': 'B'}], [{'region': 'B', 'city': 'A'}]])) == 1
+    assert restore_from_snapshots(isspsdt.EPOCH_FILE, isspsdt.SIGHTING_FILE)
+    assert len(isspsdt.iss_dataset.sighting_data) == 5
+    with pytest.raises(FileNotFoundError):
+        expand_sources(str(fixture_files[1].parent / 'missing_*.xml'))
+
+def test_shared_dataset(client, fixture_files, monkeypatch, tmp_path):
+    routes = ['/epochs', '/epochs/2022-042T12:04:00.000Z', '/sightings', '/sightings?country=Canada', '/countries',
+              '/countries/United_States', '/countries/United_States/regions', '/countries/United_States/regions/Texas',
+              '/countries/United_States/regions/Texas/cities', '/countries/United_States/regions/Texas/cities/Austin',
+              '/countries/Mexico', '/countries/United_States/regions/Texas/cities/Paris', '/sightings?format=ndjson']
+    expected = [client.get(route).get_data() for route in routes]
+    city_keys = [['United_States', 'Texas', 'Austin'], ['Canada', 'Ontario', 'Paris']]
+    expected_cities = client.post('/batch/cities', json=city_keys).get_json()
+    monkeypatch.setattr(isspsdt, 'SHARED_DATASET_DIR', str(tmp_path / 'shared'))
+    monkeypatch.setattr(isspsdt, 'SHARED_POLL_INTERVAL', 0.05)
+    monkeypatch.setattr(isspsdt, 'shared_pointer_stat', None)
+    client.post('/load_file')
+    generation = isspsdt.iss_dataset.generation
+    assert read_shared_pointer()['generation'] == generation
+    # EVERY STRUCTURE THE ROUTES READ IS A VIEW OVER THE MAPPED GENERATION FILES
+    dataset = isspsdt.iss_dataset
+    assert isinstance(dataset.epoch_store['position'], np.memmap)
+    assert isinstance(dataset.epoch_store['buffer']['epochs'], StringArray)
+    assert isinstance(dataset.epoch_store['buffer']['rows'], SortedIndex)
+    assert isinstance(dataset.sighting_data, SightingList) and isinstance(dataset.sighting_index, SightingTree)
+    assert isinstance(dataset.sighting_store['country'], np.memmap)
+    assert [client.get(route).get_data() for route in routes] == expected
+    assert client.post('/batch/cities', json=city_keys).get_json() == expected_cities
+    assert dataset.sighting_data == xmltodict.parse(FIXTURE_SIGHTING_XML)['visible_passes']['visible_pass']
+    try:
+        # a second worker process publishes the next generation through the shared directory
+        script = ('import app; app.SHARED_DATASET_DIR = {!r}; app.SNAPSHOT_DIR = None; '
+                  'app.load_data_sets(app.stream_xml_data_file, {!r}, {!r})').format(
+                  isspsdt.SHARED_DATASET_DIR, str(fixture_files[0]), str(fixture_files[1]))
+        subprocess.run([sys.executable, '-c', script], check=True, cwd=os.path.dirname(isspsdt.__file__))
+        # THE WATCHER STARTED BY THE FIRST REQUEST ATTACHES IT OUTSIDE THE REQUEST PATH
+        assert isspsdt.shared_watcher_stop is not None
+        deadline = time.time() + 5
+        while isspsdt.iss_dataset.generation == generation and time.time() < deadline:
+            time.sleep(0.01)
+        assert isspsdt.iss_dataset.generation == generation + 1
+        assert client.get('/epochs?limit=1').get_json() == ['2022-042T12:00:00.000Z']
+        assert len(os.listdir(isspsdt.SHARED_DATASET_DIR)) == 6    # lock, pointer and two generations of two data sets
+        # AN EPOCH REFRESH LINKS THE UNCHANGED SIGHTING TABLES INTO THE NEXT GENERATION
+        sighting_generation = isspsdt.iss_dataset.generation
+        lines = FIXTURE_EPOCH_XML.split('\n')
+        fixture_files[0].write_text('\n'.join(lines[:2] + lines[3:5] + [lines[3].replace('12:04:00', '12:12:00')] + lines[5:]))
+        client.post('/load_file?incremental=true')
+        assert isspsdt.iss_dataset.generation == sighting_generation + 1
+        assert client.get('/epochs/2022-042T12:12:00.000Z').get_json()['EPOCH'] == '2022-042T12:12:00.000Z'
+        codes_paths = [os.path.join(snapshot_path('sighting', f'generation-{x}', isspsdt.SHARED_DATASET_DIR), 'codes.npy')
+                       for x in (sighting_generation, sighting_generation + 1)]
+        assert os.path.samefile(*codes_paths)
+        assert client.get('/countries/United_States/regions/Texas/cities/Austin').get_data() == expected[9]
+    finally:
+        isspsdt.stop_shared_watcher()
+
+def test_sighting_tree():
+    sighting_data = xmltodict.parse(FIXTURE_SIGHTING_XML)['visible_passes']['visible_pass']
+    sighting_data = sighting_data + [dict(sighting_data[0], city=name) for name in ('Abilene', 'Zapata', 'El Paso')]
+    tables, meta = pack_sighting_tables(sighting_data)
+    tables.update(meta, strings=StringTable(tables['string_data'], tables['string_offsets']))
+    sighting_tree, sighting_index = SightingTree(tables), build_sighting_index(sighting_data)
+    assert list(sighting_tree) == list(sighting_index)
+    for country, country_node in sighting_index.items():
+        assert sighting_tree[country]['sightings'] == country_node['sightings']
+        for region, region_node in country_node['regions'].items():
+            regions = sighting_tree[country]['regions']
+            assert list(regions[region]['cities']) == list(region_node['cities'])
+            for city, city_sightings in region_node['cities'].items():
+                assert regions[region]['cities'][city] == city_sightings
+    for missing in ('', 'AAA', 'Mexico', 'zzz', None, 1):
+        assert missing not in sighting_tree
+        assert missing not in sighting_tree['United_States']['regions']['Texas']['cities']
+    assert SightingNames(tables, 'country', 0)['Canada'] == 1
+
+def test_incremental_reload(client, fixture_files):
+    old_generation = isspsdt.iss_dataset.generation
+    old_track = client.get('/ground_track').get_json()
+    lines = FIXTURE_EPOCH_XML.split('\n')
+    lines[4] = lines[4].replace('-6454.66', '-6454.70')
+    lines[5:5] = ['<stateVector><EPOCH>2022-042T12:12:00.000Z</EPOCH><X units="km">-6432.12</X><Y units="km">-1313.42</Y><Z units="km">-951.64</Z><X_DOT units="km/s">1.02</X_DOT><Y_DOT units="km/s">-4.84</Y_DOT><Z_DOT units="km/s">4.51</Z_DOT></stateVector>']
+    del lines[2]
+    fixture_files[0].write_text('\n'.join(lines))
+    resp = client.post('/load_file?incremental=true').get_data(as_text=True)
+    assert 'Epochs added: 1, removed: 1, replaced: 1, unchanged: 1' in resp
+    dataset = isspsdt.iss_dataset
+    assert dataset.generation == old_generation + 1
+    assert dataset.epoch_delta['new_span'] == ['2022-042T12:04:00.000Z', '2022-042T12:12:00.000Z']
+    assert isspsdt.ground_track_cache['generation'] == dataset.generation
+    assert client.get('/ground_track?limit=1').get_json() == old_track[1:2]
+    assert client.get('/countries').get_json() == ['United_States', 'Canada']
+    assert 'Epochs added: 0, removed: 0, replaced: 0, unchanged: 3' in client.post('/load_file?incremental=true').get_data(as_text=True)
+    assert isspsdt.iss_dataset is dataset
+
+def test_incremental_reload_in_place(client, fixture_files):
+    lines = FIXTURE_EPOCH_XML.split('\n')
+    def state_vector(minute):
+        return lines[3].replace('12:04:00', f'12:{minute:02d}:00')
+    client.get('/countries')
+    client.get('/passes?lat=30.27&lon=-97.74')
+    old_dataset = isspsdt.iss_dataset
+    # EXPIRE THE FIRST STATE VECTOR AND APPEND TWO, THE FIRST APPEND MOVES THE BUFFER
+    fixture_files[0].write_text('\n'.join(lines[:2] + lines[3:5] + [state_vector(12), state_vector(16)] + lines[5:]))
+    client.post('/load_file?incremental=true')
+    dataset = isspsdt.iss_dataset
+    assert dataset.epoch_delta['in_place'] and dataset.epoch_delta['added'] == 2 and dataset.epoch_delta['removed'] == 1
+    assert list(dataset.epoch_store['epochs']) == ['2022-042T12:04:00.000Z', '2022-042T12:08:00.000Z',
+                                                   '2022-042T12:12:00.000Z', '2022-042T12:16:00.000Z']
+    assert len(old_dataset.epoch_store['epochs']) == 3 and '2022-042T12:12:00.000Z' not in old_dataset.epoch_store['index']
+    assert ('countries', 0, 2) in isspsdt.response_cache['pinned']
+    assert isspsdt.pass_cache['generation'] == dataset.generation
+    carried_times, carried_ecef = isspsdt.pass_samples(dataset)
+    assert np.allclose(carried_times, np.append(np.arange(carried_times[0], carried_times[-1], isspsdt.PASS_SAMPLE_STEP), carried_times[-1]))
+    position, _ = interpolate_state_vectors(dataset.epoch_store, carried_times)
+    assert np.allclose(carried_ecef, eci_to_ecef(position, carried_times))
+    # THE NEXT APPEND IS WRITTEN INTO THE SAME BUFFER
+    fixture_files[0].write_text('\n'.join(lines[:2] + lines[3:5] + [state_vector(m) for m in (12, 16, 20)] + lines[5:]))
+    client.post('/load_file?incremental=true')
+    assert isspsdt.iss_dataset.epoch_store['buffer'] is dataset.epoch_store['buffer']
+    assert client.get('/epochs/2022-042T12:20:00.000Z').get_json()['EPOCH'] == '2022-042T12:20:00.000Z'
+    assert client.get('/epochs').get_json()[-2:] == ['2022-042T12:16:00.000Z', '2022-042T12:20:00.000Z']
+    assert len(dataset.epoch_store['epochs']) == 4 and '2022-042T12:20:00.000Z' not in dataset.epoch_store['index']
+    # REPEATED EPOCHS ARE MATCHED BY THEIR LAST STATE VECTOR
+    epoch_store = build_epoch_store(xmltodict.parse(FIXTURE_EPOCH_XML)['ndm']['oem']['body']['segment']['data']['stateVector'])
+    repeated = xmltodict.parse(FIXTURE_EPOCH_XML.replace(lines[4], lines[3] + lines[4]))['ndm']['oem']['body']['segment']['data']['stateVector']
+    delta, reuse_old, reuse_new = diff_epoch_stores(epoch_store, build_epoch_store(repeated))
+    assert (delta['added'], delta['removed'], delta['replaced'], delta['unchanged']) == (0, 0, 0, 3)
+    assert list(reuse_new) == [0, 2, 3]
+
+def test_bench_generators(tmp_path, monkeypatch):
+    import bench
+    bench.write_oem_xml(str(tmp_path / 'oem.xml'), 25)
+    bench.write_sighting_xml(str(tmp_path / 'sightings.xml'), 30)
+    monkeypatch.setattr(isspsdt, 'SNAPSHOT_DIR', None)
+    dataset = load_data_sets(stream_xml_data_file, str(tmp_path / 'oem.xml'), str(tmp_path / 'sightings.xml'))
+    assert len(dataset.epoch_store['epochs']) == 25 and len(dataset.sighting_data) == 30
+    assert np.allclose(np.linalg.norm(dataset.epoch_store['position'], axis=1), bench.ORBIT_RADIUS)
+    assert len(dataset.sighting_index) == len(bench.COUNTRIES)
+    old = {'sizes': [{'rows': 25, 'load_file': {'seconds': 1.0, 'peak_rss_mb': 50.0}}]}
+    new = {'sizes': [{'rows': 25, 'load_file': {'seconds': 2.0, 'peak_rss_mb': 50.0}}]}
+    assert len(bench.find_regressions(new, old, 0.25)) == 1
+    assert bench.find_regressions(old, old, 0.25) == []
+
+def test_metrics(client):
+    client.get('/epochs')
+    client.get('/epochs/2022-042T12:04:00.000Z')
+    client.get('/countries')
+    snapshot = client.get('/metrics').get_json()
+    routes = {(x['route'], x['method']): x for x in snapshot['routes']}
+    assert routes[('/epochs/<epoch>', 'GET')]['count'] >= 1
+    assert routes[('/epochs/<epoch>', 'GET')]['latency_buckets']['+Inf'] == routes[('/epochs/<epoch>', 'GET')]['count']
+    assert routes[('/load_file', 'POST')]['status']['200'] >= 1
+    assert snapshot['dataset']['epochs'] == 3 and snapshot['dataset']['sightings'] == 5
+    assert snapshot['loads']['epoch']['parse']['count'] >= 1
+    assert 0 <= snapshot['response_cache']['hit_rate'] <= 1
+    text = client.get('/metrics?format=prometheus').get_data(as_text=True)
+    assert 'isspsdt_request_duration_seconds_bucket{route="/epochs/<epoch>",method="GET",le="+Inf"}' in text
+    assert 'isspsdt_dataset_epochs 3' in text
+
+def test_metrics_unhandled_exception(client, monkeypatch):
+    def broken_view():
+        raise RuntimeError('broken view')
+    monkeypatch.setattr(isspsdt.app, 'testing', True)
+    monkeypatch.setitem(isspsdt.app.view_functions, 'usage_info', broken_view)
+    with pytest.raises(RuntimeError):
+        client.get('/')
+    routes = {(x['route'], x['method']): x for x in isspsdt.metrics_snapshot()['routes']}
+    assert routes[('/', 'GET')]['status']['500'] >= 1
+
+def test_request_log_sampling(client, monkeypatch):
+    records = []
+    isspsdt.log_queue_handler.addFilter(lambda record: records.append(record) and False)
+    try:
+        monkeypatch.setattr(isspsdt, 'REQUEST_LOG_SAMPLE_RATE', 0.0)
+        client.get('/epochs/2022-042T12:04:00.000Z')
+        client.get('/epochs/not-an-epoch')
+        assert [record.levelname for record in records] == ['ERROR']
+        monkeypatch.setattr(isspsdt, 'REQUEST_LOG_SAMPLE_RATE', 1.0)
+        client.get('/epochs/2022-042T12:04:00.000Z')
+        assert records[-1].levelname == 'INFO'
+        logged = len(records)
+        monkeypatch.setattr(isspsdt, 'LOG_LEVEL', logging.WARNING)
+        client.get('/epochs/2022-042T12:04:00.000Z')
+        assert len(records) == logged
+    finally:
+        isspsdt.LOG_LEVEL = logging.DEBUG
+        isspsdt.apply_log_level()
+        isspsdt.log_queue_handler.filters.pop()
+
+def test_predict_passes(tmp_path, monkeypatch):
+    import bench
+    bench.write_oem_xml(str(tmp_path / 'oem.xml'), 720)
+    bench.write_sighting_xml(str(tmp_path / 'sightings.xml'), 10)
+    monkeypatch.setattr(isspsdt, 'SNAPSHOT_DIR', None)
+    dataset = load_data_sets(stream_xml_data_file, str(tmp_path / 'oem.xml'), str(tmp_path / 'sightings.xml'))
+    observer = (30.27, -97.74, 0.15)
+    predicted = predict_passes(dataset, np.array([observer, (89.9, 0.0, 0.0)]), 10.0)
+    assert predicted[1] == []
+    # brute force elevations every second over the first day
+    times = np.arange(dataset.epoch_store['times'][0], dataset.epoch_store['times'][0] + 86400.0, 1.0)
+    observer_ecef, observer_up = geodetic_to_ecef(*(np.array([x]) for x in observer))
+    elevation = np.degrees(np.arcsin(sine_elevation(dataset.epoch_store, times, np.repeat(observer_ecef, len(times), 0),
+                                                    np.repeat(observer_up, len(times), 0))))
+    above = (elevation > 10.0).astype(int)
+    rises, sets = times[1:][np.diff(above) == 1], times[1:][np.diff(above) == -1]
+    assert len(rises) > 0
+    for predicted_pass, rise, set_time in zip(predicted[0], rises, sets):
+        window = (times >= rise) & (times <= set_time)
+        assert rise - 1.0 <= parse_epoch(predicted_pass['rise']) <= rise
+        assert set_time - 1.0 <= parse_epoch(predicted_pass['set']) <= set_time
+        assert abs(predicted_pass['max_elevation'] - elevation[window].max()) < 0.02
+        assert abs(parse_epoch(predicted_pass['culmination']) - times[window][elevation[window].argmax()]) < 2.0
+
+def test_passes_routes(client):
+    result = client.get('/passes?lat=0&lon=0').get_json()
+    assert result['min_elevation'] == 10.0 and isinstance(result['passes'], list)
+    batch = client.post('/batch/passes?min_elevation=0', json=[[29.7604, -95.3698], {'lat': 40.0, 'lon': -80.0, 'alt': 0.3}, [100, 0]]).get_json()
+    assert [sorted(x) for x in batch[:2]] == [['alt', 'lat', 'lon', 'passes']]*2
+    assert batch[0]['lat'] == 29.7604 and 'error' in batch[2]
+    assert isspsdt.pass_cache['generation'] == isspsdt.iss_dataset.generation
+    assert (round(29.7604, 2), -95.37, 0.0, 0.0) in isspsdt.pass_cache['lru']
+    assert 'USE /passes' in client.get('/passes?lat=0').get_data(as_text=True)
+    assert 'USE /passes' in client.get('/passes?lat=0&lon=0&min_elevation=95').get_data(as_text=True)
+    assert 'POST BODY MUST BE' in client.post('/batch/passes', json={'observers': 3}).get_data(as_text=True)